@@ -0,0 +1,6 @@
+"""
+Load generation and latency benchmarks for the ingestion and stats endpoints.
+
+Run with `python -m benchmarks --help`. The benchmarks run against a throw-away test database,
+never against the database configured for the application.
+"""
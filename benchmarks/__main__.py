@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import platform
+import sys
+
+import django
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Seeds a test database and measures the ingestion and stats endpoints.",
+    )
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--events-per-user", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=100000, help="Number of event logs to seed.")
+    parser.add_argument("--days", type=int, default=90, help="Time span of the seeded logs.")
+    parser.add_argument("--distribution", choices=["uniform", "zipf"], default="zipf")
+    parser.add_argument("--iterations", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--only", nargs="*", help="Only run these scenarios.")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--keepdb", action="store_true", help="Keep and reuse the seeded test database.")
+    parser.add_argument(
+        "--fast-path-iterations",
+        type=int,
+        default=50,
+        help="Repetitions of the validation and JSON micro-benchmarks, 0 to skip them.",
+    )
+    parser.add_argument("--baseline", help="Earlier output to compare the p95 latencies with.")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="Exit with an error if a p95 latency grew by more than this fraction of the baseline.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "eventtracker.settings")
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.conf import settings
+    from django.db import connection, connections
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    from benchmarks import fastpaths, runner
+    from benchmarks.seed import load_accounts, seed
+    from eventmanager.caching import stats_cache
+
+    setup_test_environment()
+    # Measure the endpoints, not the ingestion limits
+    settings.EVENTMANAGER_THROTTLE_RATE = None
+    settings.EVENTMANAGER_DAILY_EVENT_QUOTA = None
+    if not stats_cache.enabled:
+        # The "_cached" scenarios measure the stats cache. Every bump is made by this process, so
+        # its memory cache is never out of date.
+        stats_cache.cache_alias = "default"
+        stats_cache.local_timeout = stats_cache.timeout
+    connection.creation.create_test_db(verbosity=1, keepdb=args.keepdb)
+    # Stats and exports read from the replicas, point them at the test database too
+    for alias in getattr(settings, "EVENTMANAGER_READ_REPLICAS", []):
+        connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        if args.keepdb and User.objects.filter(username__startswith="bench").exists():
+            accounts = load_accounts()
+        else:
+            accounts = seed(
+                users=args.users,
+                events_per_user=args.events_per_user,
+                rows=args.rows,
+                days=args.days,
+                distribution=args.distribution,
+                stdout=sys.stdout,
+            )
+        results = runner.run(
+            accounts,
+            iterations=args.iterations,
+            scenarios=runner.default_scenarios(args.batch_size),
+            only=args.only,
+            stdout=sys.stdout,
+        )
+    finally:
+        connection.creation.destroy_test_db(connection.settings_dict["NAME"], keepdb=args.keepdb)
+        teardown_test_environment()
+
+    report = {
+        "config": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        },
+        "results": results,
+    }
+    if args.fast_path_iterations:
+        report["fast_paths"] = fastpaths.run(args.fast_path_iterations, stdout=sys.stdout)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = runner.compare(results, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
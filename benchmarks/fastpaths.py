@@ -0,0 +1,91 @@
+"""
+Micro-benchmarks of the validation and JSON code paths of the endpoints, without a database.
+
+Every pair compares the code DRF runs by default with the fast path the endpoints use.
+"""
+import io
+import json
+import time
+from datetime import date, timedelta
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from eventmanager.renderers import ORJSONParser, ORJSONRenderer
+from eventmanager.serializers import EventBatchItemSerializer, event_batch_item_validator
+
+
+def batch_records(size=500):
+    return [
+        {
+            "event_name": f"event{index % 20}",
+            "data": {"user": f"user{index}", "amount": index % 100, "tags": ["a", "b"]},
+            "timestamp": "2023-05-01T12:00:00+00:00",
+        }
+        for index in range(size)
+    ]
+
+
+def trend_answer(days=365, events=20):
+    """
+    An `event_trend` answer in the nested layout.
+    """
+    start = date(2023, 1, 1)
+    return {
+        (start + timedelta(days=day)).isoformat(): {f"event{event}": day * event for event in range(events)}
+        for day in range(days)
+    }
+
+
+def serializer_validate(records):
+    for record in records:
+        serializer = EventBatchItemSerializer(data=record)
+        serializer.is_valid()
+
+
+def fast_validate(records):
+    for record in records:
+        event_batch_item_validator.validate(record)
+
+
+def timed(function, argument, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    return (time.perf_counter() - started) / iterations
+
+
+def run(iterations=50, stdout=None):
+    """
+    Times every pair of code paths.
+
+    Returns:
+        dict: Per comparison, the mean time of both paths in milliseconds and the speedup.
+    """
+    records = batch_records()
+    answer = trend_answer()
+    body = json.dumps(records).encode()
+    pairs = {
+        "validate_batch_500": (serializer_validate, fast_validate, records),
+        "render_trend_365x20": (JSONRenderer().render, ORJSONRenderer().render, answer),
+        "parse_batch_500": (
+            lambda data: JSONParser().parse(io.BytesIO(data)),
+            lambda data: ORJSONParser().parse(io.BytesIO(data)),
+            body,
+        ),
+    }
+    results = {}
+    for name, (default, fast, argument) in pairs.items():
+        before = timed(default, argument, iterations)
+        after = timed(fast, argument, iterations)
+        results[name] = {
+            "default_ms": round(before * 1000, 3),
+            "fast_ms": round(after * 1000, 3),
+            "speedup": round(before / after, 2) if after else None,
+        }
+        if stdout:
+            stdout.write(
+                f"{name:28} default {results[name]['default_ms']:>9} ms  "
+                f"fast {results[name]['fast_ms']:>9} ms  x{results[name]['speedup']}\n"
+            )
+    return results
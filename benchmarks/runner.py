@@ -0,0 +1,168 @@
+import random
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from rest_framework.test import APIClient
+
+from eventmanager.caching import stats_cache
+from eventmanager.middleware import RequestStats
+
+
+def percentile(values, fraction):
+    """
+    Returns the value below which `fraction` of the sorted values fall, by nearest rank.
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Scenario:
+    """
+    A request that is sent repeatedly to measure one endpoint.
+
+    Args:
+        name (str): Name of the scenario in the report.
+        request (callable): Called with (client, account, rng), sends one request and returns the
+            number of events it carried.
+        before (callable, optional): Called with the account before every request, outside of the timing.
+        expected_status (tuple): Status codes that count as a success.
+    """
+
+    def __init__(self, name, request, before=None, expected_status=(200, 201, 202)):
+        self.name = name
+        self.request = request
+        self.before = before
+        self.expected_status = expected_status
+
+
+def ingest_single(client, account, rng):
+    _, _, names = account
+    response = client.post(
+        "/api/eventlogs/", {"event_name": rng.choice(names), "data": {"amount": 1}}, format="json"
+    )
+    return response, 1
+
+
+def make_ingest_batch(size):
+    def ingest_batch(client, account, rng):
+        _, _, names = account
+        records = [{"event_name": rng.choice(names), "data": {"amount": 1}} for _ in range(size)]
+        return client.post("/api/eventlogs/batch", records, format="json"), size
+
+    return ingest_batch
+
+
+def make_get(path, params=None):
+    def get(client, account, rng):
+        return client.get(path, params(account, rng) if params else {}), 0
+
+    return get
+
+
+def invalidate_stats(account):
+    stats_cache.bump(account[0].id)
+
+
+def default_scenarios(batch_size=500):
+    frequency_by_name = lambda account, rng: {"event_name": rng.choice(account[2])}  # noqa: E731
+    return [
+        Scenario("ingest_single", ingest_single),
+        Scenario(f"ingest_batch_{batch_size}", make_ingest_batch(batch_size)),
+        Scenario("event_frequency", make_get("/api/stats/event_frequency"), before=invalidate_stats),
+        Scenario(
+            "event_frequency_by_name",
+            make_get("/api/stats/event_frequency", frequency_by_name),
+            before=invalidate_stats,
+        ),
+        Scenario("event_frequency_cached", make_get("/api/stats/event_frequency")),
+        Scenario("event_trend", make_get("/api/stats/event_trend"), before=invalidate_stats),
+        Scenario("event_trend_cached", make_get("/api/stats/event_trend")),
+        Scenario("export_10000", make_get("/api/eventlogs/export", lambda account, rng: {"limit": 10000})),
+    ]
+
+
+def run_scenario(scenario, accounts, iterations, seed=0):
+    """
+    Sends `iterations` requests of a scenario, rotating through the seeded accounts.
+
+    Returns:
+        dict: Throughput, latency percentiles in milliseconds and queries per request.
+    """
+    rng = random.Random(seed)
+    client = APIClient()
+    latencies = []
+    queries = []
+    events = errors = 0
+    for iteration in range(iterations):
+        account = accounts[iteration % len(accounts)]
+        client.credentials(HTTP_AUTHORIZATION="Token " + account[1])
+        if scenario.before:
+            scenario.before(account)
+        captured = RequestStats()
+        with ExitStack() as stack:
+            # Stats and exports read from the replicas, count the queries of every database. An
+            # alias can share the connection of another one, like a test mirror.
+            for alias_connection in {id(c): c for c in connections.all()}.values():
+                stack.enter_context(alias_connection.execute_wrapper(captured))
+            started = time.perf_counter()
+            response, carried = scenario.request(client, account, rng)
+            if getattr(response, "streaming", False):
+                b"".join(response.streaming_content)
+            latencies.append(time.perf_counter() - started)
+        queries.append(captured.queries)
+        if response.status_code in scenario.expected_status:
+            events += carried
+        else:
+            errors += 1
+
+    total = sum(latencies)
+    return {
+        "requests": iterations,
+        "errors": errors,
+        "seconds": round(total, 6),
+        "requests_per_second": round(iterations / total, 2) if total else None,
+        "events_per_second": round(events / total, 2) if total and events else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 3),
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+        },
+        "queries_per_request": round(statistics.mean(queries), 2),
+    }
+
+
+def run(accounts, iterations=200, scenarios=None, only=None, stdout=None):
+    """
+    Runs every scenario and returns the results keyed by scenario name.
+    """
+    results = {}
+    for scenario in scenarios or default_scenarios():
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = run_scenario(scenario, accounts, iterations)
+        if stdout:
+            latency = results[scenario.name]["latency_ms"]
+            stdout.write(
+                f"{scenario.name:28} {results[scenario.name]['requests_per_second']:>10} req/s  "
+                f"p50 {latency['p50']:>9} ms  p95 {latency['p95']:>9} ms  p99 {latency['p99']:>9} ms\n"
+            )
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """
+    Lists the scenarios whose p95 latency grew by more than `max_regression` (0.2 is 20%) over the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        before, after = previous["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        if before and after > before * (1 + max_regression):
+            regressions.append(f"{name}: p95 {before} ms -> {after} ms")
+    return regressions
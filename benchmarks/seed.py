@@ -0,0 +1,80 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from eventmanager.ingest import save_event_logs
+from eventmanager.models import Event, EventLog
+
+CHUNK_SIZE = 10000
+
+
+def event_weights(count, distribution):
+    """
+    Returns the relative popularity of `count` events.
+
+    "uniform" gives every event the same weight, "zipf" makes the n-th event 1/n as popular as the first.
+    """
+    if distribution == "zipf":
+        return [1 / rank for rank in range(1, count + 1)]
+    return [1] * count
+
+
+def seed(users=10, events_per_user=20, rows=100000, days=90, distribution="zipf", seed=0, stdout=None):
+    """
+    Creates synthetic users, events and event logs.
+
+    Logs are spread over the users evenly and over the last `days` days uniformly, events are picked
+    following `distribution`. Logs are written through `save_event_logs`, so the rollups are filled too.
+
+    Returns:
+        list: (user, token key, event names) for every created user.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    accounts = []
+    for index in range(users):
+        user = User.objects.create_user(username=f"bench{index}", password="bench")
+        token = Token.objects.create(user=user)
+        events = Event.objects.bulk_create(
+            [Event(user=user, name=f"event{number}") for number in range(events_per_user)]
+        )
+        accounts.append((user, token.key, events))
+
+    weights = event_weights(events_per_user, distribution)
+    span = days * 86400
+    written = 0
+    while written < rows:
+        size = min(CHUNK_SIZE, rows - written)
+        logs = []
+        for _ in range(size):
+            user, _, events = accounts[rng.randrange(users)]
+            event = rng.choices(events, weights)[0]
+            logs.append(
+                EventLog(
+                    creator=user,
+                    event=event,
+                    event_name=event.name,
+                    timestamp=now - timedelta(seconds=rng.randrange(span)),
+                    data={"user": f"visitor{rng.randrange(10000)}", "amount": rng.randrange(1, 500)},
+                )
+            )
+        save_event_logs(logs)
+        written += size
+        if stdout:
+            stdout.write(f"Seeded {written}/{rows} event logs\n")
+
+    return [(user, key, [event.name for event in events]) for user, key, events in accounts]
+
+
+def load_accounts():
+    """
+    Returns the accounts created by an earlier call to `seed`, in the same format.
+    """
+    accounts = []
+    for user in User.objects.filter(username__startswith="bench").order_by("id"):
+        names = list(Event.objects.filter(user=user).order_by("id").values_list("name", flat=True))
+        accounts.append((user, Token.objects.get(user=user).key, names))
+    return accounts
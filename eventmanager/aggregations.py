@@ -0,0 +1,211 @@
+"""
+Sum, min, max, average and percentiles of a numeric key of `EventLog.data`, per time bucket.
+
+On PostgreSQL the whole computation runs in the database, with the JSON operators and
+`percentile_cont`. On other databases only the bucket and the value of the key are read, in
+chunks, and reduced in a single pass that keeps a bounded sample of every bucket for the
+percentiles.
+"""
+import random
+
+from django.db import connections
+from django.db.models import (
+    Aggregate,
+    Avg,
+    CharField,
+    Count,
+    FloatField,
+    Func,
+    Max,
+    Min,
+    Sum,
+)
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
+from django.db.models.functions import Cast
+
+from .models import EventLog
+from .stats import TREND_TRUNCS, local_bucket
+
+# Number of values kept per bucket to estimate percentiles outside PostgreSQL
+RESERVOIR_SIZE = 10000
+
+
+class PercentileCont(Aggregate):
+    """
+    PostgreSQL's `percentile_cont(fraction) WITHIN GROUP (ORDER BY expression)`.
+    """
+    function = "percentile_cont"
+    template = "%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+class JSONBTypeOf(Func):
+    function = "jsonb_typeof"
+    output_field = CharField()
+
+
+class Reducer:
+    """
+    Accumulates the values of one bucket in a single pass.
+
+    Percentiles are read from a uniform random sample of at most `size` values (reservoir
+    sampling), so memory does not grow with the number of values. They are exact as long as the
+    bucket has no more than `size` values.
+    """
+
+    def __init__(self, size=RESERVOIR_SIZE, seed=0):
+        self.size = size
+        self.random = random.Random(seed)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.sample = []
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self.sample) < self.size:
+            self.sample.append(value)
+        else:
+            index = self.random.randrange(self.count)
+            if index < self.size:
+                self.sample[index] = value
+
+    def percentile(self, fraction):
+        """
+        Interpolates linearly between the closest values, like `percentile_cont`.
+        """
+        values = sorted(self.sample)
+        position = fraction * (len(values) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def event_logs(creator_id, options):
+    """
+    Returns the logs of a user selected by the options of `stats.parse_bucket_params`,
+    annotated with their time bucket.
+    """
+    logs = EventLog.objects.filter(
+        creator_id=creator_id, event_name=options["event_name"], event__deleted_at__isnull=True
+    )
+    if options["start"]:
+        logs = logs.filter(timestamp__gte=options["start"])
+    if options["end"]:
+        logs = logs.filter(timestamp__lt=options["end"])
+    trunc = TREND_TRUNCS[options["granularity"]]("timestamp", tzinfo=options["tz"])
+    return logs.annotate(time_bucket=trunc)
+
+
+def aggregate_in_database(logs, key, percentiles):
+    """
+    Aggregates the key per bucket with a single PostgreSQL query.
+
+    Returns:
+        list: (bucket, count, sum, min, max, avg, [percentile values]) tuples.
+    """
+    value = Cast(KeyTextTransform(key, "data"), FloatField())
+    aggregates = {
+        "count": Count("id"),
+        "sum": Sum(value),
+        "min": Min(value),
+        "max": Max(value),
+        "avg": Avg(value),
+    }
+    for index, percentile in enumerate(percentiles):
+        aggregates[f"p{index}"] = PercentileCont(value, percentile / 100)
+    rows = (
+        logs.annotate(value_type=JSONBTypeOf(KeyTransform(key, "data")))
+        .filter(value_type="number")
+        .values("time_bucket")
+        .annotate(**aggregates)
+        .order_by("time_bucket")
+    )
+    return [
+        (
+            row["time_bucket"],
+            row["count"],
+            row["sum"],
+            row["min"],
+            row["max"],
+            row["avg"],
+            [row[f"p{index}"] for index in range(len(percentiles))],
+        )
+        for row in rows
+    ]
+
+
+def aggregate_in_python(logs, key, percentiles, chunk_size=5000):
+    """
+    Aggregates the key per bucket by streaming (bucket, value) pairs. Values that are not numbers are skipped.
+
+    Returns:
+        list: (bucket, count, sum, min, max, avg, [percentile values]) tuples.
+    """
+    reducers = {}
+    pairs = logs.values_list("time_bucket", KeyTransform(key, "data")).order_by()
+    for bucket, value in pairs.iterator(chunk_size=chunk_size):
+        if not is_number(value):
+            continue
+        if bucket not in reducers:
+            reducers[bucket] = Reducer()
+        reducers[bucket].add(value)
+    return [
+        (
+            bucket,
+            reducer.count,
+            reducer.sum,
+            reducer.min,
+            reducer.max,
+            reducer.sum / reducer.count,
+            [reducer.percentile(percentile / 100) for percentile in percentiles],
+        )
+        for bucket, reducer in sorted(reducers.items())
+    ]
+
+
+def aggregate(creator_id, options, key, percentiles):
+    """
+    Computes the statistics of a numeric key of the event data per time bucket.
+
+    Args:
+        creator_id (int): The authenticated user.
+        options (dict): The options returned by `stats.parse_bucket_params`.
+        key (str): The key of `EventLog.data` to aggregate.
+        percentiles (list): The percentiles to compute, between 0 and 100.
+
+    Returns:
+        list: One dictionary per bucket with at least one numeric value.
+    """
+    logs = event_logs(creator_id, options)
+    if connections[logs.db].vendor == "postgresql":
+        rows = aggregate_in_database(logs, key, percentiles)
+    else:
+        rows = aggregate_in_python(logs, key, percentiles)
+    return [
+        {
+            "bucket": local_bucket(bucket, options["granularity"], options["tz"]).isoformat(),
+            "count": count,
+            "sum": total,
+            "min": minimum,
+            "max": maximum,
+            "avg": average,
+            "percentiles": {
+                f"p{percentile:g}": value for percentile, value in zip(percentiles, values)
+            },
+        }
+        for bucket, count, total, minimum, maximum, average, values in rows
+    ]
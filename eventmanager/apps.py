@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EventmanagerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "eventmanager"
+
+    def ready(self):
+        from . import middleware, signals  # noqa: F401
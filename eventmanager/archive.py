@@ -0,0 +1,603 @@
+"""
+Cold storage of old raw event logs, see the `archive_eventlogs` command.
+
+The logs of a user are moved one UTC month at a time to a segment file under
+`EVENTMANAGER_ARCHIVE_DIR`, then deleted from the EventLog table. Before that, the rollups and
+sketches of the archived range are folded like for a compaction (see retention.py), so the
+frequency, trend and unique endpoints keep answering from them. The trend queries that scan the
+raw logs, minutes and time zones with half-hour offsets, add the counts read from the segments.
+
+A segment is a small header followed by zlib compressed columns:
+
+    b"EVLA" | version (1 byte) | header length (uint32, little endian) | header (JSON) | columns
+
+The header lists the number of rows and, for every column, its name, type, and the offset and
+length of its compressed bytes after the header. 'id', 'timestamp' (microseconds since the epoch,
+UTC) and 'event_id' are little endian int64 arrays, 'event_name' holds uint32 codes into the
+'values' of its header entry, and every key of the event data is a 'jsonl' column with one JSON
+value per line and row, null where the key is missing. Nested keys are flattened with dots, like
+'data.page.url'. Segments are written and read one chunk of every column at a time, through
+`mmap`, and only the columns a query needs are decompressed.
+"""
+import heapq
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+
+from .caching import stats_cache
+from .models import Event, EventArchiveSegment, EventLog
+from .partitioning import add_months
+from .retention import DELETE_BATCH_SIZE, fold_event_logs
+from .routers import shard_db
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EVLA"
+VERSION = 1
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+INT_COLUMNS = ("id", "timestamp", "event_id")
+
+
+def archive_dir():
+    return Path(getattr(settings, "EVENTMANAGER_ARCHIVE_DIR", "archive"))
+
+
+def segment_path(creator_id, month):
+    return archive_dir() / str(creator_id) / f"{month:%Y-%m}.evla"
+
+
+def month_start(month):
+    """
+    Returns the start of a UTC month as an aware datetime.
+    """
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def flatten(value, prefix="data"):
+    """
+    Flattens the event data into a {column name: value} dictionary. Lists are kept as values.
+    """
+    if not isinstance(value, dict):
+        return {prefix: value}
+    columns = {}
+    for key, item in value.items():
+        columns.update(flatten(item, f"{prefix}.{key}"))
+    return columns
+
+
+def to_micros(moment):
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def pack_ints(values, typecode="q"):
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_ints(data, typecode="q"):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class SegmentWriter:
+    """
+    Writes a segment file one record at a time, replacing an existing one only once the new one
+    is complete.
+
+    Every column is compressed as the records come in, to a temporary file next to the segment,
+    so memory use does not grow with the number of records:
+
+        writer = SegmentWriter(path)
+        for record in records:
+            writer.write(record)
+        writer.close()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.codes = {}
+        self.columns = {}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        for name in INT_COLUMNS:
+            self.add_column({"name": name, "type": "int64"})
+        self.add_column({"name": "event_name", "type": "dictionary", "values": []})
+
+    # Number of bytes of a column buffered before they are compressed
+    BUFFER_SIZE = 1 << 16
+
+    def add_column(self, entry):
+        self.columns[entry["name"]] = {
+            "entry": entry,
+            "buffer": bytearray(),
+            "file": tempfile.TemporaryFile(dir=self.path.parent),
+            "compressor": zlib.compressobj(),
+        }
+
+    def append(self, name, data):
+        column = self.columns[name]
+        column["buffer"] += data
+        if len(column["buffer"]) >= self.BUFFER_SIZE:
+            self.compress(column)
+
+    @staticmethod
+    def compress(column):
+        column["file"].write(column["compressor"].compress(column["buffer"]))
+        column["buffer"].clear()
+
+    def write(self, record):
+        """
+        Adds a record, an (id, timestamp in microseconds, event id, event name, flattened data)
+        tuple. Records have to be written in the order they are read back.
+        """
+        for name, value in zip(INT_COLUMNS, record):
+            self.append(name, pack_ints([value]))
+        event_name = record[3]
+        if event_name not in self.codes:
+            self.codes[event_name] = len(self.codes)
+            self.columns["event_name"]["entry"]["values"].append(event_name)
+        self.append("event_name", pack_ints([self.codes[event_name]], "I"))
+
+        data = record[4]
+        for key in data:
+            if key not in self.columns:
+                # The rows written before did not have the key
+                self.add_column({"name": key, "type": "jsonl"})
+                missing = self.rows
+                while missing:
+                    count = min(missing, self.BUFFER_SIZE // 5)
+                    self.append(key, b"null\n" * count)
+                    missing -= count
+        for name, column in self.columns.items():
+            if column["entry"]["type"] == "jsonl":
+                self.append(name, json.dumps(data.get(name)).encode() + b"\n")
+        self.rows += 1
+
+    def close(self):
+        """
+        Writes the segment file, then removes the temporary files.
+
+        Returns:
+            int: The number of records.
+        """
+        try:
+            header = {"rows": self.rows, "columns": []}
+            offset = 0
+            for column in self.columns.values():
+                self.compress(column)
+                column["file"].write(column["compressor"].flush())
+                length = column["file"].tell()
+                header["columns"].append({**column["entry"], "offset": offset, "length": length})
+                offset += length
+            header = json.dumps(header).encode()
+
+            temporary = self.path.with_suffix(".tmp")
+            with open(temporary, "wb") as file:
+                file.write(MAGIC + struct.pack("<BI", VERSION, len(header)) + header)
+                for column in self.columns.values():
+                    column["file"].seek(0)
+                    shutil.copyfileobj(column["file"], file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, self.path)
+        finally:
+            self.discard()
+        return self.rows
+
+    def discard(self):
+        for column in self.columns.values():
+            column["file"].close()
+
+
+def write_segment(path, records):
+    """
+    Writes a segment file, replacing an existing one only once the new one is complete.
+
+    Args:
+        path (Path): The segment file.
+        records (iterable): (id, timestamp in microseconds, event id, event name, flattened data)
+            tuples.
+
+    Returns:
+        int: The number of records.
+    """
+    writer = SegmentWriter(path)
+    try:
+        for record in records:
+            writer.write(record)
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.close()
+
+
+class SegmentReader:
+    """
+    Reads the columns of a segment file through a memory map.
+
+    Use it as a context manager:
+
+        with SegmentReader(path) as segment:
+            timestamps = segment.column("timestamp")
+    """
+
+    # Maximum number of bytes decompressed at a time by `iter_column`
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+
+    def __enter__(self):
+        self.file = open(self.path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        prefix = len(MAGIC) + struct.calcsize("<BI")
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not an event log segment.")
+        version, length = struct.unpack("<BI", self.map[len(MAGIC):prefix])
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"{self.path} has an unknown segment version {version}.")
+        header = json.loads(self.map[prefix:prefix + length])
+        self.rows = header["rows"]
+        self.columns = {entry["name"]: entry for entry in header["columns"]}
+        self.data_start = prefix + length
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.file.close()
+            self.map = self.file = None
+
+    @property
+    def data_keys(self):
+        return [name for name, entry in self.columns.items() if entry["type"] == "jsonl"]
+
+    def column(self, name):
+        """
+        Decompresses a column.
+
+        Returns:
+            An array of integers for the 'int64' columns, a list otherwise. The 'event_name'
+            column is returned as names.
+        """
+        entry = self.columns[name]
+        start = self.data_start + entry["offset"]
+        with memoryview(self.map) as view:
+            data = zlib.decompress(view[start:start + entry["length"]])
+        if entry["type"] == "int64":
+            return unpack_ints(data)
+        if entry["type"] == "dictionary":
+            return [entry["values"][code] for code in unpack_ints(data, "I")]
+        return [json.loads(line) for line in data.splitlines()]
+
+    def decompressed_chunks(self, entry):
+        start = self.data_start + entry["offset"]
+        end = start + entry["length"]
+        decompressor = zlib.decompressobj()
+        for position in range(start, end, self.CHUNK_SIZE):
+            data = self.map[position:min(position + self.CHUNK_SIZE, end)]
+            while data:
+                yield decompressor.decompress(data, self.CHUNK_SIZE)
+                data = decompressor.unconsumed_tail
+        yield decompressor.flush()
+
+    def iter_column(self, name):
+        """
+        Yields the values of a column like `column` returns them, decompressing a chunk at a time.
+        """
+        entry = self.columns[name]
+        rest = b""
+        if entry["type"] == "jsonl":
+            for chunk in self.decompressed_chunks(entry):
+                lines = (rest + chunk).split(b"\n")
+                rest = lines.pop()
+                for line in lines:
+                    yield json.loads(line)
+            return
+        typecode = "q" if entry["type"] == "int64" else "I"
+        size = array(typecode).itemsize
+        for chunk in self.decompressed_chunks(entry):
+            data = rest + chunk
+            cut = len(data) - len(data) % size
+            rest = data[cut:]
+            values = unpack_ints(data[:cut], typecode)
+            if entry["type"] == "dictionary":
+                yield from (entry["values"][code] for code in values)
+            else:
+                yield from values
+
+    def iter_records(self):
+        """
+        Yields every row, as the (id, timestamp, event id, event name, flattened data) tuples
+        taken by `write_segment`, without decompressing whole columns.
+        """
+        keys = self.data_keys
+        columns = [self.iter_column(name) for name in INT_COLUMNS + ("event_name",)]
+        values = [self.iter_column(key) for key in keys]
+        for (row_id, timestamp, event_id, event_name), data in zip(zip(*columns), zip(*values)):
+            yield (
+                row_id,
+                timestamp,
+                event_id,
+                event_name,
+                {key: value for key, value in zip(keys, data) if value is not None},
+            )
+
+    def records(self):
+        """
+        Returns every row, see `iter_records`.
+        """
+        return list(self.iter_records())
+
+
+def archive_cutoff(months, today=None):
+    """
+    Returns the first day of the UTC month `months` months before the current one.
+    """
+    today = today or datetime.now(dt_timezone.utc).date()
+    return add_months(date(today.year, today.month, 1), -months)
+
+
+def archivable_months(creator_id, before):
+    """
+    Lists the UTC months before `before` in which a user still has raw logs of live events.
+    """
+    months = (
+        EventLog.objects.filter(
+            creator_id=creator_id,
+            timestamp__lt=month_start(before),
+            event__deleted_at__isnull=True,
+        )
+        .annotate(month=TruncMonth("timestamp", tzinfo=dt_timezone.utc))
+        .values_list("month", flat=True)
+        .distinct()
+        .order_by("month")
+    )
+    return [month.date() if isinstance(month, datetime) else month for month in months]
+
+
+def archive_month(creator_id, month, batch_size=DELETE_BATCH_SIZE):
+    """
+    Moves the raw logs of live events of a user in a UTC month to the month's segment, merging
+    them with the logs archived before. Logs of deleted events are left to the purger.
+
+    The logs are read in time order, `batch_size` at a time, and merged with the rows of the
+    existing segment as both are streamed to the new one. Only the ids of the moved logs are kept
+    in memory, 8 bytes each.
+
+    An interrupted run leaves logs both in the table and in the segment until the next run,
+    which removes them from the table.
+
+    Returns:
+        int: The number of logs moved.
+    """
+    start = month_start(month)
+    end = month_start(add_months(month, 1))
+    logs = EventLog.objects.filter(
+        creator_id=creator_id,
+        timestamp__gte=start,
+        timestamp__lt=end,
+        event__deleted_at__isnull=True,
+    )
+    if not logs.exists():
+        return 0
+
+    ids = array("q")
+
+    def read_logs():
+        rows = logs.order_by("timestamp", "id").values_list(
+            "id", "timestamp", "event_id", "event_name", "data"
+        )
+        for row_id, timestamp, event_id, event_name, data in rows.iterator(chunk_size=batch_size):
+            ids.append(row_id)
+            yield row_id, to_micros(timestamp), event_id, event_name, flatten(data)
+
+    path = segment_path(creator_id, month)
+    writer = SegmentWriter(path)
+    try:
+        with ExitStack() as stack:
+            archived = ()
+            if path.exists():
+                archived = stack.enter_context(SegmentReader(path)).iter_records()
+            previous = None
+            records = heapq.merge(read_logs(), archived, key=lambda record: (record[1], record[0]))
+            for record in records:
+                # Left in the table by an interrupted run
+                if record[0] != previous:
+                    writer.write(record)
+                previous = record[0]
+    except BaseException:
+        writer.discard()
+        raise
+    rows = writer.close()
+    EventArchiveSegment.objects.update_or_create(
+        creator_id=creator_id,
+        month=month,
+        defaults={"row_count": rows, "size": path.stat().st_size},
+    )
+
+    moved = 0
+    for index in range(0, len(ids), batch_size):
+        with transaction.atomic(using=shard_db()):
+            batch = ids[index:index + batch_size].tolist()
+            moved += EventLog.objects.filter(id__in=batch).delete()[0]
+    return moved
+
+
+def archive_event_logs(creator_id, before, batch_size=DELETE_BATCH_SIZE):
+    """
+    Archives the raw logs of a user older than a month.
+
+    Args:
+        creator_id (int): The user to archive.
+        before (date): The first day of a UTC month. Logs before it are archived.
+        batch_size (int): Number of logs deleted per transaction.
+
+    Returns:
+        dict: The number of logs moved per month.
+    """
+    fold_event_logs(creator_id, month_start(before))
+    moved = {}
+    for month in archivable_months(creator_id, before):
+        moved[month] = archive_month(creator_id, month, batch_size)
+    if moved:
+        stats_cache.bump(creator_id)
+    return moved
+
+
+def delete_segments(creator_id, before):
+    """
+    Deletes the segments of a user whose whole month is before `before`, for retention.
+
+    Returns:
+        int: The number of deleted segments.
+    """
+    segments = [
+        segment
+        for segment in EventArchiveSegment.objects.filter(creator_id=creator_id, month__lt=before.date())
+        if month_start(add_months(segment.month, 1)) <= before
+    ]
+    for segment in segments:
+        segment_path(creator_id, segment.month).unlink(missing_ok=True)
+        segment.delete()
+    if segments:
+        stats_cache.bump(creator_id)
+    return len(segments)
+
+
+def remap_segments(creator_id, event_ids):
+    """
+    Rewrites the segments of a user for another database, after the user moved to another shard.
+
+    The event ids are replaced and the logs of unknown events dropped. The logs get negative
+    ids, which never collide with the ids of the logs archived later from the new database.
+
+    Args:
+        creator_id (int): The user.
+        event_ids (dict): Maps the ids of the events of the user to their ids on the new database.
+    """
+    for month in EventArchiveSegment.objects.filter(creator_id=creator_id).values_list("month", flat=True):
+        path = segment_path(creator_id, month)
+        if not path.exists():
+            continue
+        with SegmentReader(path) as segment:
+            records = segment.records()
+        next_id = min([0] + [record[0] for record in records]) - 1
+        rows = []
+        for row_id, timestamp, event_id, event_name, data in records:
+            if event_id not in event_ids:
+                continue
+            if row_id > 0:
+                row_id, next_id = next_id, next_id - 1
+            rows.append((row_id, timestamp, event_ids[event_id], event_name, data))
+        write_segment(path, rows)
+        EventArchiveSegment.objects.filter(creator_id=creator_id, month=month).update(
+            row_count=len(rows), size=path.stat().st_size
+        )
+
+
+def truncate(moment, granularity, tz):
+    """
+    Truncates a UTC datetime to its bucket in a time zone, like the Trunc functions of the database.
+    """
+    local = moment.astimezone(tz)
+    if granularity == "minute":
+        return local.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return local.replace(minute=0, second=0, microsecond=0)
+    day = local.date()
+    if granularity == "week":
+        day -= timedelta(days=day.weekday())
+    elif granularity == "month":
+        day = day.replace(day=1)
+    return datetime(day.year, day.month, day.day, tzinfo=tz)
+
+
+def trend_rows(creator_id, options):
+    """
+    Counts the archived logs of a user per time bucket and event name, like `stats.trend_query`
+    does for the raw logs. Logs of deleted events are skipped.
+
+    Args:
+        creator_id (int): The authenticated user.
+        options (dict): The options returned by `stats.parse_trend_params`.
+
+    Returns:
+        list: Rows with the keys 'time_bucket', 'event_name' and 'count'.
+    """
+    start, end = options["start"], options["end"]
+    segments = EventArchiveSegment.objects.filter(creator_id=creator_id).order_by("month")
+    if start:
+        start_utc = start.astimezone(dt_timezone.utc)
+        segments = segments.filter(month__gte=date(start_utc.year, start_utc.month, 1))
+    if end:
+        segments = segments.filter(month__lte=end.astimezone(dt_timezone.utc).date())
+    months = list(segments.values_list("month", flat=True))
+    if not months:
+        return []
+
+    live = set(Event.objects.filter(user_id=creator_id).values_list("id", flat=True))
+    low = to_micros(start) if start else None
+    high = to_micros(end) if end else None
+    granularity, tz = options["granularity"], options["tz"]
+    counts = Counter()
+    # Buckets are at least a minute long, so the logs of a minute share one
+    buckets = {}
+    for month in months:
+        path = segment_path(creator_id, month)
+        if not path.exists():
+            # Removed by hand or not restored from a backup, its logs are still in the rollups
+            logger.warning("Archive segment %s is missing, skipping it", path)
+            continue
+        with SegmentReader(path) as segment:
+            columns = zip(
+                segment.iter_column("timestamp"),
+                segment.iter_column("event_id"),
+                segment.iter_column("event_name"),
+            )
+            for timestamp, event_id, event_name in columns:
+                if event_id not in live or (low is not None and timestamp < low):
+                    continue
+                if high is not None and timestamp >= high:
+                    continue
+                if options["event_name"] and event_name != options["event_name"]:
+                    continue
+                minute = timestamp // 60000000
+                if minute not in buckets:
+                    buckets[minute] = truncate(from_micros(minute * 60000000), granularity, tz)
+                counts[buckets[minute], event_name] += 1
+    return [
+        {"time_bucket": bucket, "event_name": event_name, "count": count}
+        for (bucket, event_name), count in counts.items()
+    ]
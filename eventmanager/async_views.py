@@ -0,0 +1,304 @@
+"""
+Async-native versions of the ingestion and stats endpoints, served under `/api/async/`.
+
+They are plain Django class-based views with `async` handlers, so under an ASGI server such as
+uvicorn a request waiting on the database or the cache does not hold a thread. Requests and
+responses have the same shape as the synchronous DRF views in `eventmanager/views.py`.
+"""
+import io
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import QueryDict, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_400_BAD_REQUEST,
+    HTTP_201_CREATED,
+    HTTP_202_ACCEPTED,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
+
+from . import archive, live, sharding, stats
+from .authentication import aauthenticate_token
+from .buffer import BufferFull, get_buffer, is_buffered
+from .caching import event_names, stats_cache
+from .ingest import mark_duplicates, save_event_logs
+from .models import EventLog
+from .renderers import ORJSONParser, json_response
+from .routers import replica_reads, replica_selector, shard_db, stats_cache_timeout, use_shard
+from .serializers import event_batch_item_validator, event_data_validator
+from .throttling import ingestion_throttle, request_cost
+
+EVENT_DOES_NOT_EXIST = "The specified event does not exist. Please create the event first."
+
+
+async def event_frequency(creator_id, params):
+    """
+    Returns the answer of the event frequency endpoint for a user, from the stats cache when
+    possible.
+    """
+    alias = await sync_to_async(replica_selector.choose)()
+
+    async def compute():
+        with replica_reads(alias):
+            query = stats.frequency_query(stats.daily_rollups(creator_id), params)
+            return stats.format_frequency(params, [row async for row in query])
+
+    return await stats_cache.aget_or_set(
+        creator_id, "event_frequency", params, compute, timeout=stats_cache_timeout(alias)
+    )
+
+
+class AsyncAPIView(View):
+    """
+    Base class of the async views.
+
+    Authenticates the request with its token, parses JSON bodies, runs the handler against the
+    shard of the user and turns the exceptions of Django REST framework into JSON error responses,
+    like the synchronous views do.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Clients authenticate with tokens, not session cookies
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            request.user, request.auth = await self.authenticate(request)
+            placement = await sharding.aplacement(request.user.id)
+            if placement.moving_to and request.method == "POST":
+                raise sharding.ShardMoving()
+            if request.method == "POST":
+                request.data = self.parse_body(request)
+            with use_shard(placement.alias):
+                return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            headers = {}
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                headers["WWW-Authenticate"] = "Token"
+            if getattr(exc, "wait", None):
+                headers["Retry-After"] = str(math.ceil(exc.wait))
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+            return json_response(data, status=exc.status_code, headers=headers)
+
+    async def authenticate(self, request):
+        """
+        Returns the (user, token) of the `Authorization: Token <key>` header of the request.
+
+        Raises:
+            NotAuthenticated: If the request has no token.
+            AuthenticationFailed: If the token is malformed or invalid.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != b"token":
+            raise exceptions.NotAuthenticated()
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        return await aauthenticate_token(key)
+
+    @staticmethod
+    def parse_body(request):
+        return ORJSONParser().parse(io.BytesIO(request.body or b"null"))
+
+    @staticmethod
+    def buffer_logs(logs):
+        """
+        Queues event logs for the background writer, see `eventmanager.views.buffer_logs`.
+        """
+        try:
+            get_buffer().put(logs)
+        except BufferFull:
+            return json_response(
+                {"error": "The server is busy. Please retry later."},
+                status=HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+        return None
+
+
+class AsyncEventLogData(AsyncAPIView):
+    """
+    Async version of `EventLogData`: creates a single event log for the authenticated user.
+    """
+
+    async def post(self, request):
+        await ingestion_throttle.acheck(request.user.id, request_cost(request.data))
+        validated_data, errors = event_data_validator.validate(request.data)
+        if errors:
+            raise exceptions.ValidationError(errors)
+
+        event_name = validated_data["event_name"]
+        resolved = await event_names.aresolve_many(request.user.id, [event_name])
+        event_id = resolved[event_name]
+        if event_id is None:
+            return json_response({"error": EVENT_DOES_NOT_EXIST}, status=HTTP_400_BAD_REQUEST)
+
+        log = EventLog(creator_id=request.user.id, event_id=event_id, **validated_data)
+        data = {"event_name": log.event_name, "data": log.data}
+        if is_buffered():
+            return self.buffer_logs([log]) or json_response(data, status=HTTP_202_ACCEPTED)
+
+        try:
+            # The log and its rollups are written in one transaction, which needs a single thread
+            stored = await sync_to_async(save_event_logs)([log])
+        except IntegrityError:
+            # The cached event was deleted by another process
+            event_names.invalidate(request.user.id, event_name)
+            return json_response({"error": EVENT_DOES_NOT_EXIST}, status=HTTP_400_BAD_REQUEST)
+        # A retry of a log that was already stored
+        return json_response(data, status=HTTP_201_CREATED if stored else HTTP_200_OK)
+
+
+class AsyncEventLogBatch(AsyncAPIView):
+    """
+    Async version of `EventLogBatch`: creates many event logs in a single request.
+    """
+    @property
+    def max_batch_size(self):
+        # Read on every request, so that the setting can be changed at runtime
+        return getattr(settings, "EVENTMANAGER_BATCH_MAX_SIZE", 5000)
+
+    async def post(self, request):
+        await ingestion_throttle.acheck(request.user.id, request_cost(request.data))
+        records = request.data
+        if not isinstance(records, list):
+            return json_response({"error": "Expected a list of event logs."}, status=HTTP_400_BAD_REQUEST)
+        if len(records) > self.max_batch_size:
+            return json_response(
+                {"error": f"A batch cannot contain more than {self.max_batch_size} event logs."},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        names = {
+            record.get("event_name")
+            for record in records
+            if isinstance(record, dict) and isinstance(record.get("event_name"), str)
+        }
+        event_ids = await event_names.aresolve_many(request.user.id, names)
+
+        results = []
+        logs = []
+        log_results = []
+        for index, record in enumerate(records):
+            validated_data, errors = event_batch_item_validator.validate(record)
+            if errors:
+                results.append({"index": index, "status": "rejected", "errors": errors})
+                continue
+            event_id = event_ids.get(validated_data["event_name"])
+            if event_id is None:
+                results.append(
+                    {
+                        "index": index,
+                        "status": "rejected",
+                        "errors": {"event_name": ["The specified event does not exist."]},
+                    }
+                )
+                continue
+            logs.append(
+                EventLog(creator_id=request.user.id, event_id=event_id, **validated_data)
+            )
+            results.append({"index": index, "status": "accepted"})
+            log_results.append(results[-1])
+
+        status = HTTP_201_CREATED
+        duplicates = 0
+        if not logs:
+            status = HTTP_400_BAD_REQUEST
+        elif is_buffered():
+            error = self.buffer_logs(logs)
+            if error:
+                return error
+            status = HTTP_202_ACCEPTED
+        else:
+            try:
+                stored = await sync_to_async(save_event_logs)(logs)
+            except IntegrityError:
+                # One of the cached events was deleted by another process
+                for name in names:
+                    event_names.invalidate(request.user.id, name)
+                return json_response(
+                    {"error": "One of the specified events no longer exists. Please retry."},
+                    status=HTTP_400_BAD_REQUEST,
+                )
+            duplicates = mark_duplicates(logs, stored, log_results)
+            if duplicates == len(logs):
+                # Retries of a batch that was already stored
+                status = HTTP_200_OK
+        return json_response(
+            {
+                "accepted": len(logs) - duplicates,
+                "rejected": len(records) - len(logs),
+                "duplicates": duplicates,
+                "results": results,
+            },
+            status=status,
+        )
+
+
+class AsyncEventFrequency(AsyncAPIView):
+    """
+    Async version of `EventFrequency`, answered from the daily rollups and the stats cache.
+    """
+
+    async def get(self, request):
+        return json_response(await event_frequency(request.user.id, request.GET))
+
+
+class AsyncEventTrends(AsyncAPIView):
+    """
+    Async version of `EventTrendsView`, answered from the daily rollups and the stats cache.
+    """
+
+    async def get(self, request):
+        params = request.GET
+        options = stats.parse_trend_params(params)
+
+        alias = await sync_to_async(replica_selector.choose)()
+
+        async def compute():
+            with replica_reads(alias):
+                query = stats.trend_query(request.user.id, options)
+                rows = [row async for row in query]
+                if stats.reads_raw_logs(options):
+                    rows += await sync_to_async(archive.trend_rows)(request.user.id, options)
+            return stats.format_trend(options, rows)
+
+        data = await stats_cache.aget_or_set(
+            request.user.id, "event_trend", params, compute, timeout=stats_cache_timeout(alias)
+        )
+        return json_response(data)
+
+
+class AsyncLiveEventCounts(AsyncAPIView):
+    """
+    Streams the number of logs per event name of the authenticated user as Server-Sent Events,
+    see `eventmanager/live.py`.
+    """
+
+    async def get(self, request):
+        alias = shard_db()
+
+        async def snapshot():
+            # The stream runs after the request left the shard of the user
+            with use_shard(alias):
+                rows = await event_frequency(request.user.id, QueryDict())
+            return {row["event_name"]: row["total"] for row in rows}
+
+        return StreamingHttpResponse(
+            live.event_stream(request.user.id, snapshot),
+            content_type="text/event-stream",
+            # Proxies must neither cache nor buffer the stream
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
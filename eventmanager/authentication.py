@@ -0,0 +1,55 @@
+import copy
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .caching import MISSING, TTLCache
+
+token_cache = TTLCache(
+    max_size=getattr(settings, "EVENTMANAGER_TOKEN_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "EVENTMANAGER_TOKEN_CACHE_TTL", 60),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that remembers the user of every valid token for a short time.
+
+    High-rate tracking clients send the same token with every request, so caching saves the
+    Token and User query on almost every call. Entries are dropped when a token is deleted,
+    for example on logout, or when its user is changed, see `eventmanager/signals.py`. Other
+    processes notice these changes once their entry expires.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is MISSING:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+        user, token = cached
+        # Every request gets its own copy, so changes to request.user are not shared
+        return copy.copy(user), token
+
+
+async def aauthenticate_token(key):
+    """
+    Asynchronous version of `CachedTokenAuthentication.authenticate_credentials`, for the async views.
+
+    Raises:
+        AuthenticationFailed: If the token does not exist or its user is inactive.
+    """
+    cached = token_cache.get(key)
+    if cached is MISSING:
+        try:
+            token = await Token.objects.select_related("user").aget(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        cached = (token.user, token)
+        token_cache.set(key, cached)
+    user, token = cached
+    return copy.copy(user), token
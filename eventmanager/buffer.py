@@ -0,0 +1,186 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, close_old_connections
+
+from .ingest import save_event_logs
+from .routers import shard_db, use_shard
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the same batch may succeed, for example a lost connection or a deadlock
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+class BufferFull(Exception):
+    """
+    Raised when the buffer cannot take more event logs until the worker catches up.
+    """
+
+
+class EventLogBuffer:
+    """
+    A bounded in-process queue of event logs that are written to the database by a background thread.
+
+    The worker writes a batch as soon as `flush_size` logs are waiting or `flush_interval` seconds
+    have passed since the last write. Logs are written to the shard that was current when they
+    were queued. While the database is unavailable the worker retries the same batch up to
+    `max_retries` times, so the buffer fills up and new logs are refused with `BufferFull`. A batch
+    that fails for another reason is split, and the logs the database rejects are dropped.
+    """
+
+    def __init__(
+        self, max_size=10000, flush_size=1000, flush_interval=1.0, max_retries=5, autostart=True
+    ):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.autostart = autostart
+        self._items = deque()
+        self._condition = threading.Condition()
+        self._worker = None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_size=getattr(settings, "EVENTMANAGER_BUFFER_MAX_SIZE", 10000),
+            flush_size=getattr(settings, "EVENTMANAGER_BUFFER_FLUSH_SIZE", 1000),
+            flush_interval=getattr(settings, "EVENTMANAGER_BUFFER_FLUSH_INTERVAL", 1.0),
+            max_retries=getattr(settings, "EVENTMANAGER_BUFFER_MAX_RETRIES", 5),
+        )
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, logs):
+        """
+        Queues unsaved EventLog instances for writing.
+
+        Either all of the logs are queued or none of them are.
+
+        Raises:
+            BufferFull: If the buffer does not have room for all of the logs.
+        """
+        with self._condition:
+            if len(self._items) + len(logs) > self.max_size:
+                raise BufferFull()
+            alias = shard_db()
+            self._items.extend((alias, log) for log in logs)
+            if len(self._items) >= self.flush_size:
+                self._condition.notify()
+        if self.autostart:
+            self.start()
+
+    def start(self):
+        """
+        Starts the background worker if it is not running yet.
+        """
+        with self._condition:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            if self._worker is None:
+                # Write whatever is still queued when the process shuts down
+                atexit.register(self.flush)
+            self._worker = threading.Thread(target=self._run, name="eventlog-buffer", daemon=True)
+            self._worker.start()
+
+    def flush(self):
+        """
+        Writes every queued event log from the calling thread.
+
+        Returns:
+            int: The number of event logs taken from the buffer.
+        """
+        written = 0
+        while True:
+            with self._condition:
+                batch = self._pop_batch()
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+    def _pop_batch(self):
+        count = min(len(self._items), self.flush_size)
+        return [self._items.popleft() for _ in range(count)]
+
+    def _take(self):
+        deadline = time.monotonic() + self.flush_interval
+        with self._condition:
+            while len(self._items) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self._pop_batch()
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception:
+                logger.exception("Dropping %d buffered event logs", len(batch))
+
+    def _write(self, batch):
+        shards = {}
+        for alias, log in batch:
+            shards.setdefault(alias, []).append(log)
+        for alias, logs in shards.items():
+            with use_shard(alias):
+                self._write_shard(logs)
+
+    def _write_shard(self, batch):
+        for attempt in range(self.max_retries + 1):
+            close_old_connections()
+            for log in batch:
+                # Ids assigned by a failed attempt were rolled back
+                log.pk = None
+            try:
+                save_event_logs(batch)
+                return
+            except TRANSIENT_ERRORS:
+                if attempt == self.max_retries:
+                    logger.exception("Dropping %d buffered event logs", len(batch))
+                    return
+                logger.exception("Could not write %d buffered event logs, retrying", len(batch))
+                time.sleep(self.flush_interval)
+            except DatabaseError:
+                # Most likely an event was deleted after its logs were queued, or the database
+                # rejects the data of a log. Write the halves separately to find the bad logs.
+                if len(batch) == 1:
+                    logger.exception("Dropping buffered log of event %s", batch[0].event_id)
+                    return
+                middle = len(batch) // 2
+                self._write_shard(batch[:middle])
+                self._write_shard(batch[middle:])
+                return
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    Returns the buffer shared by every request of this process.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = EventLogBuffer.from_settings()
+        return _buffer
+
+
+def is_buffered():
+    """
+    Returns True if event logs should be buffered instead of written inside the request.
+    """
+    return getattr(settings, "EVENTMANAGER_INGEST_MODE", "sync") == "buffered"
@@ -0,0 +1,354 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .metrics import Counter
+from .models import Event
+from .routers import shard_db
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    A thread-safe, size-bounded LRU cache whose entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class EventNameCache:
+    """
+    Resolves the name of an event to its id for a given user.
+
+    Lookups are answered from an in-process TTL cache, backed by a Django cache when
+    `EVENTMANAGER_EVENT_CACHE` names one, so that other processes share the results.
+    Unknown names are only cached in the shared cache, for `miss_ttl` seconds: an event created
+    through another process cannot invalidate the memory of this one. Entries are invalidated by
+    the signals of the Event model, see `eventmanager/signals.py`. Event ids are only valid on
+    one database, so entries are kept per shard: a user moved to another shard gets fresh entries.
+    """
+
+    # Stored in the shared cache for names that do not belong to an event
+    NOT_FOUND = 0
+
+    def __init__(self, max_size=10000, ttl=60, cache_alias=None, miss_ttl=5):
+        self.local = TTLCache(max_size=max_size, ttl=ttl)
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.cache_alias = cache_alias
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_size=getattr(settings, "EVENTMANAGER_EVENT_CACHE_SIZE", 10000),
+            ttl=getattr(settings, "EVENTMANAGER_EVENT_CACHE_TTL", 60),
+            cache_alias=getattr(settings, "EVENTMANAGER_EVENT_CACHE", None),
+            miss_ttl=getattr(settings, "EVENTMANAGER_EVENT_CACHE_MISS_TTL", 5),
+        )
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    @staticmethod
+    def shared_key(user_id, name):
+        digest = hashlib.md5(name.encode()).hexdigest()
+        return f"eventmanager:event:{shard_db()}:{user_id}:{digest}"
+
+    def remember(self, shard, user_id, found):
+        for name, event_id in found.items():
+            self.local.set((shard, user_id, name), event_id)
+
+    def shared_found(self, user_id, found):
+        return {self.shared_key(user_id, name): event_id for name, event_id in found.items()}
+
+    def shared_misses(self, user_id, names, found):
+        return {
+            self.shared_key(user_id, name): self.NOT_FOUND for name in names if name not in found
+        }
+
+    def resolve(self, user_id, name):
+        """
+        Returns the id of the event of the user with the given name, or None if there is none.
+        """
+        return self.resolve_many(user_id, [name]).get(name)
+
+    def resolve_many(self, user_id, names):
+        """
+        Resolves several event names of a user, querying the database at most once.
+
+        Returns:
+            dict: Maps every name to an event id, or to None for unknown names.
+        """
+        shard = shard_db()
+        resolved = {}
+        missing = []
+        for name in set(names):
+            event_id = self.local.get((shard, user_id, name))
+            if event_id is MISSING:
+                missing.append(name)
+            else:
+                resolved[name] = event_id
+
+        if missing and self.shared is not None:
+            keys = {self.shared_key(user_id, name): name for name in missing}
+            for key, event_id in self.shared.get_many(list(keys)).items():
+                name = keys[key]
+                resolved[name] = event_id or None
+                if event_id:
+                    self.local.set((shard, user_id, name), event_id)
+            missing = [name for name in missing if name not in resolved]
+
+        if missing:
+            found = dict(
+                Event.objects.filter(user_id=user_id, name__in=missing).values_list("name", "id")
+            )
+            for name in missing:
+                resolved[name] = found.get(name)
+            self.remember(shard, user_id, found)
+            if self.shared is not None:
+                self.shared.set_many(self.shared_found(user_id, found), self.ttl)
+                self.shared.set_many(self.shared_misses(user_id, missing, found), self.miss_ttl)
+        return resolved
+
+    async def aresolve_many(self, user_id, names):
+        """
+        Asynchronous version of `resolve_many`, for the async views.
+        """
+        shard = shard_db()
+        resolved = {}
+        missing = []
+        for name in set(names):
+            event_id = self.local.get((shard, user_id, name))
+            if event_id is MISSING:
+                missing.append(name)
+            else:
+                resolved[name] = event_id
+
+        if missing and self.shared is not None:
+            keys = {self.shared_key(user_id, name): name for name in missing}
+            for key, event_id in (await self.shared.aget_many(list(keys))).items():
+                name = keys[key]
+                resolved[name] = event_id or None
+                if event_id:
+                    self.local.set((shard, user_id, name), event_id)
+            missing = [name for name in missing if name not in resolved]
+
+        if missing:
+            found = {}
+            events = Event.objects.filter(user_id=user_id, name__in=missing).values_list("name", "id")
+            async for name, event_id in events:
+                found[name] = event_id
+            for name in missing:
+                resolved[name] = found.get(name)
+            self.remember(shard, user_id, found)
+            if self.shared is not None:
+                await self.shared.aset_many(self.shared_found(user_id, found), self.ttl)
+                await self.shared.aset_many(
+                    self.shared_misses(user_id, missing, found), self.miss_ttl
+                )
+        return resolved
+
+    def invalidate(self, user_id, name):
+        self.local.delete((shard_db(), user_id, name))
+        if self.shared is not None:
+            self.shared.delete(self.shared_key(user_id, name))
+
+    def clear(self):
+        self.local.clear()
+
+
+event_names = EventNameCache.from_settings()
+
+
+stats_cache_requests = Counter(
+    "eventmanager_stats_cache_requests_total",
+    "Requests to the stats endpoints, by endpoint and cache result.",
+    ["endpoint", "result"],
+)
+
+
+class StatsCache:
+    """
+    Caches the responses of the stats endpoints in a Django cache.
+
+    Keys contain a version number per creator that is bumped whenever event logs of that creator
+    are written or their events are deleted, so cached answers never go stale and can be kept
+    for a long time. That only holds if every process bumps the versions in the same cache: in a
+    per-process memory cache answers are kept for `local_timeout` seconds at most. Without a
+    `cache_alias` nothing is cached.
+    """
+
+    def __init__(self, cache_alias=None, timeout=86400, local_timeout=5):
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self.local_timeout = local_timeout
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            cache_alias=getattr(settings, "EVENTMANAGER_STATS_CACHE", None),
+            timeout=getattr(settings, "EVENTMANAGER_STATS_CACHE_TIMEOUT", 86400),
+            local_timeout=getattr(settings, "EVENTMANAGER_STATS_CACHE_LOCAL_TIMEOUT", 5),
+        )
+
+    @property
+    def enabled(self):
+        return self.cache_alias is not None
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def answer_timeout(self, timeout=None):
+        """
+        Returns how long to keep a computed answer, `timeout` or the default one.
+
+        Bumps made by other processes, including the management commands, never reach a memory
+        cache, so its answers expire after `local_timeout` seconds.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if isinstance(self.cache, LocMemCache):
+            return min(timeout, self.local_timeout)
+        return timeout
+
+    def clear(self):
+        if self.enabled:
+            self.cache.clear()
+
+    @staticmethod
+    def version_key(creator_id):
+        return f"eventmanager:stats-version:{creator_id}"
+
+    def version(self, creator_id):
+        key = self.version_key(creator_id)
+        version = self.cache.get(key)
+        if version is None:
+            # Start from a fresh value, so entries cached before the version was evicted are never hit
+            self.cache.add(key, time.time_ns(), None)
+            version = self.cache.get(key)
+        return version
+
+    async def aversion(self, creator_id):
+        key = self.version_key(creator_id)
+        version = await self.cache.aget(key)
+        if version is None:
+            await self.cache.aadd(key, time.time_ns(), None)
+            version = await self.cache.aget(key)
+        return version
+
+    def bump(self, creator_id):
+        """
+        Invalidates every cached answer of a creator.
+        """
+        if not self.enabled:
+            return
+        key = self.version_key(creator_id)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.add(key, time.time_ns(), None)
+
+    def bump_on_commit(self, creator_id, using=None):
+        """
+        Invalidates every cached answer of a creator once the current transaction commits, right
+        away outside of a transaction.
+
+        A bump inside the transaction would let a request that still reads the old rows cache its
+        answer under the new version.
+        """
+        transaction.on_commit(lambda: self.bump(creator_id), using=using or shard_db())
+
+    @staticmethod
+    def key(creator_id, version, endpoint, params):
+        normalized = urlencode(sorted(params.lists()), doseq=True)
+        digest = hashlib.md5(normalized.encode()).hexdigest()
+        # Date ranges without an end default to today, so their answers change at midnight
+        # without any write
+        today = date.today().isoformat()
+        return f"eventmanager:stats:{creator_id}:{version}:{endpoint}:{today}:{digest}"
+
+    def get_or_set(self, creator_id, endpoint, params, compute, timeout=None):
+        """
+        Returns the cached answer of an endpoint for the given query parameters, computing it on a miss.
+
+        Args:
+            creator_id (int): The authenticated user.
+            endpoint (str): The name of the endpoint.
+            params (QueryDict): The query parameters of the request.
+            compute (callable): Returns the answer of the endpoint, it has to be picklable.
+            timeout (int, optional): Seconds to keep a computed answer, instead of the default.
+        """
+        if not self.enabled:
+            return compute()
+        key = self.key(creator_id, self.version(creator_id), endpoint, params)
+        data = self.cache.get(key, MISSING)
+        if data is not MISSING:
+            stats_cache_requests.inc(endpoint=endpoint, result="hit")
+            return data
+        stats_cache_requests.inc(endpoint=endpoint, result="miss")
+        data = compute()
+        self.cache.set(key, data, self.answer_timeout(timeout))
+        return data
+
+    async def aget_or_set(self, creator_id, endpoint, params, compute, timeout=None):
+        """
+        Asynchronous version of `get_or_set`, where `compute` is a coroutine function.
+        """
+        if not self.enabled:
+            return await compute()
+        key = self.key(creator_id, await self.aversion(creator_id), endpoint, params)
+        data = await self.cache.aget(key, MISSING)
+        if data is not MISSING:
+            stats_cache_requests.inc(endpoint=endpoint, result="hit")
+            return data
+        stats_cache_requests.inc(endpoint=endpoint, result="miss")
+        data = await compute()
+        await self.cache.aset(key, data, self.answer_timeout(timeout))
+        return data
+
+
+stats_cache = StatsCache.from_settings()
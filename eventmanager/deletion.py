@@ -0,0 +1,81 @@
+"""
+Deletion of events with large log histories.
+
+Deleting an event only marks it as deleted and removes its small derived rows, so the request
+returns right away. Its raw logs are removed afterwards by the `purge_deleted_events` command, in
+batches of consecutive ids, each with a single DELETE statement. Until then the logs of deleted
+events are ignored by the ingestion endpoints and by the stats.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import stats_cache
+from .models import Event, EventLog, EventRollup, EventUniqueSketch
+from .routers import shard_db
+
+# Number of event logs removed by a single DELETE statement.
+PURGE_BATCH_SIZE = 10000
+
+
+def soft_delete_event(event):
+    """
+    Marks an event as deleted and removes its rollups and sketches, so stats stop counting it.
+    """
+    with transaction.atomic(using=shard_db()):
+        event.deleted_at = timezone.now()
+        event.save(update_fields=["deleted_at", "modified_at"])
+        delete_derived_rows(event)
+
+
+def delete_derived_rows(event):
+    EventRollup.objects.filter(event_id=event.id).delete()
+    EventUniqueSketch.objects.filter(event_id=event.id).delete()
+    stats_cache.bump_on_commit(event.user_id)
+
+
+def purge_event(event, batch_size=PURGE_BATCH_SIZE, max_batches=None):
+    """
+    Removes the logs of a deleted event in batches, then the event itself.
+
+    Args:
+        event (Event): An event marked as deleted.
+        batch_size (int): Number of logs removed per transaction.
+        max_batches (int, optional): Stop after this many batches, the next run continues where it stopped.
+
+    Returns:
+        tuple: The number of logs removed, and whether the event is gone.
+    """
+    # Processes that still had the event in their name cache may have counted new logs
+    delete_derived_rows(event)
+    logs = EventLog.objects.filter(event_id=event.id)
+    purged = batches = 0
+    while max_batches is None or batches < max_batches:
+        # The id of the last log of the next batch
+        last_id = logs.order_by("id").values_list("id", flat=True)[batch_size - 1:batch_size].first()
+        batch = logs if last_id is None else logs.filter(id__lte=last_id)
+        with transaction.atomic(using=shard_db()):
+            purged += batch.delete()[0]
+        batches += 1
+        if last_id is None:
+            Event.all_objects.filter(id=event.id).delete()
+            return purged, True
+    return purged, False
+
+
+def purge_deleted_events(batch_size=PURGE_BATCH_SIZE, max_batches=None):
+    """
+    Purges every event marked as deleted, oldest first.
+
+    Args:
+        batch_size (int): Number of logs removed per transaction.
+        max_batches (int, optional): Maximum number of batches per event.
+
+    Returns:
+        tuple: The number of logs removed, and the number of events that are gone.
+    """
+    purged = removed = 0
+    for event in Event.all_objects.filter(deleted_at__isnull=False).order_by("deleted_at"):
+        count, done = purge_event(event, batch_size, max_batches)
+        purged += count
+        removed += done
+    return purged, removed
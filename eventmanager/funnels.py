@@ -0,0 +1,123 @@
+"""
+Conversion funnels over the raw event logs.
+
+The logs of the steps are read once, ordered by the join key and the timestamp, and every key
+is run through a small state machine, so the cost of a funnel grows with the number of matching
+logs and not with the number of steps.
+"""
+from datetime import timedelta
+
+from django.db.models.fields.json import KeyTextTransform
+
+from .models import EventLog
+
+
+class Funnel:
+    """
+    Counts how many keys went through an ordered list of event names within a time window.
+
+    A key reaches step n if it logged the events of steps 1 to n in order, with the event of step
+    n at most `window` after the event of step 1 that started the chain.
+    """
+
+    def __init__(self, steps, window):
+        """
+        Args:
+            steps (list): The event names of the steps, in order.
+            window (timedelta): The maximum time between the first and the last step of a chain.
+        """
+        self.steps = list(steps)
+        self.window = window
+        # Steps of every event name, latest first, so one log never advances two steps at once
+        self.levels = {}
+        for level, name in enumerate(self.steps):
+            self.levels.setdefault(name, []).insert(0, level)
+
+    def evaluate(self, rows):
+        """
+        Runs the funnel over a stream of logs.
+
+        Args:
+            rows (iterable): (key, event_name, timestamp) tuples ordered by key and timestamp.
+
+        Returns:
+            list: The number of keys that reached each step.
+        """
+        counts = [0] * len(self.steps)
+        current_key = None
+        # Start of the latest chain that reached each step, for the current key
+        starts = None
+        for key, event_name, timestamp in rows:
+            if key != current_key or starts is None:
+                self.count_key(starts, counts)
+                current_key = key
+                starts = [None] * len(self.steps)
+            for level in self.levels.get(event_name, ()):
+                if level == 0:
+                    starts[0] = timestamp
+                    continue
+                start = starts[level - 1]
+                if start is not None and timestamp - start <= self.window:
+                    # A chain that started later is more likely to fit the window of the next steps
+                    if starts[level] is None or start > starts[level]:
+                        starts[level] = start
+        self.count_key(starts, counts)
+        return counts
+
+    @staticmethod
+    def count_key(starts, counts):
+        if starts is None:
+            return
+        for level, start in enumerate(starts):
+            if start is None:
+                break
+            counts[level] += 1
+
+
+def funnel_rows(creator_id, steps, key, start=None, end=None):
+    """
+    Returns the logs of a user that can take part in a funnel.
+
+    Args:
+        creator_id (int): The authenticated user.
+        steps (list): The event names of the steps.
+        key (str): The key of `EventLog.data` that identifies who went through the funnel.
+        start (datetime, optional): Only read logs from this time on.
+        end (datetime, optional): Only read logs before this time.
+
+    Returns:
+        QuerySet: (key, event_name, timestamp) rows ordered by key and timestamp.
+    """
+    logs = EventLog.objects.filter(
+        creator_id=creator_id, event_name__in=set(steps), event__deleted_at__isnull=True
+    )
+    if start:
+        logs = logs.filter(timestamp__gte=start)
+    if end:
+        logs = logs.filter(timestamp__lt=end)
+    return (
+        logs.annotate(funnel_key=KeyTextTransform(key, "data"))
+        .filter(funnel_key__isnull=False)
+        .order_by("funnel_key", "timestamp")
+        .values_list("funnel_key", "event_name", "timestamp")
+    )
+
+
+def run_funnel(creator_id, steps, key, window, start=None, end=None, chunk_size=2000):
+    """
+    Computes a funnel over the logs of a user, reading them once with a server-side cursor.
+
+    Returns:
+        list: One dictionary per step, with the event name, the number of keys that reached it
+        and the conversion rate from the first step.
+    """
+    rows = funnel_rows(creator_id, steps, key, start, end)
+    counts = Funnel(steps, timedelta(seconds=window)).evaluate(rows.iterator(chunk_size=chunk_size))
+    return [
+        {
+            "event_name": name,
+            "count": count,
+            "conversion": round(count / counts[0], 4) if counts[0] else 0,
+        }
+        for name, count in zip(steps, counts)
+    ]
@@ -0,0 +1,87 @@
+"""
+A small HyperLogLog implementation used to estimate the number of distinct values.
+
+A sketch uses one byte per register, 2**precision bytes in total, whatever the number of
+values added to it. Sketches with the same precision can be merged, and the estimate of the
+merged sketch is the estimate of the union of their values.
+"""
+import hashlib
+import json
+import math
+
+PRECISION = 12
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values added to it.
+
+    With the default precision of 12 the sketch takes 4 KiB and the standard error of the
+    estimate is 1.04 / sqrt(4096), about 1.6%.
+    """
+
+    def __init__(self, precision=PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        if registers is None:
+            self.registers = bytearray(self.size)
+        else:
+            if len(registers) != self.size:
+                raise ValueError(f"Expected {self.size} registers, got {len(registers)}.")
+            self.registers = bytearray(registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Loads a sketch stored with `to_bytes`. The precision is derived from its size.
+        """
+        return cls(precision=len(data).bit_length() - 1, registers=data)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    @property
+    def error_rate(self):
+        """
+        The standard error of the estimate, relative to the true count.
+        """
+        return 1.04 / math.sqrt(self.size)
+
+    @staticmethod
+    def hash(value):
+        """
+        Returns a 64 bit hash of the JSON form of a value, so that 1 and "1" are different values.
+        """
+        digest = hashlib.blake2b(json.dumps(value, sort_keys=True).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def add(self, value):
+        hashed = self.hash(value)
+        bits = 64 - self.precision
+        index = hashed >> bits
+        # Position of the leftmost 1 in the remaining bits
+        rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """
+        Adds the values of another sketch with the same precision to this one.
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precisions.")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """
+        Returns the estimated number of distinct values added to the sketch.
+        """
+        size = self.size
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = size * math.log(size / zeros)
+        return round(estimate)
@@ -0,0 +1,178 @@
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+
+from .caching import MISSING, TTLCache, stats_cache
+from .models import EventLog
+from .partitioning import is_partitioned
+from .routers import shard_db
+from . import live, rollups, sketches
+
+# Number of rows sent to the database in a single INSERT statement.
+INSERT_BATCH_SIZE = getattr(settings, "EVENTMANAGER_INSERT_BATCH_SIZE", 1000)
+
+# (creator id, client id) of the event logs stored recently, so that retries are dropped without
+# a query. The unique index on those columns is what guarantees that a log is stored once.
+recent_client_ids = TTLCache(
+    max_size=getattr(settings, "EVENTMANAGER_CLIENT_ID_CACHE_SIZE", 100000),
+    ttl=getattr(settings, "EVENTMANAGER_CLIENT_ID_CACHE_TTL", 600),
+)
+
+# Whether the EventLog table of a database alias is partitioned, checked again every minute since
+# `partition_eventlogs` converts the table of a running deployment
+partitioned_tables = TTLCache(max_size=100, ttl=60)
+
+
+def lookup_before_insert(using):
+    """
+    Tells whether the client ids have to be looked up before the insert, which is only the case
+    on a partitioned table: its unique index also contains the timestamp, see partitioning.py.
+    Elsewhere the index rejects the duplicates, and `insert_idempotent` looks them up afterwards.
+    """
+    partitioned = partitioned_tables.get(using)
+    if partitioned is MISSING:
+        partitioned = is_partitioned(connections[using])
+        partitioned_tables.set(using, partitioned)
+    return partitioned
+
+
+def drop_duplicates(logs, lookup=True):
+    """
+    Removes the event logs whose client id was already stored for their creator, or appears
+    earlier in the list. Logs without a client id are kept.
+
+    Recently stored client ids are found in `recent_client_ids`, the others with one query
+    if `lookup` is true.
+
+    Args:
+        logs (list): Unsaved EventLog instances.
+        lookup (bool): Whether to query the client ids that are not in `recent_client_ids`.
+
+    Returns:
+        list: The logs to store, in their original order.
+    """
+    seen = set()
+    kept = []
+    lookups = {}
+    for log in logs:
+        if log.client_id is not None:
+            key = (log.creator_id, log.client_id)
+            if key in seen or recent_client_ids.get(key) is not MISSING:
+                continue
+            seen.add(key)
+            lookups.setdefault(log.creator_id, []).append(log.client_id)
+        kept.append(log)
+    if not lookups or not lookup:
+        return kept
+
+    stored = set()
+    for creator_id, client_ids in lookups.items():
+        stored.update(
+            EventLog.objects.filter(creator_id=creator_id, client_id__in=client_ids).values_list(
+                "creator_id", "client_id"
+            )
+        )
+    for key in stored:
+        recent_client_ids.set(key, True)
+    return [
+        log for log in kept if log.client_id is None or (log.creator_id, log.client_id) not in stored
+    ]
+
+
+def remember_client_ids(logs):
+    for log in logs:
+        if log.client_id is not None:
+            recent_client_ids.set((log.creator_id, log.client_id), True)
+
+
+def save_event_logs(logs):
+    """
+    Inserts a list of unsaved EventLog instances in as few queries as possible.
+
+    All rows are written inside a single transaction, so either the whole list is
+    stored or none of it is. Logs whose client id was already stored are skipped, like an
+    `INSERT ... ON CONFLICT DO NOTHING` would: the recently stored ones before the insert, the
+    others when the unique index rejects them, see `insert_idempotent`.
+
+    Args:
+        logs (list): Unsaved EventLog instances.
+
+    Returns:
+        list: The saved EventLog instances, without the skipped duplicates.
+    """
+    using = shard_db()
+    logs = drop_duplicates(logs, lookup=lookup_before_insert(using))
+    if not logs:
+        return []
+    with transaction.atomic(using=using):
+        if any(log.client_id is not None for log in logs):
+            logs = insert_idempotent(logs, using)
+            transaction.on_commit(lambda: remember_client_ids(logs), using=using)
+        else:
+            logs = EventLog.objects.bulk_create(logs, batch_size=INSERT_BATCH_SIZE)
+        process_event_logs(logs)
+    return logs
+
+
+def insert_idempotent(logs, using):
+    """
+    Inserts event logs with client ids inside a savepoint. If one of the client ids was already
+    stored, by an earlier request or a concurrent one, the insert is rolled back, the stored client
+    ids are looked up, and the insert is retried in a new savepoint without the duplicates, until
+    it succeeds. So only retries pay for the lookup.
+
+    `bulk_create(ignore_conflicts=True)` would skip them in the database, but it does not tell
+    which rows were inserted, and only those may be added to the rollups and sketches.
+
+    On a partitioned table the unique index also contains the timestamp, so concurrent retries
+    with different timestamps are both stored, see `eventmanager/partitioning.py`.
+    """
+    while True:
+        try:
+            with transaction.atomic(using=using):
+                return EventLog.objects.bulk_create(logs, batch_size=INSERT_BATCH_SIZE)
+        except IntegrityError:
+            remaining = drop_duplicates(logs)
+            if len(remaining) == len(logs):
+                # Not a duplicate, for example a deleted event
+                raise
+            if not remaining:
+                return []
+            logs = remaining
+
+
+def mark_duplicates(logs, stored, results):
+    """
+    Marks the results of the batch records that were skipped as duplicates.
+
+    Args:
+        logs (list): The event logs passed to `save_event_logs`.
+        stored (list): The event logs it returned.
+        results (list): The result of every log, in the same order.
+
+    Returns:
+        int: The number of duplicates.
+    """
+    stored = {id(log) for log in stored}
+    duplicates = 0
+    for log, result in zip(logs, results):
+        if id(log) not in stored:
+            result["status"] = "duplicate"
+            duplicates += 1
+    return duplicates
+
+
+def process_event_logs(logs):
+    """
+    Updates everything derived from the raw event logs after they have been written.
+
+    Every ingestion path calls this exactly once for each stored log, either directly or
+    through the `post_save` signal of EventLog.
+
+    Args:
+        logs (list): Saved EventLog instances.
+    """
+    rollups.record_event_logs(logs)
+    sketches.record_event_logs(logs)
+    live.publish_event_logs(logs)
+    for creator_id in {log.creator_id for log in logs}:
+        stats_cache.bump_on_commit(creator_id)
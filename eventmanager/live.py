@@ -0,0 +1,169 @@
+"""
+Live event counters, pushed to dashboards over Server-Sent Events by `AsyncLiveEventCounts`.
+
+Once the transaction of an ingestion commits, `publish_event_logs` adds the number of stored logs
+per user and event name to `hub`. Every `EVENTMANAGER_LIVE_INTERVAL` seconds the hub turns the
+increments of each user into a single message and queues the same bytes on every open stream of
+that user, so any number of dashboards share one aggregation and no query. Users without open
+streams cost a dictionary lookup per ingestion.
+
+A stream starts with a `snapshot` event holding the totals per event name, followed by `counts`
+events holding the increments since the previous message:
+
+    event: snapshot
+    data: {"signup": 120, "click": 5400}
+
+    event: counts
+    data: {"click": 3}
+
+A stream that does not keep up gets a new snapshot instead of the increments it missed. Streams
+are closed after `EVENTMANAGER_LIVE_MAX_DURATION` seconds, and browsers reconnect by themselves.
+
+The hub lives in the memory of a process: a stream only counts the logs ingested by the process
+that serves it, so the ingestion endpoints and the streams have to be served by the same ASGI
+process, or the streams miss the logs of the others until their next snapshot.
+"""
+import asyncio
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .renderers import ORJSONRenderer
+from .routers import shard_db
+
+# Sent instead of a message to a stream whose queue was full, which then sends a new snapshot
+RESYNC = object()
+
+
+def sse_message(event, data):
+    """
+    Returns a Server-Sent Event as bytes, with `data` as JSON.
+    """
+    return b"event: " + event.encode() + b"\ndata: " + ORJSONRenderer().render(data) + b"\n\n"
+
+
+class LiveHub:
+    """
+    In-process pub/sub of the event counts of the users.
+
+    Ingestion may publish from any thread. The streams and the task that sends the messages run
+    on the event loop of the ASGI server.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Increments waiting for the next message, per user and event name
+        self.pending = {}
+        # Queues of the open streams, per user
+        self.streams = {}
+        self.task = None
+
+    def publish(self, counts):
+        """
+        Adds increments to the next messages.
+
+        Args:
+            counts (Counter): Numbers of logs per (user id, event name).
+        """
+        with self.lock:
+            for (creator_id, event_name), count in counts.items():
+                if creator_id in self.streams:
+                    self.pending.setdefault(creator_id, Counter())[event_name] += count
+
+    def flush(self):
+        """
+        Sends the pending increments of every user to its streams.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for creator_id, counts in pending.items():
+            message = sse_message("counts", dict(counts))
+            for queue in list(self.streams.get(creator_id, ())):
+                try:
+                    queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    # The stream missed increments, it has to start over from a snapshot
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RESYNC)
+
+    async def run(self):
+        interval = getattr(settings, "EVENTMANAGER_LIVE_INTERVAL", 1.0)
+        while self.streams:
+            await asyncio.sleep(interval)
+            self.flush()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.task = loop.create_task(self.run())
+
+    def subscribe(self, creator_id):
+        """
+        Opens a stream of the messages of a user, to be closed with `unsubscribe`. Must be called
+        on the event loop.
+
+        Returns:
+            asyncio.Queue: Receives the messages as bytes, or RESYNC.
+        """
+        queue = asyncio.Queue(maxsize=getattr(settings, "EVENTMANAGER_LIVE_QUEUE_SIZE", 100))
+        with self.lock:
+            self.streams.setdefault(creator_id, set()).add(queue)
+        self.start()
+        return queue
+
+    def unsubscribe(self, creator_id, queue):
+        with self.lock:
+            streams = self.streams.get(creator_id, set())
+            streams.discard(queue)
+            if not streams:
+                self.streams.pop(creator_id, None)
+                self.pending.pop(creator_id, None)
+
+
+hub = LiveHub()
+
+
+def publish_event_logs(logs):
+    """
+    Publishes the stored event logs of the users that have open streams once the transaction
+    commits, see `eventmanager.ingest.process_event_logs`.
+    """
+    if not hub.streams:
+        return
+    counts = Counter((log.creator_id, log.event_name) for log in logs if log.creator_id in hub.streams)
+    if counts:
+        transaction.on_commit(lambda: hub.publish(counts), using=shard_db())
+
+
+async def event_stream(creator_id, snapshot):
+    """
+    Yields the Server-Sent Events of a stream of live counters.
+
+    Args:
+        creator_id (int): The authenticated user.
+        snapshot (callable): Coroutine function returning the totals per event name.
+    """
+    heartbeat = getattr(settings, "EVENTMANAGER_LIVE_HEARTBEAT", 15)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, "EVENTMANAGER_LIVE_MAX_DURATION", 300)
+    # Subscribed first, so no increment is lost between the snapshot and the first message
+    queue = hub.subscribe(creator_id)
+    try:
+        yield b"retry: 1000\n\n" + sse_message("snapshot", await snapshot())
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                if loop.time() >= deadline:
+                    break
+                # Keeps proxies from closing an idle connection
+                yield b": keep-alive\n\n"
+                continue
+            if message is RESYNC:
+                message = sse_message("snapshot", await snapshot())
+            yield message
+    finally:
+        hub.unsubscribe(creator_id, queue)
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from eventmanager import archive, retention
+from eventmanager.models import EventLog
+from eventmanager.routers import use_shard
+from eventmanager.sharding import group_by_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the raw event logs older than a number of months to compressed monthly segment "
+        "files under EVENTMANAGER_ARCHIVE_DIR. Their counts are kept in the rollups, and the "
+        "trends that read raw logs also read the segments."
+    )
+
+    def add_arguments(self, parser):
+        default = getattr(settings, "EVENTMANAGER_ARCHIVE_AFTER_MONTHS", 12)
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=default,
+            help=f"Archive the UTC months that ended this many months ago or more (default: {default}).",
+        )
+        parser.add_argument("--user", type=int, help="Only archive the logs of this user id.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=retention.DELETE_BATCH_SIZE,
+            help=f"Number of logs deleted per transaction (default: {retention.DELETE_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many logs would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        before = archive.archive_cutoff(options["months"])
+        users = User.objects.order_by("id")
+        if options["user"] is not None:
+            users = users.filter(id=options["user"])
+
+        moved = 0
+        for alias, user_ids in group_by_shard(users.values_list("id", flat=True)).items():
+            with use_shard(alias):
+                moved += self.archive_users(user_ids, before, options)
+        if not options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Archived {moved} event logs."))
+
+    def archive_users(self, user_ids, before, options):
+        """
+        Archives the users of the current shard.
+
+        Returns:
+            int: The number of archived logs.
+        """
+        moved = 0
+        for user_id in user_ids:
+            if options["dry_run"]:
+                count = EventLog.objects.filter(
+                    creator_id=user_id, timestamp__lt=archive.month_start(before), event__deleted_at__isnull=True
+                ).count()
+                self.stdout.write(f"User {user_id}: {count} event logs before {before}.")
+                continue
+            for month, count in archive.archive_event_logs(user_id, before, options["batch_size"]).items():
+                self.stdout.write(f"User {user_id}: archived {count} event logs of {month:%Y-%m}.")
+                moved += count
+        return moved
@@ -0,0 +1,103 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from eventmanager import archive, partitioning, retention
+from eventmanager.caching import stats_cache
+from eventmanager.models import EventLog, RetentionPolicy
+from eventmanager.routers import shard_db, use_shard
+from eventmanager.sharding import group_by_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Removes the raw event logs that are older than the retention of their user. Their counts "
+        "are kept in the rollups. On a partitioned table, the months that expired for every user "
+        "are dropped as a whole. Archived months that expired are removed too."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only compact the logs of this user id.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=retention.DELETE_BATCH_SIZE,
+            help=f"Number of logs deleted per transaction (default: {retention.DELETE_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many logs would be removed.",
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("id")
+        if options["user"] is not None:
+            users = users.filter(id=options["user"])
+
+        deleted = 0
+        for alias, user_ids in group_by_shard(users.values_list("id", flat=True)).items():
+            with use_shard(alias):
+                deleted += self.compact(user_ids, options)
+        if not options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"Removed {deleted} event logs."))
+
+    def compact(self, user_ids, options):
+        """
+        Compacts the users of the current shard.
+
+        Returns:
+            int: The number of deleted logs.
+        """
+        policies = {policy.user_id: policy for policy in RetentionPolicy.objects.all()}
+        cutoffs = {}
+        for user_id in user_ids:
+            days = retention.retention_days(policies.get(user_id))
+            if days is not None:
+                cutoffs[user_id] = retention.retention_cutoff(days)
+
+        if options["dry_run"]:
+            for user_id, cutoff in cutoffs.items():
+                expired = EventLog.objects.filter(creator_id=user_id, timestamp__lt=cutoff).count()
+                self.stdout.write(f"User {user_id}: {expired} event logs before {cutoff.date()}.")
+            return 0
+
+        for user_id, cutoff in cutoffs.items():
+            retention.fold_event_logs(user_id, cutoff)
+
+        if options["user"] is None:
+            self.drop_partitions(cutoffs)
+
+        deleted = 0
+        for user_id, cutoff in cutoffs.items():
+            count = retention.delete_event_logs(user_id, cutoff, options["batch_size"])
+            if count:
+                self.stdout.write(f"User {user_id}: removed {count} event logs before {cutoff.date()}.")
+            deleted += count
+            segments = archive.delete_segments(user_id, cutoff)
+            if segments:
+                self.stdout.write(f"User {user_id}: removed {segments} archived months before {cutoff.date()}.")
+        return deleted
+
+    def drop_partitions(self, cutoffs):
+        """
+        Drops the monthly partitions of the current shard whose logs expired for every user.
+        """
+        connection = connections[shard_db()]
+        if not cutoffs or connection.vendor != "postgresql" or not partitioning.is_partitioned(connection):
+            return
+        # Users who keep their logs forever hold on to every month they have logs in
+        kept = EventLog.objects.exclude(creator_id__in=list(cutoffs))
+        oldest_kept = kept.order_by("timestamp").values_list("timestamp", flat=True).first()
+        before = min(cutoffs.values())
+        if oldest_kept is not None:
+            before = min(before, oldest_kept)
+        with transaction.atomic(using=shard_db()):
+            dropped = partitioning.drop_partitions_before(connection, date(before.year, before.month, 1))
+        for month in dropped:
+            self.stdout.write(f"Dropped partition {partitioning.partition_name(month)}.")
+        if dropped:
+            for user_id in cutoffs:
+                stats_cache.bump(user_id)
@@ -0,0 +1,177 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from datetime import timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from eventmanager.ingest import process_event_logs, save_event_logs
+from eventmanager.models import Event, EventLog
+from eventmanager.routers import shard_db
+from eventmanager.sharding import creator_shard
+
+COPY_COLUMNS = ["creator_id", "event_id", "event_name", "timestamp", "data"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports historical event logs of a user from an NDJSON or CSV file. "
+        "Uses COPY FROM STDIN on PostgreSQL and batched inserts on other databases."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, '-' reads from stdin. May be gzipped.")
+        parser.add_argument("--user", required=True, help="Username of the owner of the events.")
+        parser.add_argument(
+            "--format",
+            choices=["ndjson", "csv"],
+            help="Format of the file. Guessed from the file extension when omitted.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Number of rows loaded per transaction (default: 10000).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist.")
+
+        with creator_shard(user.id):
+            self.import_file(user, options)
+
+    def import_file(self, user, options):
+        path = options["path"]
+        file_format = options["format"] or ("csv" if ".csv" in path else "ndjson")
+        # Every event of the user is resolved in memory, rows never trigger a lookup query
+        event_ids = dict(Event.objects.filter(user=user).values_list("name", "id"))
+        use_copy = connections[shard_db()].vendor == "postgresql"
+
+        imported = rejected = 0
+        started = time.monotonic()
+        with self.open(path) as stream:
+            chunk = []
+            for line_number, record in enumerate(self.read(stream, file_format), start=1):
+                try:
+                    chunk.append(self.to_event_log(record, user, event_ids))
+                except ValueError as error:
+                    rejected += 1
+                    self.stderr.write(f"Skipping record {line_number}: {error}")
+                    continue
+                if len(chunk) >= options["chunk_size"]:
+                    imported += self.load(chunk, use_copy)
+                    chunk = []
+                    self.report(imported, rejected, started)
+            imported += self.load(chunk, use_copy)
+
+        self.report(imported, rejected, started)
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} event logs, skipped {rejected}."))
+
+    def open(self, path):
+        if path == "-":
+            return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+        if path.endswith(".gz"):
+            return gzip.open(path, "rt", encoding="utf-8", newline="")
+        return open(path, encoding="utf-8", newline="")
+
+    def read(self, stream, file_format):
+        """
+        Yields every record of the file as a dictionary.
+
+        CSV files need a header row. Their `data` column holds the event data as a JSON string.
+        """
+        if file_format == "csv":
+            for row in csv.DictReader(stream):
+                yield row
+            return
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield None
+
+    def to_event_log(self, record, user, event_ids):
+        """
+        Builds an unsaved EventLog from a record.
+
+        Raises:
+            ValueError: If the record is malformed or refers to an unknown event.
+        """
+        if not isinstance(record, dict):
+            raise ValueError("not a JSON object")
+        event_name = record.get("event_name")
+        event_id = event_ids.get(event_name) if isinstance(event_name, str) else None
+        if event_id is None:
+            raise ValueError(f"unknown event {event_name!r}")
+
+        data = record.get("data")
+        if isinstance(data, str):
+            try:
+                data = json.loads(data) if data else {}
+            except json.JSONDecodeError:
+                raise ValueError("data is not valid JSON")
+        if data is None:
+            raise ValueError("data is missing")
+
+        timestamp = record.get("timestamp")
+        if timestamp:
+            # parse_datetime raises TypeError for numbers and other values that are not strings
+            timestamp = parse_datetime(timestamp) if isinstance(timestamp, str) else None
+            if timestamp is None:
+                raise ValueError(f"invalid timestamp {record['timestamp']!r}")
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+        else:
+            timestamp = timezone.now()
+
+        return EventLog(
+            creator_id=user.id, event_id=event_id, event_name=event_name, timestamp=timestamp, data=data
+        )
+
+    def load(self, logs, use_copy):
+        """
+        Writes a chunk of event logs in a single transaction.
+
+        Returns:
+            int: The number of event logs written.
+        """
+        if not logs:
+            return 0
+        if not use_copy:
+            return len(save_event_logs(logs))
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for log in logs:
+            writer.writerow(
+                [log.creator_id, log.event_id, log.event_name, log.timestamp.isoformat(), json.dumps(log.data)]
+            )
+        buffer.seek(0)
+
+        columns = ", ".join(f'"{column}"' for column in COPY_COLUMNS)
+        with transaction.atomic(using=shard_db()):
+            with connections[shard_db()].cursor() as cursor:
+                cursor.copy_expert(
+                    f'COPY "{EventLog._meta.db_table}" ({columns}) FROM STDIN WITH (FORMAT csv)', buffer
+                )
+            process_event_logs(logs)
+        return len(logs)
+
+    def report(self, imported, rejected, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(
+            f"{imported} imported, {rejected} skipped, {imported / elapsed:.0f} rows/s"
+        )
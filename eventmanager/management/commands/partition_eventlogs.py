@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from eventmanager import partitioning
+from eventmanager.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Partitions the event log table by month on PostgreSQL, creates the partitions of the "
+        "upcoming months and optionally drops the partitions of old months."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=3,
+            help="Number of future months to create partitions for (default: 3).",
+        )
+        parser.add_argument(
+            "--drop-before",
+            help="Drop the partitions of every month before this one, formatted as YYYY-MM.",
+        )
+
+    def handle(self, *args, **options):
+        drop_before = None
+        if options["drop_before"]:
+            try:
+                drop_before = datetime.strptime(options["drop_before"], "%Y-%m").date()
+            except ValueError:
+                raise CommandError("--drop-before must be formatted as YYYY-MM.")
+
+        # Every shard has its own event log table
+        for alias in shard_aliases():
+            connection = connections[alias]
+            if connection.vendor != "postgresql":
+                raise CommandError("Partitioning is only supported on PostgreSQL.")
+
+            with transaction.atomic(using=alias):
+                if not partitioning.is_partitioned(connection):
+                    partitioning.partition_eventlog_table(connection, options["months_ahead"])
+                    self.stdout.write(f"Converted the event log table of {alias} into a partitioned table.")
+
+                today = timezone.now().date()
+                months = partitioning.month_range(
+                    today, partitioning.add_months(today, options["months_ahead"])
+                )
+                for month in partitioning.create_partitions(connection, months):
+                    self.stdout.write(f"Created partition {partitioning.partition_name(month)} on {alias}.")
+
+                if drop_before:
+                    for month in partitioning.drop_partitions_before(connection, drop_before):
+                        self.stdout.write(f"Dropped partition {partitioning.partition_name(month)} on {alias}.")
+
+        self.stdout.write(self.style.SUCCESS("Event log partitions are up to date."))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from eventmanager import deletion
+from eventmanager.routers import use_shard
+from eventmanager.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Removes the event logs of deleted events in small batches, then the events themselves. "
+        "Pass --loop to keep running as a background worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=deletion.PURGE_BATCH_SIZE,
+            help=f"Number of logs deleted per transaction (default: {deletion.PURGE_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="Maximum number of batches per event and run. The next run continues.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, and look for deleted events every --interval seconds.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=10,
+            help="Seconds between two runs with --loop (default: 10).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            purged = removed = 0
+            for alias in shard_aliases():
+                with use_shard(alias):
+                    counts = deletion.purge_deleted_events(options["batch_size"], options["max_batches"])
+                purged += counts[0]
+                removed += counts[1]
+            if purged or removed or not options["loop"]:
+                self.stdout.write(f"Removed {purged} event logs and {removed} deleted events.")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,70 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from eventmanager import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the users whose shard on the hash ring changed, for example after a database was "
+        "added to EVENTMANAGER_SHARDS, or a single user to a given shard. Users keep using the API "
+        "while they are moved, only their writes are refused for a few seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only move this user id.")
+        parser.add_argument("--to", help="Move the user of --user to this shard instead of its shard on the ring.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=sharding.MOVE_BATCH_SIZE,
+            help=f"Number of rows copied or deleted per query (default: {sharding.MOVE_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--wait",
+            type=float,
+            help=(
+                "Seconds to wait for the writes in flight before the last copy "
+                "(default: EVENTMANAGER_SHARD_PLACEMENT_TTL plus the buffer flush interval plus 1)."
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the users that would be moved.",
+        )
+
+    def handle(self, *args, **options):
+        aliases = sharding.shard_aliases()
+        if options["to"] is not None:
+            if options["user"] is None:
+                raise CommandError("--to needs --user.")
+            if options["to"] not in aliases:
+                raise CommandError(f"{options['to']} is not one of EVENTMANAGER_SHARDS: {', '.join(aliases)}.")
+
+        users = User.objects.order_by("id")
+        if options["user"] is not None:
+            users = users.filter(id=options["user"])
+            if not users.exists():
+                raise CommandError(f"User {options['user']} does not exist.")
+
+        moves = []
+        for source, user_ids in sharding.group_by_shard(users.values_list("id", flat=True)).items():
+            for user_id in user_ids:
+                target = options["to"] or sharding.ring().lookup(user_id)
+                if target != source:
+                    moves.append((user_id, source, target))
+        moves.sort()
+
+        if options["dry_run"]:
+            for user_id, source, target in moves:
+                self.stdout.write(f"User {user_id}: {source} -> {target}.")
+            self.stdout.write(f"{len(moves)} users would be moved.")
+            return
+
+        moved = 0
+        for user_id, source, target in moves:
+            moved += sharding.move_creator(
+                user_id, target, options["batch_size"], options["wait"], log=self.stdout.write
+            )
+        self.stdout.write(self.style.SUCCESS(f"Moved {len(moves)} users and {moved} event logs."))
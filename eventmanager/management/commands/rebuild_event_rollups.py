@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from eventmanager.rollups import rebuild_rollups
+from eventmanager.routers import use_shard
+from eventmanager.sharding import placement, shard_aliases
+from eventmanager.sketches import rebuild_sketches
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the hourly and daily event rollups and the unique value sketches "
+        "from the raw event logs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only rebuild the rollups of this user id.")
+
+    def handle(self, *args, **options):
+        if options["user"] is not None:
+            aliases = [placement(options["user"]).alias]
+        else:
+            aliases = shard_aliases()
+        rollups = sketches = 0
+        for alias in aliases:
+            with use_shard(alias):
+                rollups += rebuild_rollups(creator_id=options["user"])
+                sketches += rebuild_sketches(creator_id=options["user"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rollups} rollup rows."))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {sketches} unique value sketches."))
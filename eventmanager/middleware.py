@@ -0,0 +1,203 @@
+"""
+Opt-in instrumentation of the requests, enabled with `EVENTMANAGER_INSTRUMENTATION = True`.
+
+For every request, the middleware records in the histograms exposed at `/metrics` the latency of
+the view, the number and total time of the database queries it ran, and the time spent rendering
+the response. Queries are counted by a wrapper that every database connection gets when it opens,
+in whichever thread, so the queries that async views run through `sync_to_async` are counted
+too. Set `EVENTMANAGER_PROFILE_DIR` to also run a sample of the requests under cProfile:
+those slower than `EVENTMANAGER_PROFILE_MIN_DURATION` are dumped to that directory, with the SQL
+of their queries next to the profile.
+"""
+import cProfile
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .metrics import Histogram
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+request_duration = Histogram(
+    "eventmanager_request_duration_seconds",
+    "Time to answer a request, by route and method.",
+    ["view", "method"],
+)
+request_queries = Histogram(
+    "eventmanager_request_db_queries",
+    "Number of database queries run by a request, by route.",
+    ["view"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+request_query_duration = Histogram(
+    "eventmanager_request_db_duration_seconds",
+    "Time spent in database queries by a request, by route.",
+    ["view"],
+)
+render_duration = Histogram(
+    "eventmanager_response_render_duration_seconds",
+    "Time to serialize a response to its content type, by route.",
+    ["view"],
+)
+
+
+class RequestStats:
+    """
+    The database queries and the render time of one request.
+    """
+
+    def __init__(self, capture_sql=False):
+        self.capture_sql = capture_sql
+        self.queries = 0
+        self.query_time = 0.0
+        self.render_time = None
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Runs a query, see `connection.execute_wrapper`.
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.query_time += elapsed
+            if self.capture_sql:
+                self.sql.append((elapsed, sql, params))
+
+
+# The stats of the request being answered. Context variables are copied to the threads of
+# `sync_to_async`, which have their own database connections.
+current_stats = ContextVar("eventmanager_request_stats", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Counts a query in the stats of the current request, if it is instrumented.
+    """
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Wraps the queries of every database connection once, when it is first opened.
+    """
+    if record_query not in connection.execute_wrappers:
+        # First, since `connection.execute_wrapper()` removes the last wrapper when it exits
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def view_label(request):
+    """
+    Returns the route pattern of the request, which unlike its path has a bounded number of values.
+    """
+    match = getattr(request, "resolver_match", None)
+    return match.route if match is not None else "unmatched"
+
+
+class InstrumentationMiddleware:
+    """
+    Supports both sync and async requests, so the async views of `eventmanager/async_views.py`
+    do not hop to a thread because of it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "EVENTMANAGER_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        directory = getattr(settings, "EVENTMANAGER_PROFILE_DIR", None)
+        self.profile_dir = Path(directory) if directory else None
+        self.sample_rate = getattr(settings, "EVENTMANAGER_PROFILE_SAMPLE_RATE", 0.01)
+        self.min_duration = getattr(settings, "EVENTMANAGER_PROFILE_MIN_DURATION", 1.0)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with self.instrument(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with self.instrument(request):
+            return await self.get_response(request)
+
+    @contextmanager
+    def instrument(self, request):
+        """
+        Records the histograms of the request answered inside the block. Under ASGI a profile
+        also covers the other requests served by the event loop in the meantime.
+        """
+        profiler = None
+        if self.profile_dir is not None and random.random() < self.sample_rate:
+            profiler = cProfile.Profile()
+        stats = request._instrumentation = RequestStats(capture_sql=profiler is not None)
+
+        start = time.perf_counter()
+        token = current_stats.set(stats)
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            current_stats.reset(token)
+        elapsed = time.perf_counter() - start
+
+        view = view_label(request)
+        request_duration.observe(elapsed, view=view, method=request.method)
+        request_queries.observe(stats.queries, view=view)
+        request_query_duration.observe(stats.query_time, view=view)
+        if stats.render_time is not None:
+            render_duration.observe(stats.render_time, view=view)
+        if profiler is not None and elapsed >= self.min_duration:
+            self.dump_profile(request, view, elapsed, profiler, stats)
+
+    def process_template_response(self, request, response):
+        """
+        Times the rendering of DRF responses, which happens right after this hook.
+        """
+        stats = request._instrumentation
+        start = time.perf_counter()
+
+        def rendered(response):
+            stats.render_time = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def dump_profile(self, request, view, elapsed, profiler, stats):
+        """
+        Writes `<time>-<route>-<milliseconds>ms.prof`, readable with `python -m pstats`, and the
+        queries of the request, slowest first, to a `.sql` file of the same name.
+        """
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", view).strip("_") or "root"
+        name = f"{timezone.now():%Y%m%dT%H%M%S%f}-{request.method}-{slug}-{elapsed * 1000:.0f}ms"
+        profiler.dump_stats(self.profile_dir / f"{name}.prof")
+        with open(self.profile_dir / f"{name}.sql", "w") as file:
+            file.write(f"-- {request.method} {request.get_full_path()}: {stats.queries} queries, ")
+            file.write(f"{stats.query_time * 1000:.1f} ms in the database\n")
+            for duration, sql, params in sorted(stats.sql, key=lambda query: -query[0]):
+                file.write(f"\n-- {duration * 1000:.3f} ms, params: {params!r}\n{sql};\n")
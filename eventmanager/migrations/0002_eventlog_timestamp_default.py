@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:35
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("eventmanager", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="eventlog",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
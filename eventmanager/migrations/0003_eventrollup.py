@@ -0,0 +1,91 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:37
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncDay, TruncHour
+import django.db.models.deletion
+from datetime import timezone
+
+
+def populate_rollups(apps, schema_editor):
+    EventLog = apps.get_model("eventmanager", "EventLog")
+    EventRollup = apps.get_model("eventmanager", "EventRollup")
+    truncs = {
+        "hour": TruncHour("timestamp", tzinfo=timezone.utc),
+        "day": TruncDay("timestamp", tzinfo=timezone.utc),
+    }
+    for period, trunc in truncs.items():
+        groups = (
+            EventLog.objects.annotate(bucket=trunc)
+            .values("creator_id", "event_id", "event_name", "bucket")
+            .annotate(count=models.Count("id"))
+            .order_by()
+        )
+        EventRollup.objects.bulk_create(
+            (EventRollup(period=period, **group) for group in groups.iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("eventmanager", "0002_eventlog_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("event_name", models.CharField(max_length=255)),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("hour", "Hour"), ("day", "Day")], max_length=4
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("count", models.PositiveBigIntegerField(default=0)),
+                (
+                    "creator",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="eventmanager.event",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["creator", "period", "bucket"],
+                        name="eventrollup_creator_bucket",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="eventrollup",
+            constraint=models.UniqueConstraint(
+                fields=("creator", "period", "event_name", "bucket", "event"),
+                name="eventrollup_unique_bucket",
+            ),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def partition_eventlog(apps, schema_editor):
+    # Opt-in, see eventmanager/partitioning.py
+    if getattr(settings, "EVENTMANAGER_PARTITION_EVENTLOG", False):
+        from eventmanager.partitioning import partition_eventlog_table
+
+        partition_eventlog_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("eventmanager", "0003_eventrollup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="eventlog",
+            index=models.Index(
+                fields=["creator", "event_name", "timestamp"],
+                name="eventlog_creator_name_ts",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventlog",
+            index=models.Index(
+                fields=["creator", "timestamp"], name="eventlog_creator_ts"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="eventlog",
+            name="creator",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(partition_eventlog, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("eventmanager", "0004_eventlog_composite_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(fields=["user", "name"], name="event_user_name"),
+        ),
+    ]
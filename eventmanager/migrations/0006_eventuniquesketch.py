@@ -0,0 +1,55 @@
+# Generated by Django 4.2.3 on 2026-10-17 20:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("eventmanager", "0005_event_user_name_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventUniqueSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("event_name", models.CharField(max_length=255)),
+                ("key", models.CharField(max_length=255)),
+                ("day", models.DateField()),
+                ("registers", models.BinaryField()),
+                (
+                    "creator",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="eventmanager.event",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="eventuniquesketch",
+            constraint=models.UniqueConstraint(
+                fields=("creator", "event_name", "key", "day", "event"),
+                name="eventuniquesketch_unique_day",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("eventmanager", "0006_eventuniquesketch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RetentionPolicy",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "raw_retention_days",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                ("compacted_before", models.DateTimeField(blank=True, null=True)),
+                ("modified_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="retention_policy",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
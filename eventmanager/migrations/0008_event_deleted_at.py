@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("eventmanager", "0007_retentionpolicy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="deleted_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
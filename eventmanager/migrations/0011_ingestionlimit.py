@@ -0,0 +1,42 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("eventmanager", "0010_shardplacement"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestionLimit",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rate", models.FloatField(blank=True, null=True)),
+                ("burst", models.PositiveIntegerField(blank=True, null=True)),
+                ("daily_quota", models.PositiveBigIntegerField(blank=True, null=True)),
+                ("modified_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ingestion_limit",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+    ]
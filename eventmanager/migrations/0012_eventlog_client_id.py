@@ -0,0 +1,56 @@
+# Generated by Django 4.2.3 on 2026-10-17 21:58
+
+from django.db import migrations, models
+
+CLIENT_ID_CONSTRAINT = models.UniqueConstraint(
+    condition=models.Q(("client_id__isnull", False)),
+    fields=("creator", "client_id"),
+    name="eventlog_unique_client_id",
+)
+
+
+def add_client_id_index(apps, schema_editor):
+    from eventmanager.partitioning import (
+        PARTITIONED_CLIENT_ID_INDEX_SQL,
+        is_partitioned,
+    )
+
+    # A unique index of a partitioned table has to contain the partition key, see
+    # eventmanager/partitioning.py
+    if is_partitioned(schema_editor.connection):
+        schema_editor.execute(PARTITIONED_CLIENT_ID_INDEX_SQL)
+    else:
+        model = apps.get_model("eventmanager", "EventLog")
+        schema_editor.add_constraint(model, CLIENT_ID_CONSTRAINT)
+
+
+def remove_client_id_index(apps, schema_editor):
+    from eventmanager.partitioning import CLIENT_ID_INDEX
+
+    schema_editor.execute(f'DROP INDEX IF EXISTS "{CLIENT_ID_INDEX}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("eventmanager", "0011_ingestionlimit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventlog",
+            name="client_id",
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name="eventlog",
+                    constraint=CLIENT_ID_CONSTRAINT,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_client_id_index, remove_client_id_index),
+            ],
+        ),
+    ]
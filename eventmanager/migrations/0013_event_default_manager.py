@@ -0,0 +1,27 @@
+# Generated by Django 4.2.3 on 2026-10-17 22:21
+
+from django.db import migrations
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("eventmanager", "0012_eventlog_client_id"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="event",
+            options={
+                "base_manager_name": "all_objects",
+                "default_manager_name": "all_objects",
+            },
+        ),
+        migrations.AlterModelManagers(
+            name="event",
+            managers=[
+                ("all_objects", django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -1,17 +1,177 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+class ActiveEventManager(models.Manager):
+    """
+    Leaves out the events that were deleted and whose logs are waiting to be purged.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Event(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Users are stored on the default database and events on the shard of their user, see
+    # eventmanager/sharding.py, so the foreign keys to users of this app have no constraint
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
     name = models.CharField(max_length=255)
     description = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
-   
+    # Set when the event is deleted, the row is removed once its logs are purged
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    # Used by the views. Admin, dumpdata and related objects see the deleted events too
+    objects = ActiveEventManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        default_manager_name = "all_objects"
+        base_manager_name = "all_objects"
+        indexes = [models.Index(fields=["user", "name"], name="event_user_name")]
+
 
 class EventLog(models.Model):
-    creator = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Lookups by creator are served by the composite indexes below
+    creator = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False, db_constraint=False)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
     event_name = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     data = models.JSONField()
+    # Optional id chosen by the tracking client, so that retried requests are stored only once
+    client_id = models.CharField(max_length=64, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["creator", "event_name", "timestamp"], name="eventlog_creator_name_ts"),
+            models.Index(fields=["creator", "timestamp"], name="eventlog_creator_ts"),
+        ]
+        constraints = [
+            # On a partitioned table the index also contains `timestamp`, see partitioning.py
+            models.UniqueConstraint(
+                fields=["creator", "client_id"],
+                condition=models.Q(client_id__isnull=False),
+                name="eventlog_unique_client_id",
+            )
+        ]
+
+
+class EventRollup(models.Model):
+    """
+    Pre-aggregated number of event logs per creator, event and time bucket.
+
+    Rows are maintained incrementally whenever event logs are written, so the stats
+    endpoints can answer from here instead of scanning the EventLog table.
+    """
+    HOUR = "hour"
+    DAY = "day"
+    PERIOD_CHOICES = [(HOUR, "Hour"), (DAY, "Day")]
+
+    creator = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    event_name = models.CharField(max_length=255)
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["creator", "period", "event_name", "bucket", "event"],
+                name="eventrollup_unique_bucket",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["creator", "period", "bucket"], name="eventrollup_creator_bucket"),
+        ]
+
+
+class EventUniqueSketch(models.Model):
+    """
+    HyperLogLog sketch of the distinct values of a key of `EventLog.data`, per creator, event and UTC day.
+
+    Sketches are maintained whenever event logs are written, for the keys listed in
+    `EVENTMANAGER_UNIQUE_KEYS`, and merged across days to count unique values over a date range.
+    """
+    creator = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    event_name = models.CharField(max_length=255)
+    key = models.CharField(max_length=255)
+    day = models.DateField()
+    registers = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["creator", "event_name", "key", "day", "event"],
+                name="eventuniquesketch_unique_day",
+            )
+        ]
+
+
+class RetentionPolicy(models.Model):
+    """
+    How long the raw event logs of a user are kept.
+
+    Older logs are removed by the `compact_eventlogs` command. Their counts stay in the rollups,
+    so the frequency and trend answers do not change, but they can no longer be exported or used
+    by the stats that read raw logs. `compacted_before` records up to when logs were removed
+    from the table, by compaction or by the `archive_eventlogs` command.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="retention_policy", db_constraint=False
+    )
+    # None means EVENTMANAGER_RAW_RETENTION_DAYS
+    raw_retention_days = models.PositiveIntegerField(null=True, blank=True)
+    compacted_before = models.DateTimeField(null=True, blank=True)
+    modified_at = models.DateTimeField(auto_now=True)
+
+
+class EventArchiveSegment(models.Model):
+    """
+    A month of raw event logs of a user moved to a compressed columnar file by the
+    `archive_eventlogs` command, see eventmanager/archive.py.
+    """
+    creator = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    # First day of the UTC month
+    month = models.DateField()
+    row_count = models.PositiveBigIntegerField(default=0)
+    size = models.PositiveBigIntegerField(default=0)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["creator", "month"], name="eventarchivesegment_unique_month")
+        ]
+
+
+class ShardPlacement(models.Model):
+    """
+    The database that holds the data of a user, see eventmanager/sharding.py.
+
+    Placements are stored on the default database. Users without one are stored on `default`.
+    While `moving_to` is set, the `rebalance_shards` command is copying the user to that shard and
+    their writes are refused.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="shard_placement")
+    alias = models.CharField(max_length=100)
+    moving_to = models.CharField(max_length=100, null=True, blank=True)
+    modified_at = models.DateTimeField(auto_now=True)
+
+
+class IngestionLimit(models.Model):
+    """
+    Rate limit and daily quota of the event logs a user may send, see eventmanager/throttling.py.
+
+    Limits are stored on the default database. Empty fields, and users without a row, use the
+    EVENTMANAGER_THROTTLE_RATE, EVENTMANAGER_THROTTLE_BURST and EVENTMANAGER_DAILY_EVENT_QUOTA
+    settings.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="ingestion_limit")
+    # Event logs per second
+    rate = models.FloatField(null=True, blank=True)
+    burst = models.PositiveIntegerField(null=True, blank=True)
+    # Event logs per UTC day
+    daily_quota = models.PositiveBigIntegerField(null=True, blank=True)
+    modified_at = models.DateTimeField(auto_now=True)
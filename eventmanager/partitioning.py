@@ -0,0 +1,212 @@
+"""
+Monthly range partitioning of the EventLog table on PostgreSQL.
+
+Partitioning is opt-in: set `EVENTMANAGER_PARTITION_EVENTLOG = True` before running the
+migrations, or convert an existing table later with `manage.py partition_eventlogs`.
+Once partitioned, date range queries only touch the partitions of the requested months and
+old data can be removed by dropping whole partitions.
+
+A unique index of a partitioned table has to contain the partition key, so the index that keeps
+retried event logs from being stored twice becomes unique per (creator, client id, timestamp).
+Retries that do not send their `timestamp` get a new one from the server, and the database no
+longer rejects them: they are only dropped by the lookup of `eventmanager.ingest.drop_duplicates`,
+which runs before every insert into a partitioned table, and which two processes storing the same
+client id at the same moment can both pass.
+"""
+import re
+from datetime import date
+
+from django.utils import timezone
+
+from .models import EventLog
+
+TABLE = EventLog._meta.db_table
+UNPARTITIONED_TABLE = f"{TABLE}_unpartitioned"
+SEQUENCE = f"{TABLE}_partitioned_id_seq"
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+# Unique index of the client ids of the event logs, only unique per timestamp once partitioned,
+# see the module documentation
+CLIENT_ID_INDEX = "eventlog_unique_client_id"
+PARTITIONED_CLIENT_ID_INDEX_SQL = (
+    f'CREATE UNIQUE INDEX "{CLIENT_ID_INDEX}" ON "{TABLE}" ("creator_id", "client_id", "timestamp") '
+    'WHERE "client_id" IS NOT NULL'
+)
+
+
+def add_months(month, count):
+    """
+    Returns the first day of the month `count` months after `month`.
+    """
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(start, end):
+    """
+    Lists the first day of every month from the month of `start` to the month of `end`, inclusive.
+    """
+    month = date(start.year, start.month, 1)
+    months = []
+    while month <= end:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def is_partitioned(connection):
+    """
+    Returns True if the EventLog table is a partitioned PostgreSQL table.
+    """
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def list_partitions(connection):
+    """
+    Returns the first day of the month of every monthly partition, in ascending order.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s
+            """,
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partitions(connection, months):
+    """
+    Creates the monthly partitions that do not exist yet.
+
+    Returns:
+        list: The months a partition was created for.
+    """
+    existing = set(list_partitions(connection))
+    created = []
+    with connection.cursor() as cursor:
+        for month in months:
+            if month in existing:
+                continue
+            cursor.execute(
+                f'CREATE TABLE "{partition_name(month)}" PARTITION OF "{TABLE}" '
+                "FOR VALUES FROM (%s) TO (%s)",
+                [month.isoformat(), add_months(month, 1).isoformat()],
+            )
+            created.append(month)
+    return created
+
+
+def drop_partitions_before(connection, month):
+    """
+    Drops every monthly partition that only holds rows older than `month`.
+
+    Returns:
+        list: The months whose partition was dropped.
+    """
+    dropped = []
+    with connection.cursor() as cursor:
+        for partition in list_partitions(connection):
+            if partition >= month:
+                break
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{partition_name(partition)}"')
+            cursor.execute(f'DROP TABLE "{partition_name(partition)}"')
+            dropped.append(partition)
+    return dropped
+
+
+def partition_eventlog_table(connection, months_ahead=3):
+    """
+    Converts the EventLog table into a table partitioned by month on `timestamp`.
+
+    The existing rows are copied into monthly partitions, one for every month between the oldest
+    log and `months_ahead` months from now. Rows outside of that range land in a default partition.
+    Should be run inside a transaction, the table is locked while the rows are copied.
+
+    Args:
+        connection: A PostgreSQL database connection.
+        months_ahead (int): Number of future months to create partitions for.
+    """
+    if connection.vendor != "postgresql" or is_partitioned(connection):
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s", [TABLE]
+        )
+        all_indexes = cursor.fetchall()
+        indexes = [
+            (name, definition)
+            for name, definition in all_indexes
+            if not definition.startswith("CREATE UNIQUE INDEX")
+        ]
+        has_client_id_index = any(name == CLIENT_ID_INDEX for name, _ in all_indexes)
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            """,
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+            [TABLE],
+        )
+        primary_key = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{UNPARTITIONED_TABLE}"')
+        cursor.execute(f'ALTER TABLE "{UNPARTITIONED_TABLE}" DROP CONSTRAINT "{primary_key}"')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+        if has_client_id_index:
+            cursor.execute(f'DROP INDEX "{CLIENT_ID_INDEX}"')
+        for name, _ in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{UNPARTITIONED_TABLE}" DROP CONSTRAINT "{name}"')
+
+        # The primary key of a partitioned table has to contain the partition key, so `id`
+        # is backed by a plain sequence instead of an identity column.
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{UNPARTITIONED_TABLE}" INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}"."id"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(%s)', [SEQUENCE])
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY ("id", "timestamp")')
+
+        cursor.execute(f'SELECT MIN("timestamp"), MAX("id") FROM "{UNPARTITIONED_TABLE}"')
+        oldest, max_id = cursor.fetchone()
+        today = timezone.now().date()
+        first = oldest.date() if oldest else today
+        create_partitions(connection, month_range(first, add_months(today, months_ahead)))
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{UNPARTITIONED_TABLE}"')
+        if max_id is not None:
+            cursor.execute("SELECT setval(%s, %s)", [SEQUENCE, max_id])
+
+        for _, definition in indexes:
+            cursor.execute(definition)
+        if has_client_id_index:
+            cursor.execute(PARTITIONED_CLIENT_ID_INDEX_SQL)
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}')
+        cursor.execute(f'DROP TABLE "{UNPARTITIONED_TABLE}"')
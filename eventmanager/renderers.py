@@ -0,0 +1,73 @@
+"""
+JSON renderer and parser backed by orjson, when it is installed.
+
+They are drop-in replacements for DRF's JSONRenderer and JSONParser, configured in
+`REST_FRAMEWORK` in settings.py, and produce the same bytes for the answers of the API. Without
+orjson, or for the cases orjson cannot handle the same way (indented output, integers larger than
+64 bits, encodings other than UTF-8), they fall back to DRF's implementation.
+"""
+import io
+import re
+
+from django.http import HttpResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+if orjson is not None:
+    # Datetimes, decimals and lazy strings go through DRF's encoder, so they look the same
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+# orjson reads integers that do not fit in 64 bits as floats, so bodies with numbers of 19 digits
+# or more go to DRF's parser. Digits inside strings also match, which only costs the fast path.
+LONG_NUMBER = re.compile(rb"\d{19}")
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like DRF, escape the line and paragraph separators that are not valid in JavaScript strings
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding") or "utf-8"
+        if orjson is None or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if LONG_NUMBER.search(body):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+def json_response(data, status=200, headers=None):
+    """
+    Returns a JSON response rendered by ORJSONRenderer, for the views that do not go through DRF.
+    """
+    return HttpResponse(
+        ORJSONRenderer().render(data), content_type="application/json", status=status, headers=headers
+    )
@@ -0,0 +1,82 @@
+"""
+Removal of old raw event logs, see the `compact_eventlogs` command.
+
+Compacting a user happens in two steps. First the rollups and sketches of the range that is about
+to be removed are recomputed from the raw logs ("folded"), and the end of the range is recorded in
+the user's RetentionPolicy. Then the raw logs are deleted in small batches, so no long transaction
+holds locks on the EventLog table. A compaction that is interrupted can simply be run again.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import stats_cache
+from .models import EventLog, RetentionPolicy
+from .rollups import rebuild_rollups
+from .routers import shard_db
+from .sketches import rebuild_sketches
+
+# Number of event logs removed by a single DELETE statement.
+DELETE_BATCH_SIZE = 10000
+
+
+def retention_days(policy=None):
+    """
+    Returns the number of days the raw logs of a user are kept, or None to keep them forever.
+
+    Args:
+        policy (RetentionPolicy, optional): The policy of the user, if they have one.
+    """
+    if policy is not None and policy.raw_retention_days is not None:
+        return policy.raw_retention_days
+    return getattr(settings, "EVENTMANAGER_RAW_RETENTION_DAYS", None)
+
+
+def retention_cutoff(days, now=None):
+    """
+    Returns the start of the UTC day `days` days ago. Logs before it are expired.
+    """
+    day = (now or timezone.now()).astimezone(dt_timezone.utc).date() - timedelta(days=days)
+    return datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+
+
+def fold_event_logs(user_id, cutoff):
+    """
+    Recomputes the rollups and sketches of the logs of a user that are about to be removed and
+    records the new end of the compacted range.
+
+    Args:
+        user_id (int): The user to compact.
+        cutoff (datetime): The start of a UTC day. Logs before it are removed.
+    """
+    with transaction.atomic(using=shard_db()):
+        policy, _ = RetentionPolicy.objects.select_for_update().get_or_create(user_id=user_id)
+        if policy.compacted_before and policy.compacted_before >= cutoff:
+            return
+        rebuild_rollups(creator_id=user_id, start=policy.compacted_before, end=cutoff)
+        rebuild_sketches(creator_id=user_id, start=policy.compacted_before, end=cutoff)
+        policy.compacted_before = cutoff
+        policy.save(update_fields=["compacted_before", "modified_at"])
+
+
+def delete_event_logs(user_id, cutoff, batch_size=DELETE_BATCH_SIZE):
+    """
+    Deletes the logs of a user older than `cutoff` in batches, each in its own transaction.
+
+    Returns:
+        int: The number of deleted logs.
+    """
+    expired = EventLog.objects.filter(creator_id=user_id, timestamp__lt=cutoff)
+    deleted = 0
+    while True:
+        with transaction.atomic(using=shard_db()):
+            ids = list(expired.values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted += EventLog.objects.filter(id__in=ids).delete()[0]
+    if deleted:
+        # Stats read from the raw logs, like funnels, change
+        stats_cache.bump(user_id)
+    return deleted
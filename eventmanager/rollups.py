@@ -0,0 +1,192 @@
+from collections import Counter
+from datetime import timezone as dt_timezone
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F, functions
+
+from .caching import stats_cache
+from .models import EventLog, EventRollup, RetentionPolicy
+from .routers import shard_db
+
+# Backends that understand `INSERT ... ON CONFLICT ... DO UPDATE`.
+UPSERT_VENDORS = ("postgresql", "sqlite")
+
+# Number of rollup rows written by a single statement.
+UPSERT_BATCH_SIZE = 500
+
+
+def bucket_start(timestamp, period):
+    """
+    Truncates a timestamp to the start of its UTC hour or day.
+
+    Args:
+        timestamp (datetime): An aware datetime.
+        period (str): Either EventRollup.HOUR or EventRollup.DAY.
+
+    Returns:
+        datetime: The start of the bucket the timestamp falls in.
+    """
+    bucket = timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if period == EventRollup.DAY:
+        bucket = bucket.replace(hour=0)
+    return bucket
+
+
+def count_event_logs(logs):
+    """
+    Counts event logs per rollup key.
+
+    Args:
+        logs (iterable): EventLog instances.
+
+    Returns:
+        Counter: Maps (creator_id, event_id, event_name, period, bucket) to a number of logs.
+    """
+    counts = Counter()
+    for log in logs:
+        for period, _ in EventRollup.PERIOD_CHOICES:
+            bucket = bucket_start(log.timestamp, period)
+            counts[(log.creator_id, log.event_id, log.event_name, period, bucket)] += 1
+    return counts
+
+
+def record_event_logs(logs):
+    """
+    Adds freshly written event logs to the rollup table.
+
+    Args:
+        logs (iterable): Saved EventLog instances.
+    """
+    apply_counts(count_event_logs(logs))
+
+
+def apply_counts(counts):
+    """
+    Increments rollup rows by the given amounts, creating missing rows.
+
+    On PostgreSQL and SQLite every row is upserted with a single statement. Other backends
+    fall back to an update followed by an insert for buckets that do not exist yet. Rows are
+    always written in the order of their key, so two writers cannot deadlock.
+
+    Args:
+        counts (Counter): Maps (creator_id, event_id, event_name, period, bucket) to a number of logs.
+    """
+    if not counts:
+        return
+    items = sorted(counts.items(), key=lambda item: item[0])
+    with transaction.atomic(using=shard_db()):
+        if connections[shard_db()].vendor in UPSERT_VENDORS:
+            for start in range(0, len(items), UPSERT_BATCH_SIZE):
+                _upsert_counts(items[start:start + UPSERT_BATCH_SIZE])
+        else:
+            for key, count in items:
+                _increment_count(key, count)
+
+
+def _upsert_counts(items):
+    connection = connections[shard_db()]
+    table = EventRollup._meta.db_table
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(items))
+    params = []
+    for (creator_id, event_id, event_name, period, bucket), count in items:
+        bucket = connection.ops.adapt_datetimefield_value(bucket)
+        params.extend([creator_id, event_id, event_name, period, bucket, count])
+    sql = (
+        f'INSERT INTO "{table}" ("creator_id", "event_id", "event_name", "period", "bucket", "count") '
+        f"VALUES {placeholders} "
+        'ON CONFLICT ("creator_id", "period", "event_name", "bucket", "event_id") '
+        f'DO UPDATE SET "count" = "{table}"."count" + EXCLUDED."count"'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _increment_count(key, count):
+    creator_id, event_id, event_name, period, bucket = key
+    lookup = dict(
+        creator_id=creator_id, event_id=event_id, event_name=event_name, period=period, bucket=bucket
+    )
+    if EventRollup.objects.filter(**lookup).update(count=F("count") + count):
+        return
+    try:
+        with transaction.atomic(using=shard_db()):
+            EventRollup.objects.create(count=count, **lookup)
+    except IntegrityError:
+        # Another request created the bucket in the meantime
+        EventRollup.objects.filter(**lookup).update(count=F("count") + count)
+
+
+def compacted_ranges(creator_id=None):
+    """
+    Returns the users whose oldest raw logs were removed by `compact_eventlogs`.
+
+    Args:
+        creator_id (int, optional): Only consider this user.
+
+    Returns:
+        dict: Maps user ids to the time before which their raw logs were removed.
+    """
+    policies = RetentionPolicy.objects.filter(compacted_before__isnull=False)
+    if creator_id is not None:
+        policies = policies.filter(user_id=creator_id)
+    return dict(policies.values_list("user_id", "compacted_before"))
+
+
+def rebuild_rollups(creator_id=None, start=None, end=None):
+    """
+    Recomputes the rollup table from the raw event logs.
+
+    Buckets whose raw logs were removed by `compact_eventlogs` are kept as they are, since they
+    can no longer be recomputed.
+
+    Args:
+        creator_id (int, optional): Only rebuild the rollups of this user.
+        start (datetime, optional): Only rebuild the buckets from this time on. Should be the start of a UTC day.
+        end (datetime, optional): Only rebuild the buckets before this time. Should be the start of a UTC day.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    # The logs of deleted events are waiting to be purged
+    logs = EventLog.objects.filter(event__deleted_at__isnull=True)
+    rollups = EventRollup.objects.all()
+    if creator_id is not None:
+        logs = logs.filter(creator_id=creator_id)
+        rollups = rollups.filter(creator_id=creator_id)
+    if start is not None:
+        logs = logs.filter(timestamp__gte=start)
+        rollups = rollups.filter(bucket__gte=start)
+    if end is not None:
+        logs = logs.filter(timestamp__lt=end)
+        rollups = rollups.filter(bucket__lt=end)
+    for compacted_creator_id, compacted_before in compacted_ranges(creator_id).items():
+        logs = logs.exclude(creator_id=compacted_creator_id, timestamp__lt=compacted_before)
+        rollups = rollups.exclude(creator_id=compacted_creator_id, bucket__lt=compacted_before)
+
+    truncs = {
+        EventRollup.HOUR: functions.TruncHour("timestamp", tzinfo=dt_timezone.utc),
+        EventRollup.DAY: functions.TruncDay("timestamp", tzinfo=dt_timezone.utc),
+    }
+    with transaction.atomic(using=shard_db()):
+        # Creators whose cached stats have to be invalidated
+        creator_ids = set(rollups.values_list("creator_id", flat=True).distinct())
+        rollups.delete()
+        written = 0
+        for period, trunc in truncs.items():
+            groups = (
+                logs.annotate(bucket=trunc)
+                .values("creator_id", "event_id", "event_name", "bucket")
+                .annotate(count=Count("id"))
+                .order_by()
+            )
+            objs = []
+            for group in groups.iterator(chunk_size=UPSERT_BATCH_SIZE):
+                objs.append(EventRollup(period=period, **group))
+                if len(objs) == UPSERT_BATCH_SIZE:
+                    written += len(EventRollup.objects.bulk_create(objs))
+                    objs = []
+            written += len(EventRollup.objects.bulk_create(objs))
+
+    for creator_id in creator_ids | set(rollups.values_list("creator_id", flat=True).distinct()):
+        stats_cache.bump(creator_id)
+    return written
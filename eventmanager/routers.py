@@ -0,0 +1,225 @@
+"""
+Routing of the queries to the shard of the current creator and of the heavy read-only queries to
+read replicas.
+
+The data of every creator lives on one of the databases listed in `EVENTMANAGER_SHARDS`, see
+eventmanager/sharding.py. Inside `use_shard()`, `ShardRouter` sends the queries of the models of
+this app to that database. Users, tokens, the shard placements and the ingestion limits stay on
+`default`.
+
+The stats and export endpoints run their queries inside `replica_reads()`. While it is active,
+`ReadReplicaRouter` sends every read to one of the aliases listed in `EVENTMANAGER_READ_REPLICAS`
+whose replication lag is at most `EVENTMANAGER_REPLICA_MAX_LAG` seconds, and to the primary
+(`default`) when none is. Everything else, writes included, uses the primary, so requests always
+read their own writes. Replicas are replicas of `default`: creators stored on another shard read
+from their shard.
+
+The lag of a replica is measured at most every `EVENTMANAGER_REPLICA_LAG_CHECK_INTERVAL` seconds
+per process. A replica that cannot be reached counts as lagging until the next check.
+"""
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# The alias reads are sent to, None outside of `replica_reads()`
+read_alias = contextvars.ContextVar("eventmanager_read_alias", default=None)
+# The shard of the creator whose data is being accessed, None outside of `use_shard()`
+current_shard = contextvars.ContextVar("eventmanager_current_shard", default=None)
+# Models of this app that are not sharded
+UNSHARDED_MODELS = {"eventmanager.shardplacement", "eventmanager.ingestionlimit"}
+
+# Seconds a PostgreSQL standby is behind the primary. It is 0 when the standby replayed all the
+# WAL it received, so an idle primary does not make it look late.
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class ReplicaSelector:
+    """
+    Picks the replica of the next request, in turn among those that are not lagging.
+    """
+
+    def __init__(self):
+        self.lags = {}
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+
+    @staticmethod
+    def replicas():
+        return list(getattr(settings, "EVENTMANAGER_READ_REPLICAS", []))
+
+    @staticmethod
+    def measure_lag(alias):
+        """
+        Returns the replication lag of a database in seconds. Databases other than PostgreSQL
+        are assumed to be up to date.
+        """
+        connection = connections[alias]
+        if connection.vendor != "postgresql":
+            return 0.0
+        with connection.cursor() as cursor:
+            cursor.execute(LAG_QUERY)
+            return float(cursor.fetchone()[0])
+
+    def lag(self, alias):
+        """
+        Returns the last measured lag of a replica, measuring it again if it is too old, or None
+        if the replica could not be reached.
+        """
+        interval = getattr(settings, "EVENTMANAGER_REPLICA_LAG_CHECK_INTERVAL", 5)
+        now = time.monotonic()
+        with self.lock:
+            measured = self.lags.get(alias)
+            if measured is not None and now - measured[0] < interval:
+                return measured[1]
+        try:
+            lag = self.measure_lag(alias)
+        except DatabaseError:
+            lag = None
+        with self.lock:
+            self.lags[alias] = (now, lag)
+        return lag
+
+    def choose(self):
+        """
+        Returns the alias of a replica that is close enough to the primary, or the primary.
+        """
+        max_lag = getattr(settings, "EVENTMANAGER_REPLICA_MAX_LAG", 30)
+        replicas = self.replicas()
+        if not replicas or shard_db() != DEFAULT_DB_ALIAS:
+            return DEFAULT_DB_ALIAS
+        start = next(self.counter)
+        for offset in range(len(replicas)):
+            alias = replicas[(start + offset) % len(replicas)]
+            lag = self.lag(alias)
+            if lag is not None and lag <= max_lag:
+                return alias
+        return DEFAULT_DB_ALIAS
+
+    def clear(self):
+        with self.lock:
+            self.lags.clear()
+
+
+replica_selector = ReplicaSelector()
+
+
+def shard_db():
+    """
+    Returns the alias of the database of the current creator, `default` outside of `use_shard()`.
+
+    Transactions and raw queries on the data of a creator have to name it explicitly.
+    """
+    return current_shard.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_shard(alias):
+    """
+    Sends the queries on the models of this app made inside the block to a shard.
+    """
+    token = current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        current_shard.reset(token)
+
+
+@contextmanager
+def replica_reads(alias=None):
+    """
+    Sends the reads made inside the block to a read replica, see the module documentation.
+
+    Args:
+        alias (str, optional): The database to read from, by default chosen by `replica_selector`.
+            Asynchronous code has to choose it beforehand, in a thread.
+    """
+    token = read_alias.set(alias or replica_selector.choose())
+    try:
+        yield read_alias.get()
+    finally:
+        read_alias.reset(token)
+
+
+def stats_cache_timeout(alias):
+    """
+    Returns how long to cache a stats answer read from a database, None for the default timeout.
+
+    An answer read from a replica can miss the latest writes, and a write only invalidates the
+    answers cached before it, so those answers expire after `EVENTMANAGER_REPLICA_CACHE_TIMEOUT`.
+    """
+    if alias == DEFAULT_DB_ALIAS:
+        return None
+    return getattr(settings, "EVENTMANAGER_REPLICA_CACHE_TIMEOUT", 60)
+
+
+def is_sharded(model):
+    return model._meta.app_label == "eventmanager" and model._meta.label_lower not in UNSHARDED_MODELS
+
+
+class ShardRouter:
+    """
+    Database router of `DATABASE_ROUTERS`, listed before `ReadReplicaRouter`. Sends the models of
+    this app to the shard of `use_shard()`, or to the database an instance was loaded from.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded(model):
+            # The user of a sharded row, for example, is read from default and not from the shard
+            return (read_alias.get() or DEFAULT_DB_ALIAS) if self.sharded_instance(hints) else None
+        shard = current_shard.get()
+        if shard == DEFAULT_DB_ALIAS:
+            # Reads on default may go to a replica
+            return None
+        return shard or self.instance_db(hints)
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded(model):
+            return DEFAULT_DB_ALIAS if self.sharded_instance(hints) else None
+        return current_shard.get() or self.instance_db(hints)
+
+    @staticmethod
+    def sharded_instance(hints):
+        instance = hints.get("instance")
+        return instance is not None and is_sharded(type(instance))
+
+    @staticmethod
+    def instance_db(hints):
+        instance = hints.get("instance")
+        return instance._state.db if instance is not None else None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shard placements and ingestion limits are only stored on default
+        if model_name is not None and f"{app_label}.{model_name}" in UNSHARDED_MODELS:
+            return db == DEFAULT_DB_ALIAS
+        return None
+
+
+class ReadReplicaRouter:
+    """
+    Database router of `DATABASE_ROUTERS`. Only reads inside `replica_reads()` leave the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema of the primary through replication
+        return db not in getattr(settings, "EVENTMANAGER_READ_REPLICAS", [])
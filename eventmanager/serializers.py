@@ -1,6 +1,19 @@
+import re
+
+from django.core.validators import MaxLengthValidator, MinLengthValidator
 from rest_framework import serializers
+from rest_framework.fields import ProhibitNullCharactersValidator, ProhibitSurrogateCharactersValidator
+
+from .models import Event, EventLog, RetentionPolicy
+from .retention import retention_days
 
-from .models import Event, EventLog
+SURROGATES = re.compile("[\ud800-\udfff]")
+STRING_VALIDATORS = (
+    MaxLengthValidator,
+    MinLengthValidator,
+    ProhibitNullCharactersValidator,
+    ProhibitSurrogateCharactersValidator,
+)
 
 class EventSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,7 +22,146 @@ class EventSerializer(serializers.ModelSerializer):
 
 
 class EventDataSerializer(serializers.ModelSerializer):
+    """
+    Validates a single event log. The optional `client_id` makes retries of the request idempotent.
+    """
+    class Meta:
+        model = EventLog
+        fields = ["event_name", "data", "client_id"]
+
+
+class EventBatchItemSerializer(serializers.ModelSerializer):
+    """
+    Validates a single record of a batch ingestion request.
+
+    The timestamp is optional and defaults to the time of ingestion. The optional `client_id`
+    makes retries of the record idempotent.
+    """
     class Meta:
         model = EventLog
-        fields = ["event_name", "data"]
+        fields = ["event_name", "data", "timestamp", "client_id"]
+
+
+class FastRecordValidator:
+    """
+    Validates ingestion records like a serializer, without building a serializer for every record.
+
+    The fields of the serializer are compiled once into plain checks of the common valid cases: a
+    string within the length limits (or null where allowed), any JSON value, an ISO 8601
+    timestamp. A record that does not pass them, or that does not come from a JSON body, is
+    validated by the serializer itself, so the validated data and the error messages are always
+    the serializer's.
+
+    Args:
+        serializer_class (type): A serializer made of CharField, JSONField and DateTimeField fields.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.checks = [
+            (name, field.required, self.compile(field))
+            for name, field in serializer_class().fields.items()
+            if not field.read_only
+        ]
+
+    @staticmethod
+    def compile(field):
+        """
+        Returns a function that returns the validated value, or raises ValueError if the field
+        should decide.
+        """
+        if isinstance(field, serializers.CharField):
+            if not all(isinstance(v, STRING_VALIDATORS) for v in field.validators):
+                return None
+            max_length = field.max_length
+            min_length = max(field.min_length or 0, 0 if field.allow_blank else 1)
+            trim = field.trim_whitespace
+            allow_null = field.allow_null
+
+            def check_string(value):
+                if value is None and allow_null:
+                    return None
+                if type(value) is not str:
+                    raise ValueError(value)
+                if trim:
+                    value = value.strip()
+                if len(value) < min_length or (max_length is not None and len(value) > max_length):
+                    raise ValueError(value)
+                if "\x00" in value or SURROGATES.search(value):
+                    raise ValueError(value)
+                return value
+
+            return check_string
+
+        if isinstance(field, serializers.JSONField) and not field.binary and not field.validators:
+
+            def check_json(value):
+                if value is None:
+                    raise ValueError(value)
+                return value
+
+            return check_json
+
+        if isinstance(field, serializers.DateTimeField) and not field.validators and not field.allow_null:
+
+            def check_datetime(value):
+                if type(value) is not str:
+                    raise ValueError(value)
+                # Parses ISO 8601 and applies the time zone, or raises ValidationError
+                return field.to_internal_value(value)
+
+            return check_datetime
+
+        return None
+
+    def validate(self, record):
+        """
+        Returns:
+            tuple: The validated data and None, or None and the errors of the serializer.
+        """
+        data = self.fast_validate(record)
+        if data is not None:
+            return data, None
+        serializer = self.serializer_class(data=record)
+        if serializer.is_valid():
+            return serializer.validated_data, None
+        return None, serializer.errors
+
+    def fast_validate(self, record):
+        # Form data (QueryDict) is parsed by the fields themselves
+        if type(record) is not dict:
+            return None
+        data = {}
+        for name, required, check in self.checks:
+            if name not in record:
+                if required:
+                    return None
+                continue
+            if check is None:
+                return None
+            try:
+                data[name] = check(record[name])
+            except (ValueError, serializers.ValidationError):
+                return None
+        return data
+
+
+event_data_validator = FastRecordValidator(EventDataSerializer)
+event_batch_item_validator = FastRecordValidator(EventBatchItemSerializer)
+
+
+class RetentionPolicySerializer(serializers.ModelSerializer):
+    """
+    The retention of the raw event logs of a user. A null `raw_retention_days` falls back to the
+    server default, `default_retention_days`.
+    """
+    default_retention_days = serializers.SerializerMethodField()
+
+    class Meta:
+        model = RetentionPolicy
+        fields = ["raw_retention_days", "default_retention_days", "compacted_before"]
+        read_only_fields = ["compacted_before"]
+        extra_kwargs = {"raw_retention_days": {"min_value": 1}}
 
+    def get_default_retention_days(self, policy):
+        return retention_days()
@@ -0,0 +1,363 @@
+"""
+Horizontal sharding of the data of the users across the databases of `EVENTMANAGER_SHARDS`.
+
+Everything this app stores for a user (events, event logs, rollups, sketches, retention policy
+and archive segments) lives on one shard. Only the users, their tokens and the ShardPlacement
+table, which records the shard of every user, stay on `default`. Requests and commands run their
+queries inside `creator_shard()`, and `eventmanager.routers.ShardRouter` sends them to that shard.
+
+New users are placed with a consistent hash ring over the shards. Placements are sticky: adding
+a shard does not move anybody by itself. The `rebalance_shards` command moves the users whose
+shard on the ring changed, about one in N for the N-th shard, or a single user. A move is done
+online in three steps, see `move_creator`:
+
+1. The events and the logs written so far are copied to the new shard, with new ids.
+2. The writes of the user are refused with 503 while the logs written in the meantime, the rollups,
+   sketches, retention policy and archive segments are copied, then the placement is switched.
+3. The data is deleted from the old shard in batches.
+
+Placements are cached per process for `EVENTMANAGER_SHARD_PLACEMENT_TTL` seconds, so the command
+waits that long after refusing the writes, and the interval of the ingestion buffer, before it
+copies the last logs.
+"""
+import bisect
+import hashlib
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.exceptions import APIException
+from rest_framework.status import HTTP_503_SERVICE_UNAVAILABLE
+
+from . import archive
+from .caching import MISSING, TTLCache, stats_cache
+from .models import (
+    Event,
+    EventArchiveSegment,
+    EventLog,
+    EventRollup,
+    EventUniqueSketch,
+    RetentionPolicy,
+    ShardPlacement,
+)
+from .routers import use_shard
+
+# Number of rows copied or deleted per query when moving a user.
+MOVE_BATCH_SIZE = 10000
+
+Placement = namedtuple("Placement", ["alias", "moving_to"])
+
+placements = TTLCache(
+    max_size=getattr(settings, "EVENTMANAGER_SHARD_PLACEMENT_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "EVENTMANAGER_SHARD_PLACEMENT_TTL", 5),
+)
+
+
+class ShardMoving(APIException):
+    status_code = HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The data of this account is being moved. Please retry later."
+    default_code = "shard_moving"
+    # Sent as the Retry-After header
+    wait = 5
+
+
+class HashRing:
+    """
+    Consistent hash ring of database aliases, each present `vnodes` times, so that adding a shard
+    only takes over about 1/N of the users.
+    """
+
+    def __init__(self, aliases, vnodes=64):
+        points = sorted(
+            (self.hash(f"{alias}:{index}"), alias) for alias in aliases for index in range(vnodes)
+        )
+        self.points = [point for point, _ in points]
+        self.aliases = [alias for _, alias in points]
+
+    @staticmethod
+    def hash(value):
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    def lookup(self, user_id):
+        """
+        Returns the alias of the first point of the ring after the hash of a user.
+        """
+        index = bisect.bisect(self.points, self.hash(str(user_id))) % len(self.points)
+        return self.aliases[index]
+
+
+def shard_aliases():
+    return list(getattr(settings, "EVENTMANAGER_SHARDS", [DEFAULT_DB_ALIAS]))
+
+
+def sharding_enabled():
+    return shard_aliases() != [DEFAULT_DB_ALIAS]
+
+
+@lru_cache(maxsize=8)
+def _ring(aliases, vnodes):
+    return HashRing(aliases, vnodes)
+
+
+def ring():
+    return _ring(tuple(shard_aliases()), getattr(settings, "EVENTMANAGER_SHARD_VNODES", 64))
+
+
+def placement(user_id):
+    """
+    Returns the Placement of a user, from the cache when possible. Without sharding, every user
+    is on `default` and no query is made.
+    """
+    if not sharding_enabled():
+        return Placement(DEFAULT_DB_ALIAS, None)
+    cached = placements.get(user_id)
+    if cached is MISSING:
+        cached = load_placement(user_id)
+        placements.set(user_id, cached)
+    return cached
+
+
+async def aplacement(user_id):
+    """
+    Asynchronous version of `placement`, for the async views.
+    """
+    if not sharding_enabled():
+        return Placement(DEFAULT_DB_ALIAS, None)
+    cached = placements.get(user_id)
+    if cached is MISSING:
+        row = await (
+            ShardPlacement.objects.using(DEFAULT_DB_ALIAS)
+            .filter(user_id=user_id)
+            .values_list("alias", "moving_to")
+            .afirst()
+        )
+        cached = Placement(*row) if row else Placement(DEFAULT_DB_ALIAS, None)
+        placements.set(user_id, cached)
+    return cached
+
+
+def load_placement(user_id):
+    row = (
+        ShardPlacement.objects.using(DEFAULT_DB_ALIAS)
+        .filter(user_id=user_id)
+        .values_list("alias", "moving_to")
+        .first()
+    )
+    return Placement(*row) if row else Placement(DEFAULT_DB_ALIAS, None)
+
+
+def place_user(user_id):
+    """
+    Records the shard of a new user, chosen on the ring.
+    """
+    if sharding_enabled():
+        ShardPlacement.objects.using(DEFAULT_DB_ALIAS).get_or_create(
+            user_id=user_id, defaults={"alias": ring().lookup(user_id)}
+        )
+        placements.delete(user_id)
+
+
+def group_by_shard(user_ids):
+    """
+    Groups users by shard, reading the placements with a single query.
+
+    Returns:
+        dict: Maps the aliases of the shards to lists of user ids, in the order of `user_ids`.
+    """
+    aliases = {}
+    if sharding_enabled():
+        aliases = dict(ShardPlacement.objects.using(DEFAULT_DB_ALIAS).values_list("user_id", "alias"))
+    shards = {}
+    for user_id in user_ids:
+        shards.setdefault(aliases.get(user_id, DEFAULT_DB_ALIAS), []).append(user_id)
+    return shards
+
+
+@contextmanager
+def creator_shard(user_id):
+    """
+    Sends the queries made inside the block to the shard of a user.
+    """
+    with use_shard(placement(user_id).alias) as alias:
+        yield alias
+
+
+def copy_rows(model, user_id, source, target, event_ids, batch_size, after_id=0, up_to_id=None):
+    """
+    Copies the rows of a user from one shard to another in batches of consecutive ids, with new
+    ids. Rows of events missing from `event_ids` are skipped.
+
+    Returns:
+        tuple: The number of rows copied and the id of the last row read on the source.
+    """
+    rows = model.objects.using(source).filter(creator_id=user_id).order_by("id")
+    if up_to_id is not None:
+        rows = rows.filter(id__lte=up_to_id)
+    fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+    copied = 0
+    while True:
+        batch = list(rows.filter(id__gt=after_id).values("id", *fields)[:batch_size])
+        if not batch:
+            return copied, after_id
+        objs = []
+        for row in batch:
+            after_id = row.pop("id")
+            if row["event_id"] in event_ids:
+                row["event_id"] = event_ids[row["event_id"]]
+                objs.append(model(**row))
+        with transaction.atomic(using=target):
+            copied += len(model.objects.using(target).bulk_create(objs))
+
+
+def sync_events(user_id, source, target, event_ids):
+    """
+    Makes the events of a user on the target shard match the source, adding the new ones to
+    `event_ids`, and deletes the copies of the events that are gone along with their logs.
+    """
+    events = list(Event.all_objects.using(source).filter(user_id=user_id).order_by("id"))
+    for event in events:
+        fields = {
+            "name": event.name,
+            "description": event.description,
+            "deleted_at": event.deleted_at,
+        }
+        if event.id not in event_ids:
+            event_ids[event.id] = Event.all_objects.using(target).create(user_id=user_id, **fields).id
+        # `created_at` and `modified_at` are set automatically by save()
+        Event.all_objects.using(target).filter(id=event_ids[event.id]).update(
+            created_at=event.created_at, modified_at=event.modified_at, **fields
+        )
+    gone = set(event_ids) - {event.id for event in events}
+    for source_id in gone:
+        target_id = event_ids.pop(source_id)
+        delete_rows(EventLog.objects.using(target).filter(event_id=target_id), MOVE_BATCH_SIZE, target)
+        Event.all_objects.using(target).filter(id=target_id).delete()
+
+
+def delete_rows(queryset, batch_size, using):
+    """
+    Deletes the rows of a queryset in batches of consecutive ids, each in its own transaction.
+    """
+    deleted = 0
+    while True:
+        last_id = queryset.order_by("id").values_list("id", flat=True)[batch_size - 1:batch_size].first()
+        batch = queryset if last_id is None else queryset.filter(id__lte=last_id)
+        with transaction.atomic(using=using):
+            deleted += batch.delete()[0]
+        if last_id is None:
+            return deleted
+
+
+def delete_creator(user_id, alias, batch_size=MOVE_BATCH_SIZE):
+    """
+    Deletes everything stored for a user on a shard. Archive files are kept, they do not belong
+    to a shard.
+
+    Returns:
+        int: The number of event logs deleted.
+    """
+    deleted = delete_rows(EventLog.objects.using(alias).filter(creator_id=user_id), batch_size, alias)
+    for model in (EventRollup, EventUniqueSketch):
+        delete_rows(model.objects.using(alias).filter(creator_id=user_id), batch_size, alias)
+    with transaction.atomic(using=alias):
+        EventArchiveSegment.objects.using(alias).filter(creator_id=user_id).delete()
+        RetentionPolicy.objects.using(alias).filter(user_id=user_id).delete()
+        Event.all_objects.using(alias).filter(user_id=user_id).delete()
+    return deleted
+
+
+def move_wait():
+    """
+    Seconds after which no process writes with the placement of a user read before its move.
+    """
+    return (
+        getattr(settings, "EVENTMANAGER_SHARD_PLACEMENT_TTL", 5)
+        + getattr(settings, "EVENTMANAGER_BUFFER_FLUSH_INTERVAL", 1.0)
+        + 1
+    )
+
+
+def move_creator(user_id, target, batch_size=MOVE_BATCH_SIZE, wait=None, log=None):
+    """
+    Moves the data of a user to another shard while the user keeps using the API, see the module
+    documentation. An interrupted move leaves the user on their shard and can be run again.
+
+    Args:
+        user_id (int): The user to move.
+        target (str): The alias of the new shard, one of `EVENTMANAGER_SHARDS`.
+        batch_size (int): Number of rows copied or deleted per query.
+        wait (float, optional): Seconds to wait after refusing the writes, `move_wait()` by default.
+        log (callable, optional): Called with progress messages.
+
+    Returns:
+        int: The number of event logs moved.
+    """
+    log = log or (lambda message: None)
+    source = load_placement(user_id).alias
+    if source == target:
+        return 0
+
+    wait = move_wait() if wait is None else wait
+    # Leftovers of an interrupted move
+    delete_creator(user_id, target, batch_size)
+    event_ids = {}
+    logs = EventLog.objects.using(source).filter(creator_id=user_id)
+    watermark = logs.order_by("-id").values_list("id", flat=True).first() or 0
+    # Ids are assigned before the rows are committed, let the writes below the watermark finish
+    time.sleep(wait)
+    sync_events(user_id, source, target, event_ids)
+    moved, last_id = copy_rows(EventLog, user_id, source, target, event_ids, batch_size, up_to_id=watermark)
+    log(f"User {user_id}: copied {moved} event logs from {source} to {target}.")
+
+    ShardPlacement.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        user_id=user_id, defaults={"alias": source, "moving_to": target}
+    )
+    placements.delete(user_id)
+    try:
+        time.sleep(wait)
+        with transaction.atomic(using=target):
+            sync_events(user_id, source, target, event_ids)
+            if logs.filter(id__lte=watermark).count() != moved:
+                # Logs were compacted, archived or purged on the source during the first copy
+                delete_rows(EventLog.objects.using(target).filter(creator_id=user_id), batch_size, target)
+                moved, _ = copy_rows(
+                    EventLog, user_id, source, target, event_ids, batch_size, up_to_id=watermark
+                )
+            count, _ = copy_rows(
+                EventLog, user_id, source, target, event_ids, batch_size, after_id=last_id
+            )
+            moved += count
+            for model in (EventRollup, EventUniqueSketch):
+                copy_rows(model, user_id, source, target, event_ids, batch_size)
+            policy = RetentionPolicy.objects.using(source).filter(user_id=user_id).first()
+            if policy is not None:
+                RetentionPolicy.objects.using(target).create(
+                    user_id=user_id,
+                    raw_retention_days=policy.raw_retention_days,
+                    compacted_before=policy.compacted_before,
+                )
+            EventArchiveSegment.objects.using(target).bulk_create(
+                EventArchiveSegment(creator_id=user_id, month=month, row_count=row_count, size=size)
+                for month, row_count, size in EventArchiveSegment.objects.using(source)
+                .filter(creator_id=user_id)
+                .values_list("month", "row_count", "size")
+            )
+        with use_shard(target):
+            archive.remap_segments(user_id, event_ids)
+        ShardPlacement.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).update(
+            alias=target, moving_to=None
+        )
+    except BaseException:
+        ShardPlacement.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id).update(moving_to=None)
+        raise
+    finally:
+        placements.delete(user_id)
+    stats_cache.bump(user_id)
+    log(f"User {user_id}: moved {moved} event logs to {target}.")
+
+    delete_creator(user_id, source, batch_size)
+    log(f"User {user_id}: deleted the event logs from {source}.")
+    return moved
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .caching import event_names, stats_cache
+from .ingest import process_event_logs
+from .models import Event, EventLog
+from .sharding import delete_creator, load_placement, place_user
+
+
+@receiver(post_save, sender=EventLog)
+def event_log_created(sender, instance, created, raw=False, **kwargs):
+    """
+    Keeps the derived tables up to date for event logs saved one at a time.
+
+    Bulk inserts do not send signals, they go through `save_event_logs` instead.
+    """
+    if created and not raw:
+        process_event_logs([instance])
+
+
+@receiver(pre_save, sender=Event)
+def event_renamed(sender, instance, raw=False, **kwargs):
+    """
+    Forgets the cached id of the previous name of an event that is being updated.
+    """
+    if instance.pk is None or raw:
+        return
+    previous_name = Event.objects.filter(pk=instance.pk).values_list("name", flat=True).first()
+    if previous_name is not None and previous_name != instance.name:
+        event_names.invalidate(instance.user_id, previous_name)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, **kwargs):
+    """
+    Forgets the cached id of an event name whenever an event is created, updated or deleted.
+    """
+    event_names.invalidate(instance.user_id, instance.name)
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    """
+    Invalidates the cached stats of the owner, the logs of the event are gone.
+    """
+    stats_cache.bump_on_commit(instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """
+    Stops accepting a cached token as soon as it is deleted, for example on logout.
+    """
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, raw=False, **kwargs):
+    """
+    Places new users on a shard, and drops the cached tokens of a user that was changed, for
+    example deactivated.
+    """
+    if raw:
+        return
+    if created:
+        place_user(instance.pk)
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list("key", flat=True):
+        token_cache.delete(key)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    """
+    Deletes the data of a user stored on another shard, which the cascade on `default` cannot reach.
+    """
+    alias = load_placement(instance.pk).alias
+    if alias != DEFAULT_DB_ALIAS:
+        delete_creator(instance.pk, alias)
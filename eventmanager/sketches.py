@@ -0,0 +1,174 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .caching import stats_cache
+from .hll import HyperLogLog
+from .models import EventLog, EventRollup, EventUniqueSketch
+from .rollups import bucket_start, compacted_ranges
+from .routers import shard_db
+
+# Number of sketches locked and updated by a single query.
+SKETCH_BATCH_SIZE = 200
+
+
+def unique_keys():
+    """
+    Returns the keys of `EventLog.data` whose distinct values are counted.
+    """
+    return list(getattr(settings, "EVENTMANAGER_UNIQUE_KEYS", []))
+
+
+def sketch_event_logs(logs, keys, sketches=None):
+    """
+    Builds the sketches of a list of event logs.
+
+    Logs without a value for a key, or with a null value, are not counted for that key.
+
+    Args:
+        logs (iterable): EventLog instances.
+        keys (list): The keys of `EventLog.data` to sketch.
+        sketches (dict, optional): Sketches to add the values to, instead of a new dict.
+
+    Returns:
+        dict: Maps (creator_id, event_id, event_name, key, day) to a HyperLogLog.
+    """
+    sketches = {} if sketches is None else sketches
+    for log in logs:
+        if not isinstance(log.data, dict):
+            continue
+        day = bucket_start(log.timestamp, EventRollup.DAY).date()
+        for key in keys:
+            value = log.data.get(key)
+            if value is None:
+                continue
+            sketch_key = (log.creator_id, log.event_id, log.event_name, key, day)
+            if sketch_key not in sketches:
+                sketches[sketch_key] = HyperLogLog()
+            sketches[sketch_key].add(value)
+    return sketches
+
+
+def record_event_logs(logs):
+    """
+    Adds freshly written event logs to the sketches of their day.
+
+    Args:
+        logs (iterable): Saved EventLog instances.
+    """
+    keys = unique_keys()
+    if keys:
+        apply_sketches(sketch_event_logs(logs, keys))
+
+
+def apply_sketches(sketches):
+    """
+    Merges sketches into the stored ones, creating missing rows.
+
+    Missing rows are first inserted empty, then every row is locked while it is merged, so
+    concurrent writers never overwrite each other's values. Rows are always inserted and locked
+    in the order of their key, so two writers cannot deadlock.
+
+    Args:
+        sketches (dict): Maps (creator_id, event_id, event_name, key, day) to a HyperLogLog.
+    """
+    if not sketches:
+        return
+    items = sorted(sketches.items(), key=lambda item: item[0])
+    with transaction.atomic(using=shard_db()):
+        for start in range(0, len(items), SKETCH_BATCH_SIZE):
+            _merge_sketches(dict(items[start:start + SKETCH_BATCH_SIZE]))
+
+
+def _merge_sketches(sketches):
+    fields = ["creator_id", "event_id", "event_name", "key", "day"]
+    EventUniqueSketch.objects.bulk_create(
+        [
+            EventUniqueSketch(registers=HyperLogLog().to_bytes(), **dict(zip(fields, sketch_key)))
+            for sketch_key in sketches
+        ],
+        ignore_conflicts=True,
+    )
+    lookup = Q()
+    for sketch_key in sketches:
+        lookup |= Q(**dict(zip(fields, sketch_key)))
+    rows = list(
+        EventUniqueSketch.objects.select_for_update()
+        .filter(lookup)
+        .order_by("creator_id", "event_id", "day", "key")
+    )
+    for row in rows:
+        sketch = HyperLogLog.from_bytes(bytes(row.registers))
+        sketch.merge(sketches[(row.creator_id, row.event_id, row.event_name, row.key, row.day)])
+        row.registers = sketch.to_bytes()
+    EventUniqueSketch.objects.bulk_update(rows, ["registers"])
+
+
+def merge_rows(rows):
+    """
+    Merges stored sketches into a single one.
+
+    Args:
+        rows (iterable): The `registers` of EventUniqueSketch rows.
+
+    Returns:
+        HyperLogLog: The union of the sketches.
+    """
+    merged = HyperLogLog()
+    for registers in rows:
+        merged.merge(HyperLogLog.from_bytes(bytes(registers)))
+    return merged
+
+
+def rebuild_sketches(creator_id=None, start=None, end=None, chunk_size=10000, max_sketches=5000):
+    """
+    Recomputes the sketches from the raw event logs.
+
+    Days whose raw logs were removed by `compact_eventlogs` are kept as they are.
+
+    Args:
+        creator_id (int, optional): Only rebuild the sketches of this user.
+        start (datetime, optional): Only rebuild the days from this time on. Should be the start of a UTC day.
+        end (datetime, optional): Only rebuild the days before this time. Should be the start of a UTC day.
+        chunk_size (int): Number of event logs read at a time.
+        max_sketches (int): Number of sketches kept in memory before they are written.
+
+    Returns:
+        int: The number of sketch rows written.
+    """
+    # The logs of deleted events are waiting to be purged
+    logs = EventLog.objects.filter(event__deleted_at__isnull=True)
+    sketches = EventUniqueSketch.objects.all()
+    if creator_id is not None:
+        logs = logs.filter(creator_id=creator_id)
+        sketches = sketches.filter(creator_id=creator_id)
+    if start is not None:
+        logs = logs.filter(timestamp__gte=start)
+        sketches = sketches.filter(day__gte=start.date())
+    if end is not None:
+        logs = logs.filter(timestamp__lt=end)
+        sketches = sketches.filter(day__lt=end.date())
+    for compacted_creator_id, compacted_before in compacted_ranges(creator_id).items():
+        logs = logs.exclude(creator_id=compacted_creator_id, timestamp__lt=compacted_before)
+        sketches = sketches.exclude(creator_id=compacted_creator_id, day__lt=compacted_before.date())
+
+    keys = unique_keys()
+    with transaction.atomic(using=shard_db()):
+        # Creators whose cached stats have to be invalidated
+        creator_ids = set(sketches.values_list("creator_id", flat=True).distinct())
+        sketches.delete()
+        if keys:
+            fields = ["creator_id", "event_id", "event_name", "timestamp", "data"]
+            pending = {}
+            for log in logs.only(*fields).iterator(chunk_size=chunk_size):
+                sketch_event_logs([log], keys, pending)
+                if len(pending) >= max_sketches:
+                    creator_ids.update(sketch_key[0] for sketch_key in pending)
+                    apply_sketches(pending)
+                    pending = {}
+            creator_ids.update(sketch_key[0] for sketch_key in pending)
+            apply_sketches(pending)
+
+    for creator_id in creator_ids:
+        stats_cache.bump(creator_id)
+    return EventUniqueSketch.objects.filter(creator_id__in=creator_ids).count()
@@ -0,0 +1,345 @@
+"""
+Queries behind the stats endpoints, shared by the synchronous and the asynchronous views.
+
+The `*_query` functions return lazy querysets, so the views can evaluate them with either `list()`
+or `async for`, and turn the rows into the response with the matching `format_*` function.
+"""
+import zoneinfo
+from datetime import datetime, date, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Sum, functions
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .hll import HyperLogLog
+from .models import EventLog, EventRollup, EventUniqueSketch
+from .partitioning import add_months
+
+# Assuming we start collecting data from this date, so if no start time is specified,
+# we get everything from the beginning
+APP_START_DATE = datetime(2020, 1, 1)
+
+TREND_TRUNCS = {
+    "minute": functions.TruncMinute,
+    "hour": functions.TruncHour,
+    "day": functions.TruncDay,
+    "week": functions.TruncWeek,
+    "month": functions.TruncMonth,
+}
+
+# Maximum number of buckets of a zero-filled trend
+MAX_TREND_BUCKETS = 10000
+
+
+def parse_time(params, name):
+    """
+    Parses an optional ISO 8601 date or datetime query parameter. Naive values are taken as UTC.
+
+    Raises:
+        ValidationError: If the parameter is not a valid date or datetime.
+    """
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = day and datetime(day.year, day.month, day.day)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: "Expected an ISO 8601 date or datetime."})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def daily_rollups(creator_id):
+    """
+    Returns a queryset of the daily rollups that belong to a user.
+    """
+    return EventRollup.objects.filter(creator_id=creator_id, period=EventRollup.DAY)
+
+
+def frequency_query(rollups, params):
+    """
+    Counts the event logs per event name.
+
+    If 'event_name' is specified, only that event is counted, within the optional 'start_date'
+    and 'end_date' range (both exclusive).
+
+    Args:
+        rollups (QuerySet): The daily rollups of the authenticated user.
+        params (QueryDict): The query parameters of the request.
+
+    Returns:
+        QuerySet: Rows with the keys 'event_name' and 'total'.
+    """
+    event_name = params.get("event_name")
+    if event_name:
+        rollups = rollups.filter(
+            event_name=event_name,
+            bucket__date__gt=params.get("start_date") or APP_START_DATE,
+            bucket__date__lt=params.get("end_date") or date.today(),
+        )
+    return rollups.values("event_name").annotate(total=Sum("count")).order_by()
+
+
+def format_frequency(params, rows):
+    """
+    Turns the rows of `frequency_query` into the answer of the event frequency endpoint.
+    """
+    event_name = params.get("event_name")
+    if event_name:
+        return {"event_name": event_name, "total": rows[0]["total"] if rows else 0}
+    return list(rows)
+
+
+def parse_bucket_params(params):
+    """
+    Validates the query parameters that select event logs and cut them into time buckets.
+
+    Args:
+        params (QueryDict): The query parameters of the request.
+
+    Returns:
+        dict: The 'granularity', 'tz' (a ZoneInfo), 'event_name', 'start' and 'end' options.
+
+    Raises:
+        ValidationError: If a parameter is invalid.
+    """
+    granularity = params.get("granularity") or "day"
+    if granularity not in TREND_TRUNCS:
+        raise ValidationError({"granularity": f"Expected one of {', '.join(TREND_TRUNCS)}."})
+    try:
+        tz = zoneinfo.ZoneInfo(params.get("tz") or "UTC")
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValidationError({"tz": "Expected an IANA time zone name, such as Europe/Paris."})
+    return {
+        "granularity": granularity,
+        "tz": tz,
+        "event_name": params.get("event_name"),
+        "start": parse_time(params, "start"),
+        "end": parse_time(params, "end"),
+    }
+
+
+def parse_trend_params(params):
+    """
+    Validates the query parameters of the event trend endpoint.
+
+    Returns:
+        dict: The options of `parse_bucket_params`, plus the 'layout'.
+
+    Raises:
+        ValidationError: If a parameter is invalid.
+    """
+    options = parse_bucket_params(params)
+    options["layout"] = params.get("layout") or "nested"
+    if options["layout"] not in ("nested", "columnar"):
+        raise ValidationError({"layout": "Expected nested or columnar."})
+    return options
+
+
+def utc_offsets(tz):
+    """
+    Returns the UTC offsets of a time zone in winter and in summer of the current year.
+    """
+    year = date.today().year
+    return {tz.utcoffset(datetime(year, month, 1)) for month in (1, 7)}
+
+
+def reads_raw_logs(options):
+    """
+    Tells whether `trend_query` counts the raw event logs, for minutes and for time zones whose
+    offsets are not whole hours, rather than the rollups.
+    """
+    offsets = utc_offsets(options["tz"])
+    return options["granularity"] == "minute" or any(offset % timedelta(hours=1) for offset in offsets)
+
+
+def floor_to_period(value, period):
+    """
+    Rounds an aware datetime down to the start of its rollup bucket, an hour or a day in UTC.
+    """
+    value = value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if period == EventRollup.DAY else value
+
+
+def trend_query(creator_id, options):
+    """
+    Counts the event logs of a user per time bucket and event name.
+
+    The counts are read from the coarsest source that can answer exactly: the daily rollups for
+    days, weeks and months in UTC, the hourly rollups for other time zones whose offsets are whole
+    hours, and the raw event logs for minutes and for the remaining time zones. With the rollups,
+    'start' and 'end' are rounded down to the hour or day of the rollups, which is also the hour
+    or day in the requested time zone. The raw logs moved to the archive are
+    not counted, see `archive.trend_rows`.
+
+    Args:
+        creator_id (int): The authenticated user.
+        options (dict): The options returned by `parse_trend_params`.
+
+    Returns:
+        QuerySet: Rows with the keys 'time_bucket', 'event_name' and 'count'.
+    """
+    tz = options["tz"]
+    offsets = utc_offsets(tz)
+    start, end = options["start"], options["end"]
+    if reads_raw_logs(options):
+        source = EventLog.objects.filter(creator_id=creator_id, event__deleted_at__isnull=True)
+        field, count = "timestamp", Count("id")
+    else:
+        period = EventRollup.DAY
+        if options["granularity"] == "hour" or offsets != {timedelta(0)}:
+            period = EventRollup.HOUR
+        source = EventRollup.objects.filter(creator_id=creator_id, period=period)
+        field, count = "bucket", Sum("count")
+        # A bucket holds the logs of its whole hour or day, it is kept if it starts before 'end'
+        start = start and floor_to_period(start, period)
+        end = end and floor_to_period(end, period)
+
+    if options["event_name"]:
+        source = source.filter(event_name=options["event_name"])
+    if start:
+        source = source.filter(**{f"{field}__gte": start})
+    if end:
+        source = source.filter(**{f"{field}__lt": end})
+    return (
+        source.annotate(time_bucket=TREND_TRUNCS[options["granularity"]](field, tzinfo=tz))
+        .values("time_bucket", "event_name")
+        .annotate(count=count)
+        .order_by("time_bucket", "event_name")
+    )
+
+
+def local_bucket(bucket, granularity, tz):
+    """
+    Converts a truncated timestamp to the bucket it stands for in the time zone of the request.
+
+    Returns:
+        An aware datetime for minutes and hours, a date for days, weeks and months.
+    """
+    if granularity in ("minute", "hour"):
+        return bucket.astimezone(tz)
+    return bucket.astimezone(tz).date() if isinstance(bucket, datetime) else bucket
+
+
+def next_bucket(bucket, granularity, tz):
+    if granularity == "minute":
+        return (bucket.astimezone(dt_timezone.utc) + timedelta(minutes=1)).astimezone(tz)
+    if granularity == "hour":
+        return (bucket.astimezone(dt_timezone.utc) + timedelta(hours=1)).astimezone(tz)
+    if granularity == "week":
+        return bucket + timedelta(days=7)
+    if granularity == "month":
+        return add_months(bucket, 1)
+    return bucket + timedelta(days=1)
+
+
+def trend_buckets(first, last, granularity, tz):
+    """
+    Lists every bucket from `first` to `last`, inclusive.
+
+    Raises:
+        ValidationError: If there are more than MAX_TREND_BUCKETS buckets.
+    """
+    buckets = [first]
+    while buckets[-1] < last:
+        if len(buckets) == MAX_TREND_BUCKETS:
+            raise ValidationError(
+                {
+                    "granularity": f"The answer would have more than {MAX_TREND_BUCKETS} buckets. "
+                    "Use a coarser granularity or a shorter range."
+                }
+            )
+        buckets.append(next_bucket(buckets[-1], granularity, tz))
+    return buckets
+
+
+def format_trend(options, rows):
+    """
+    Formats the rows of `trend_query` in the layout requested by the client.
+
+    The 'nested' layout is a dictionary where the keys are the buckets, and the values are
+    dictionaries that map the event names to their count in that bucket. Buckets without events
+    are left out. Rows of the same bucket and event name are added up.
+
+    The 'columnar' layout has one list of buckets, shared by all events, and one list of counts per
+    event in the 'series' dictionary, with a zero for every bucket without events of that name.
+
+    Buckets are ISO 8601 dates for days, weeks and months, and datetimes for minutes and hours.
+    """
+    granularity = options["granularity"]
+    tz = options["tz"]
+    counts = {}
+    for item in rows:
+        bucket = local_bucket(item["time_bucket"], granularity, tz)
+        events = counts.setdefault(bucket, {})
+        events[item["event_name"]] = events.get(item["event_name"], 0) + item["count"]
+
+    if options["layout"] == "nested":
+        return {bucket.isoformat(): events for bucket, events in counts.items()}
+
+    buckets = trend_buckets(min(counts), max(counts), granularity, tz) if counts else []
+    names = sorted({name for events in counts.values() for name in events})
+    return {
+        "granularity": granularity,
+        "tz": tz.key,
+        "buckets": [bucket.isoformat() for bucket in buckets],
+        "series": {
+            name: [counts.get(bucket, {}).get(name, 0) for bucket in buckets] for name in names
+        },
+    }
+
+
+def unique_query(creator_id, params):
+    """
+    Selects the sketches of a key of an event's data within a date range.
+
+    'start_date' is inclusive and defaults to the first day of data, 'end_date' is exclusive and
+    defaults to tomorrow, so that today is included.
+
+    Args:
+        creator_id (int): The authenticated user.
+        params (QueryDict): The query parameters of the request, with valid dates.
+
+    Returns:
+        QuerySet: (day, registers) rows ordered by day.
+    """
+    return (
+        EventUniqueSketch.objects.filter(
+            creator_id=creator_id,
+            event_name=params.get("event_name"),
+            key=params.get("key"),
+            day__gte=params.get("start_date") or APP_START_DATE.date(),
+            day__lt=params.get("end_date") or date.today() + timedelta(days=1),
+        )
+        .values_list("day", "registers")
+        .order_by("day")
+    )
+
+
+def format_unique(params, rows):
+    """
+    Merges the rows of `unique_query` into the estimated number of distinct values, in total and per day.
+    """
+    total = HyperLogLog()
+    daily = {}
+    for day, registers in rows:
+        sketch = HyperLogLog.from_bytes(bytes(registers))
+        total.merge(sketch)
+        if day in daily:
+            # Several events can log under the same name, for example after a rename
+            sketch = daily[day].merge(sketch)
+        daily[day] = sketch
+    return {
+        "event_name": params.get("event_name"),
+        "key": params.get("key"),
+        "unique": total.count(),
+        "error_rate": round(total.error_rate, 4),
+        "daily": {day.isoformat(): sketch.count() for day, sketch in daily.items()},
+    }
@@ -1,12 +1,48 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework.authtoken.models import Token
 
+from ..authentication import token_cache
+from ..caching import event_names
+from ..ingest import recent_client_ids
+from ..throttling import ingestion_limits, ingestion_throttle
+
 
 class BaseTestCase(TestCase):
+    # The stats endpoints read through the "replica" alias, a mirror of "default" in tests
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        # Reads on the mirror share the connection of "default", so they see the rows written
+        # inside the transaction of the test
+        cls.replica_connections = {}
+        for alias in settings.EVENTMANAGER_READ_REPLICAS:
+            cls.replica_connections[alias] = connections[alias]
+            connections[alias] = connections["default"]
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias, connection in cls.replica_connections.items():
+            connections[alias] = connection
+
     def setUp(self):
         self.client = APIClient()
+        # Cached ids could outlive the rows of a previous test
+        event_names.clear()
+        token_cache.clear()
+        # Stats answers and the counters of the ingestion limits
+        for cache in caches.all():
+            cache.clear()
+        ingestion_limits.clear()
+        ingestion_throttle.clear()
+        recent_client_ids.clear()
 
         # Create a test user and get its token
         self.user1 = get_user_model().objects.create_user(
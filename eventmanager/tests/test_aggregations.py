@@ -0,0 +1,90 @@
+from django.test import SimpleTestCase
+
+from .BaseTest import BaseTestCase
+from ..aggregations import Reducer
+from ..models import Event
+
+
+class ReducerTest(SimpleTestCase):
+    def test_exact_below_sample_size(self):
+        reducer = Reducer()
+        for value in [4, 1, 3, 2, 5]:
+            reducer.add(value)
+        self.assertEqual((reducer.count, reducer.sum, reducer.min, reducer.max), (5, 15, 1, 5))
+        self.assertEqual(reducer.percentile(0.5), 3)
+        self.assertEqual(reducer.percentile(0.9), 4.6)
+        self.assertEqual(reducer.percentile(0), 1)
+        self.assertEqual(reducer.percentile(1), 5)
+
+    def test_sample_is_bounded(self):
+        reducer = Reducer(size=1000)
+        for value in range(100000):
+            reducer.add(value)
+        self.assertEqual(len(reducer.sample), 1000)
+        self.assertEqual(reducer.max, 99999)
+        self.assertAlmostEqual(reducer.percentile(0.5), 50000, delta=5000)
+
+
+class EventAggregateTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        Event.objects.create(user=self.user1, name="purchase")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        records = [
+            {"event_name": "purchase", "data": data, "timestamp": timestamp}
+            for data, timestamp in [
+                ({"total_amount": 50, "quantity": 2}, "2023-01-01T10:00:00Z"),
+                ({"total_amount": 20.5}, "2023-01-01T11:00:00Z"),
+                ({"total_amount": 10}, "2023-01-01T12:00:00Z"),
+                ({"total_amount": "n/a"}, "2023-01-01T12:00:00Z"),
+                ({"quantity": 1}, "2023-01-02T10:00:00Z"),
+                ({"total_amount": 100}, "2023-01-03T10:00:00Z"),
+            ]
+        ]
+        self.client.post("/api/eventlogs/batch", records, format="json")
+
+    def get_aggregate(self, **params):
+        return self.client.get(
+            "/api/stats/aggregate", {"event_name": "purchase", "key": "total_amount", **params}
+        )
+
+    def test_daily_aggregates(self):
+        response = self.get_aggregate(percentiles="50")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["buckets"],
+            [
+                {
+                    "bucket": "2023-01-01",
+                    "count": 3,
+                    "sum": 80.5,
+                    "min": 10,
+                    "max": 50,
+                    "avg": 80.5 / 3,
+                    "percentiles": {"p50": 20.5},
+                },
+                {
+                    "bucket": "2023-01-03",
+                    "count": 1,
+                    "sum": 100,
+                    "min": 100,
+                    "max": 100,
+                    "avg": 100,
+                    "percentiles": {"p50": 100},
+                },
+            ],
+        )
+
+    def test_granularity_and_range(self):
+        response = self.get_aggregate(granularity="month", end="2023-01-02")
+        self.assertEqual(len(response.data["buckets"]), 1)
+        bucket = response.data["buckets"][0]
+        self.assertEqual(bucket["bucket"], "2023-01-01")
+        self.assertEqual(bucket["count"], 3)
+        self.assertEqual(set(bucket["percentiles"]), {"p50", "p90", "p99"})
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get("/api/stats/aggregate", {"key": "total_amount"}).status_code, 400)
+        self.assertEqual(self.get_aggregate(key="").status_code, 400)
+        self.assertEqual(self.get_aggregate(percentiles="101").status_code, 400)
+        self.assertEqual(self.get_aggregate(percentiles="median").status_code, 400)
@@ -0,0 +1,175 @@
+import io
+import shutil
+import tempfile
+from datetime import date
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from .BaseTest import BaseTestCase
+from ..archive import (
+    SegmentReader,
+    SegmentWriter,
+    flatten,
+    segment_path,
+    write_segment,
+)
+from ..models import Event, EventArchiveSegment, EventLog, RetentionPolicy
+
+
+class ArchiveEventLogsTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(EVENTMANAGER_ARCHIVE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.event = Event.objects.create(user=self.user1, name="event1")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        self.post_logs(
+            [
+                ("2023-01-15T10:00:30+00:00", {"user": "alice", "page": {"url": "/a"}}),
+                ("2023-01-15T10:00:50+00:00", {"user": "bob"}),
+                ("2023-02-03T12:00:00+00:00", {"user": "alice"}),
+                (timezone.now().isoformat(), {"user": "alice"}),
+            ]
+        )
+
+    def post_logs(self, logs):
+        records = [
+            {"event_name": "event1", "data": data, "timestamp": timestamp}
+            for timestamp, data in logs
+        ]
+        response = self.client.post("/api/eventlogs/batch", records, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def archive(self, *args):
+        output = io.StringIO()
+        call_command("archive_eventlogs", "--months", "1", *args, stdout=output)
+        return output.getvalue()
+
+    def get_stats(self):
+        return [
+            self.client.get("/api/stats/event_frequency").data,
+            self.client.get("/api/stats/event_trend").data,
+            self.client.get("/api/stats/event_trend", {"granularity": "minute"}).data,
+            self.client.get("/api/stats/event_trend", {"tz": "Asia/Kolkata"}).data,
+        ]
+
+    def test_segment_round_trip(self):
+        path = Path(self.directory) / "segment.evla"
+        records = [
+            (1, 1000000, 7, "event1", flatten({"user": "alice", "page": {"url": "/a"}})),
+            (2, 2000000, 8, "event2", flatten({"user": "bob", "tags": ["x"]})),
+            (3, 3000000, 7, "event1", flatten("not an object")),
+        ]
+        write_segment(path, records)
+        with SegmentReader(path) as segment:
+            self.assertEqual(segment.rows, 3)
+            self.assertEqual(
+                sorted(segment.data_keys), ["data", "data.page.url", "data.tags", "data.user"]
+            )
+            self.assertEqual(list(segment.column("timestamp")), [1000000, 2000000, 3000000])
+            self.assertEqual(segment.column("event_name"), ["event1", "event2", "event1"])
+            self.assertEqual(segment.column("data.user"), ["alice", "bob", None])
+            self.assertEqual(segment.records(), records)
+
+    def test_segments_are_streamed_in_chunks(self):
+        path = Path(self.directory) / "segment.evla"
+        records = [
+            (
+                index,
+                index * 1000000,
+                7,
+                f"event{index % 3}",
+                flatten({"n": index, "late": True}) if index >= 500 else flatten({"n": index}),
+            )
+            for index in range(1000)
+        ]
+        with mock.patch.object(SegmentWriter, "BUFFER_SIZE", 64), mock.patch.object(
+            SegmentReader, "CHUNK_SIZE", 7
+        ):
+            self.assertEqual(write_segment(path, iter(records)), 1000)
+            with SegmentReader(path) as segment:
+                self.assertEqual(list(segment.iter_records()), records)
+                self.assertEqual(
+                    list(segment.iter_column("data.late")), [None] * 500 + [True] * 500
+                )
+        self.assertEqual([p.name for p in Path(self.directory).iterdir()], ["segment.evla"])
+
+    def test_missing_segments_are_skipped(self):
+        self.archive()
+        segment_path(self.user1.id, date(2023, 1, 1)).unlink()
+        with self.assertLogs("eventmanager.archive", "WARNING"):
+            response = self.client.get("/api/stats/event_trend", {"granularity": "minute"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+    def test_archive_keeps_stats(self):
+        before = self.get_stats()
+        self.assertEqual(before[2]["2023-01-15T10:00:00+00:00"], {"event1": 2})
+
+        output = self.archive("--batch-size", "1")
+        self.assertIn("archived 2 event logs of 2023-01", output)
+        self.assertIn("Archived 3 event logs.", output)
+        self.assertEqual(EventLog.objects.count(), 1)
+        segments = EventArchiveSegment.objects.filter(creator=self.user1).order_by("month")
+        self.assertEqual([segment.row_count for segment in segments], [2, 1])
+        self.assertEqual(self.get_stats(), before)
+
+        # Rebuilding the rollups keeps the archived buckets
+        call_command("rebuild_event_rollups", stdout=io.StringIO())
+        self.assertEqual(self.get_stats(), before)
+
+        # Ranges are applied to the archived logs too
+        response = self.client.get(
+            "/api/stats/event_trend",
+            {"granularity": "minute", "start": "2023-01-15T10:00:40Z", "end": "2023-02-01"},
+        )
+        self.assertEqual(response.data, {"2023-01-15T10:00:00+00:00": {"event1": 1}})
+
+        self.assertIn("Archived 0 event logs.", self.archive())
+
+    def test_late_logs_are_merged(self):
+        self.archive()
+        self.post_logs([("2023-01-20T08:00:00+00:00", {"user": "carol"})])
+        self.archive()
+
+        segment = EventArchiveSegment.objects.get(creator=self.user1, month="2023-01-01")
+        self.assertEqual(segment.row_count, 3)
+        response = self.client.get(
+            "/api/stats/event_trend", {"granularity": "minute", "end": "2023-02-01"}
+        )
+        self.assertEqual(
+            response.data,
+            {
+                "2023-01-15T10:00:00+00:00": {"event1": 2},
+                "2023-01-20T08:00:00+00:00": {"event1": 1},
+            },
+        )
+
+    def test_deleted_events_are_skipped(self):
+        self.archive()
+        self.client.delete(f"/api/events/{self.event.id}")
+        response = self.client.get("/api/stats/event_trend", {"granularity": "minute"})
+        self.assertEqual(response.data, {})
+
+    def test_dry_run(self):
+        self.assertIn(f"User {self.user1.id}: 3 event logs", self.archive("--dry-run"))
+        self.assertEqual(EventLog.objects.count(), 4)
+        self.assertFalse(EventArchiveSegment.objects.exists())
+
+    def test_compaction_removes_expired_segments(self):
+        self.archive()
+        RetentionPolicy.objects.filter(user=self.user1).update(raw_retention_days=30)
+        output = io.StringIO()
+        call_command("compact_eventlogs", stdout=output)
+        self.assertIn("removed 2 archived months", output.getvalue())
+        self.assertFalse(EventArchiveSegment.objects.exists())
+        response = self.client.get("/api/stats/event_trend", {"granularity": "minute"})
+        self.assertEqual(len(response.data), 1)
@@ -0,0 +1,93 @@
+from django.test import AsyncClient, override_settings
+
+from .BaseTest import BaseTestCase
+from ..models import Event, EventLog, EventRollup
+
+
+class AsyncViewsTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.async_client = AsyncClient()
+        self.headers = {"Authorization": "Token " + self.token1.key}
+        self.event = Event.objects.create(user=self.user1, name="event1")
+
+    def post(self, path, data):
+        # The headers of AsyncClient(headers=...) are not sent before Django 5.0
+        return self.async_client.post(
+            path, data, content_type="application/json", headers=self.headers
+        )
+
+    def get(self, path, params=None):
+        return self.async_client.get(path, params, headers=self.headers)
+
+    async def test_requires_authentication(self):
+        response = await AsyncClient().get("/api/async/stats/event_frequency")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["WWW-Authenticate"], "Token")
+
+        response = await AsyncClient().get(
+            "/api/async/stats/event_frequency", headers={"Authorization": "Token invalid"}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    async def test_create_event_log(self):
+        response = await self.post(
+            "/api/async/eventlogs/", {"event_name": "event1", "data": {"page": "home"}}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"event_name": "event1", "data": {"page": "home"}})
+
+        log = await EventLog.objects.aget(creator=self.user1)
+        self.assertEqual(log.event_id, self.event.id)
+        rollup = await EventRollup.objects.aget(creator=self.user1, period=EventRollup.DAY)
+        self.assertEqual(rollup.count, 1)
+
+    async def test_create_event_log_errors(self):
+        response = await self.post("/api/async/eventlogs/", {"event_name": "unknown", "data": {}})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.json())
+
+        response = await self.post("/api/async/eventlogs/", {"data": {}})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("event_name", response.json())
+
+        response = await self.post("/api/async/eventlogs/", "{not json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(await EventLog.objects.acount(), 0)
+
+    async def test_create_batch(self):
+        response = await self.post(
+            "/api/async/eventlogs/batch",
+            [{"event_name": "event1", "data": {}}, {"event_name": "unknown", "data": {}}],
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["accepted"], 1)
+        self.assertEqual(response.json()["rejected"], 1)
+        self.assertEqual(await EventLog.objects.acount(), 1)
+
+    @override_settings(EVENTMANAGER_BATCH_MAX_SIZE=1)
+    async def test_create_batch_too_large(self):
+        response = await self.post(
+            "/api/async/eventlogs/batch",
+            [{"event_name": "event1", "data": {}}, {"event_name": "event1", "data": {}}],
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(await EventLog.objects.acount(), 0)
+
+    async def test_stats(self):
+        await self.post(
+            "/api/async/eventlogs/batch",
+            [{"event_name": "event1", "data": {}, "timestamp": "2023-01-01T10:00:00Z"}] * 2,
+        )
+
+        response = await self.get("/api/async/stats/event_frequency")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{"event_name": "event1", "total": 2}])
+
+        response = await self.get(
+            "/api/async/stats/event_frequency", {"event_name": "event1", "end_date": "2100-01-01"}
+        )
+        self.assertEqual(response.json(), {"event_name": "event1", "total": 2})
+
+        response = await self.get("/api/async/stats/event_trend")
+        self.assertEqual(response.json(), {"2023-01-01": {"event1": 2}})
@@ -0,0 +1,36 @@
+from django.test import TransactionTestCase, override_settings
+
+from benchmarks import fastpaths, runner
+from benchmarks.seed import load_accounts, seed
+
+
+# The benchmarks are not meant to hit the ingestion limits
+@override_settings(EVENTMANAGER_THROTTLE_RATE=None, EVENTMANAGER_DAILY_EVENT_QUOTA=None)
+class BenchmarkSmokeTest(TransactionTestCase):
+    # Committed rows, so that the stats and the export read them through the replica connection
+    databases = {"default", "replica"}
+
+    def test_scenarios_run_without_errors(self):
+        accounts = seed(users=2, events_per_user=3, rows=50, days=2)
+        self.assertEqual(
+            [(user.id, names) for user, _, names in load_accounts()],
+            [(user.id, names) for user, _, names in accounts],
+        )
+
+        results = runner.run(accounts, iterations=2, scenarios=runner.default_scenarios(batch_size=5))
+        for name, result in results.items():
+            self.assertEqual(result["errors"], 0, name)
+        self.assertGreater(results["event_frequency"]["queries_per_request"], 0)
+        # The boundary and the rows of the export are read from the replica
+        self.assertGreaterEqual(results["export_10000"]["queries_per_request"], 2)
+
+    def test_compare(self):
+        baseline = {"results": {"a": {"latency_ms": {"p95": 10}}, "b": {"latency_ms": {"p95": 10}}}}
+        results = {"a": {"latency_ms": {"p95": 11}}, "b": {"latency_ms": {"p95": 13}}}
+        self.assertEqual(runner.compare(results, baseline, 0.2), ["b: p95 10 ms -> 13 ms"])
+
+    def test_fast_paths(self):
+        results = fastpaths.run(iterations=1)
+        self.assertEqual(
+            set(results), {"validate_batch_500", "render_trend_365x20", "parse_batch_500"}
+        )
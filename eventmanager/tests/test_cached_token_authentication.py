@@ -0,0 +1,44 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .BaseTest import BaseTestCase
+
+
+class CachedTokenAuthenticationTest(BaseTestCase):
+    def get_events(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/events/")
+        token_queries = [q for q in queries if 'FROM "authtoken_token"' in q["sql"]]
+        return response, len(token_queries)
+
+    def test_token_is_cached(self):
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response, lookups = self.get_events()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lookups, 1)
+
+        response, lookups = self.get_events()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lookups, 0)
+
+    def test_logout_invalidates_token(self):
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        self.assertEqual(self.get_events()[0].status_code, 200)
+
+        response = self.client.post("/auth/token/logout/")
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.get_events()[0].status_code, 401)
+
+    def test_deactivated_user_is_rejected(self):
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        self.assertEqual(self.get_events()[0].status_code, 200)
+
+        self.user1.is_active = False
+        self.user1.save()
+
+        self.assertEqual(self.get_events()[0].status_code, 401)
@@ -0,0 +1,97 @@
+import io
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+
+from .BaseTest import BaseTestCase
+from ..models import Event, EventLog, EventRollup, RetentionPolicy
+
+
+class CompactEventLogsTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(user=self.user1, name="event1")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        now = timezone.now()
+        records = [
+            {
+                "event_name": "event1",
+                "data": {"user": "alice"},
+                "timestamp": (now - timedelta(days=days)).isoformat(),
+            }
+            for days in [100, 100, 60, 1]
+        ]
+        self.client.post("/api/eventlogs/batch", records, format="json")
+        # Logs of a user without retention are never removed
+        other = Event.objects.create(user=self.user2, name="event1")
+        EventLog.objects.create(
+            creator=self.user2,
+            event=other,
+            event_name="event1",
+            data={},
+            timestamp=now - timedelta(days=100),
+        )
+
+    def compact(self, *args):
+        output = io.StringIO()
+        call_command("compact_eventlogs", *args, stdout=output)
+        return output.getvalue()
+
+    def get_stats(self):
+        frequency = self.client.get("/api/stats/event_frequency").data
+        trend = self.client.get("/api/stats/event_trend").data
+        return frequency, trend
+
+    def test_compaction_keeps_stats(self):
+        RetentionPolicy.objects.create(user=self.user1, raw_retention_days=30)
+        before = self.get_stats()
+
+        output = self.compact("--batch-size", "1")
+        self.assertIn("Removed 3 event logs.", output)
+        self.assertEqual(EventLog.objects.filter(creator=self.user1).count(), 1)
+        self.assertEqual(EventLog.objects.filter(creator=self.user2).count(), 1)
+        self.assertEqual(self.get_stats(), before)
+
+        # Rebuilding the rollups keeps the compacted buckets
+        call_command("rebuild_event_rollups", stdout=io.StringIO())
+        self.assertEqual(self.get_stats(), before)
+
+        policy = RetentionPolicy.objects.get(user=self.user1)
+        self.assertEqual(policy.compacted_before.date(), (timezone.now() - timedelta(days=30)).date())
+
+        # Running again is a no-op
+        self.assertIn("Removed 0 event logs.", self.compact())
+
+    def test_compaction_folds_drifted_rollups(self):
+        RetentionPolicy.objects.create(user=self.user1, raw_retention_days=30)
+        EventRollup.objects.filter(creator=self.user1).delete()
+        self.compact()
+        response = self.client.get("/api/stats/event_frequency")
+        self.assertEqual(response.data, [{"event_name": "event1", "total": 3}])
+
+    @override_settings(EVENTMANAGER_RAW_RETENTION_DAYS=90)
+    def test_default_retention_and_dry_run(self):
+        output = self.compact("--dry-run")
+        self.assertIn(f"User {self.user1.id}: 2 event logs", output)
+        self.assertEqual(EventLog.objects.count(), 5)
+
+        self.compact("--user", str(self.user1.id))
+        self.assertEqual(EventLog.objects.filter(creator=self.user1).count(), 2)
+        self.assertEqual(EventLog.objects.filter(creator=self.user2).count(), 1)
+
+    def test_retention_endpoint(self):
+        response = self.client.get("/api/retention")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            {"raw_retention_days": None, "default_retention_days": None, "compacted_before": None},
+        )
+
+        response = self.client.put("/api/retention", {"raw_retention_days": 30}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RetentionPolicy.objects.get(user=self.user1).raw_retention_days, 30)
+
+        response = self.client.put("/api/retention", {"raw_retention_days": 0}, format="json")
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,75 @@
+from django.test import override_settings
+from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_201_CREATED
+
+from .BaseTest import BaseTestCase
+from ..models import Event, EventLog
+
+
+class EventLogBatchTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event1 = Event.objects.create(name="click", user=self.user1)
+        self.event2 = Event.objects.create(name="purchase", user=self.user1)
+        # Event with the same name that belongs to another user
+        Event.objects.create(name="signup", user=self.user2)
+
+    def test_create_batch(self):
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        records = [
+            {"event_name": "click", "data": {"button": "buy"}},
+            {"event_name": "purchase", "data": {"amount": 50}, "timestamp": "2023-01-01T10:00:00Z"},
+            {"event_name": "click", "data": {}},
+        ]
+        response = self.client.post("/api/eventlogs/batch", records, format="json")
+
+        self.assertEqual(response.status_code, HTTP_201_CREATED, response.content)
+        self.assertEqual(response.data["accepted"], 3)
+        self.assertEqual(response.data["rejected"], 0)
+        self.assertEqual(3, EventLog.objects.filter(creator=self.user1).count())
+        purchase = EventLog.objects.get(event=self.event2)
+        self.assertEqual(purchase.timestamp.isoformat(), "2023-01-01T10:00:00+00:00")
+
+    def test_create_batch_with_rejected_records(self):
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        records = [
+            {"event_name": "click", "data": {}},
+            {"event_name": "signup", "data": {}},
+            {"event_name": "click"},
+        ]
+        response = self.client.post("/api/eventlogs/batch", records, format="json")
+
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(response.data["accepted"], 1)
+        self.assertEqual(response.data["rejected"], 2)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["accepted", "rejected", "rejected"],
+        )
+        self.assertIn("event_name", response.data["results"][1]["errors"])
+        self.assertIn("data", response.data["results"][2]["errors"])
+        self.assertEqual(1, EventLog.objects.count())
+
+    def test_create_batch_invalid_payload(self):
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response = self.client.post(
+            "/api/eventlogs/batch", {"event_name": "click", "data": {}}, format="json"
+        )
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(0, EventLog.objects.count())
+
+    @override_settings(EVENTMANAGER_BATCH_MAX_SIZE=2)
+    def test_create_batch_too_large(self):
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        records = [{"event_name": "click", "data": {}}] * 3
+        response = self.client.post("/api/eventlogs/batch", records, format="json")
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertIn("2", response.data["error"])
+        self.assertEqual(0, EventLog.objects.count())
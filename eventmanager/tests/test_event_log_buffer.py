@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.db import DataError, OperationalError
+from django.test import override_settings
+from rest_framework.status import HTTP_202_ACCEPTED, HTTP_503_SERVICE_UNAVAILABLE
+
+from .BaseTest import BaseTestCase
+from ..buffer import BufferFull, EventLogBuffer
+from ..ingest import save_event_logs
+from ..models import Event, EventLog, EventRollup
+
+
+@override_settings(EVENTMANAGER_INGEST_MODE="buffered")
+class EventLogBufferTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(name="click", user=self.user1)
+        self.buffer = EventLogBuffer(max_size=3, flush_size=2, autostart=False)
+        patcher = mock.patch("eventmanager.views.get_buffer", return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+    def test_buffered_ingestion(self):
+        response = self.client.post(
+            "/api/eventlogs/", {"event_name": "click", "data": {"key": "value"}}, format="json"
+        )
+        self.assertEqual(response.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["data"], {"key": "value"})
+
+        response = self.client.post(
+            "/api/eventlogs/batch", [{"event_name": "click", "data": {}}], format="json"
+        )
+        self.assertEqual(response.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["accepted"], 1)
+
+        # Nothing is written until the buffer is flushed
+        self.assertEqual(len(self.buffer), 2)
+        self.assertEqual(0, EventLog.objects.count())
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(2, EventLog.objects.filter(event=self.event).count())
+        self.assertEqual(2, EventRollup.objects.get(period=EventRollup.DAY).count)
+
+    def test_backpressure(self):
+        records = [{"event_name": "click", "data": {}}] * 3
+        response = self.client.post("/api/eventlogs/batch", records, format="json")
+        self.assertEqual(response.status_code, HTTP_202_ACCEPTED)
+
+        response = self.client.post(
+            "/api/eventlogs/", {"event_name": "click", "data": {}}, format="json"
+        )
+        self.assertEqual(response.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(len(self.buffer), 3)
+
+    def test_put_is_all_or_nothing(self):
+        logs = [EventLog(creator=self.user1, event=self.event, event_name="click", data={})] * 4
+        with self.assertRaises(BufferFull):
+            self.buffer.put(logs)
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_rejected_logs_are_dropped(self):
+        def save(logs):
+            # The database rejects the data of one log, for example a \u0000 in a jsonb column
+            if any(log.data.get("bad") for log in logs):
+                raise DataError("unsupported Unicode escape sequence")
+            return save_event_logs(logs)
+
+        buffer = EventLogBuffer(max_size=10, flush_size=10, flush_interval=0, autostart=False)
+        buffer.put(
+            [EventLog(creator=self.user1, event=self.event, data={"n": n}) for n in range(4)]
+        )
+        buffer.put([EventLog(creator=self.user1, event=self.event, data={"bad": True})])
+        with mock.patch("eventmanager.buffer.save_event_logs", side_effect=save):
+            with self.assertLogs("eventmanager.buffer", "ERROR"):
+                self.assertEqual(buffer.flush(), 5)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(4, EventLog.objects.filter(event=self.event).count())
+
+    def test_retries_are_limited(self):
+        buffer = EventLogBuffer(flush_interval=0, max_retries=2, autostart=False)
+        buffer.put([EventLog(creator=self.user1, event=self.event, data={})])
+        save = mock.Mock(side_effect=OperationalError("server closed the connection"))
+        with mock.patch("eventmanager.buffer.save_event_logs", save):
+            with self.assertLogs("eventmanager.buffer", "ERROR"):
+                self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(save.call_count, 3)
+        self.assertEqual(0, EventLog.objects.count())
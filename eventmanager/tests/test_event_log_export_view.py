@@ -0,0 +1,93 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+
+from .BaseTest import BaseTestCase
+from ..ingest import save_event_logs
+from ..models import Event, EventLog
+
+
+class EventLogExportTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.click = Event.objects.create(name="click", user=self.user1)
+        self.purchase = Event.objects.create(name="purchase", user=self.user1)
+        other = Event.objects.create(name="click", user=self.user2)
+        start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        logs = [
+            EventLog(
+                creator=self.user1,
+                event=self.click if i % 2 else self.purchase,
+                event_name="click" if i % 2 else "purchase",
+                timestamp=start + timedelta(hours=i),
+                data={"i": i},
+            )
+            for i in range(10)
+        ]
+        logs.append(
+            EventLog(creator=self.user2, event=other, event_name="click", timestamp=start, data={})
+        )
+        save_event_logs(logs)
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+    def export(self, **params):
+        response = self.client.get("/api/eventlogs/export", params)
+        body = b"".join(response.streaming_content).decode() if response.streaming else None
+        return response, body
+
+    def test_export_ndjson(self):
+        response, body = self.export()
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["data"]["i"] for row in rows], list(range(10)))
+        self.assertEqual(rows[0]["timestamp"], "2023-01-01T00:00:00+00:00")
+        self.assertNotIn("X-Next-Cursor", response)
+
+    def test_export_csv_with_filters(self):
+        response, body = self.export(
+            output_format="csv", event_name="click", start="2023-01-01T02:00:00", end="2023-01-01T08:00"
+        )
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([json.loads(row["data"])["i"] for row in rows], [3, 5, 7])
+        self.assertEqual({row["event_name"] for row in rows}, {"click"})
+
+    def test_cursor_pagination(self):
+        exported = []
+        params = {"limit": 4}
+        while True:
+            response, body = self.export(**params)
+            exported.extend(json.loads(line)["data"]["i"] for line in body.splitlines())
+            if "X-Next-Cursor" not in response:
+                break
+            params["cursor"] = response["X-Next-Cursor"]
+        self.assertEqual(exported, list(range(10)))
+
+    def test_logs_written_during_an_export(self):
+        response = self.client.get("/api/eventlogs/export", {"limit": 4})
+        cursor = response["X-Next-Cursor"]
+        # Stored after the page was planned, but before its rows are read
+        EventLog.objects.create(
+            creator=self.user1,
+            event=self.click,
+            event_name="click",
+            timestamp=datetime(2022, 12, 31, tzinfo=timezone.utc),
+            data={"i": -1},
+        )
+        body = b"".join(response.streaming_content).decode()
+        exported = [json.loads(line)["data"]["i"] for line in body.splitlines()]
+        self.assertEqual(exported, [-1, 0, 1, 2, 3])
+
+        response, body = self.export(limit=4, cursor=cursor)
+        self.assertEqual([json.loads(line)["data"]["i"] for line in body.splitlines()], [4, 5, 6, 7])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.export(output_format="xml")[0].status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.export(cursor="nonsense")[0].status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.export(start="yesterday")[0].status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.export(limit=0)[0].status_code, HTTP_400_BAD_REQUEST)
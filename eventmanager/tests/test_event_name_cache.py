@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+
+from .BaseTest import BaseTestCase
+from ..caching import MISSING, EventNameCache, TTLCache, event_names
+from ..models import Event, EventLog
+
+
+class EventNameCacheTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(name="click", user=self.user1)
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+    def post_log(self, event_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/eventlogs/", {"event_name": event_name, "data": {}}, format="json"
+            )
+        event_queries = [q for q in queries if 'FROM "eventmanager_event"' in q["sql"]]
+        return response, len(event_queries)
+
+    def test_lookup_is_cached(self):
+        response, lookups = self.post_log("click")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(lookups, 1)
+
+        response, lookups = self.post_log("click")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(lookups, 0)
+        self.assertEqual(2, EventLog.objects.filter(event=self.event).count())
+
+    def test_lookup_is_scoped_to_user(self):
+        Event.objects.create(name="signup", user=self.user2)
+        self.assertIsNone(event_names.resolve(self.user1.id, "signup"))
+
+    def test_invalidated_on_create_rename_and_delete(self):
+        self.assertIsNone(event_names.resolve(self.user1.id, "signup"))
+        signup = Event.objects.create(name="signup", user=self.user1)
+        self.assertEqual(event_names.resolve(self.user1.id, "signup"), signup.id)
+
+        response = self.client.patch(f"/api/events/{signup.id}", {"name": "register"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(event_names.resolve(self.user1.id, "signup"))
+        self.assertEqual(event_names.resolve(self.user1.id, "register"), signup.id)
+
+        response = self.client.delete(f"/api/events/{signup.id}")
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(event_names.resolve(self.user1.id, "register"))
+
+    def test_unknown_names_are_not_cached_in_memory(self):
+        self.assertIsNone(event_names.resolve(self.user1.id, "signup"))
+        # Created through another process, whose signals do not reach this one
+        (signup,) = Event.objects.bulk_create([Event(name="signup", user=self.user1)])
+        self.assertEqual(event_names.resolve(self.user1.id, "signup"), signup.id)
+
+    def test_unknown_names_expire_quickly_in_the_shared_cache(self):
+        cache = EventNameCache(cache_alias="default", ttl=60, miss_ttl=5)
+        cache.shared.clear()
+        self.assertIsNone(cache.resolve(self.user1.id, "signup"))
+        self.assertEqual(cache.resolve(self.user1.id, "click"), self.event.id)
+        self.assertIs(cache.local.get(("default", self.user1.id, "signup")), MISSING)
+        with mock.patch.object(cache.shared, "set_many") as set_many:
+            cache.resolve_many(self.user1.id, ["signup", "click"])
+        # The event id is found in memory, the miss in the shared cache
+        self.assertEqual(set_many.call_count, 0)
+        with mock.patch.object(cache.shared, "set_many") as set_many:
+            cache.resolve_many(self.user1.id, ["purchase"])
+        set_many.assert_called_with({cache.shared_key(self.user1.id, "purchase"): 0}, 5)
+
+
+class TTLCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b", None))
+
+    def test_entries_expire(self):
+        cache = TTLCache(ttl=-1)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a", None))
@@ -0,0 +1,99 @@
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from .BaseTest import BaseTestCase
+from .. import rollups
+from ..ingest import save_event_logs
+from ..models import Event, EventLog, EventRollup
+
+
+class EventRollupTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event1 = Event.objects.create(user=self.user1, name="event1")
+        self.event2 = Event.objects.create(user=self.user1, name="event2")
+
+    def log(self, event, timestamp):
+        return EventLog(
+            creator=self.user1, event=event, event_name=event.name, timestamp=timestamp, data={}
+        )
+
+    def rollups(self, period):
+        return set(
+            EventRollup.objects.filter(period=period).values_list("event_name", "bucket", "count")
+        )
+
+    def test_rollups_follow_ingestion(self):
+        morning = datetime(2023, 1, 1, 9, 15, tzinfo=timezone.utc)
+        evening = datetime(2023, 1, 1, 18, 30, tzinfo=timezone.utc)
+
+        # Single save goes through the post_save signal, bulk saves through save_event_logs
+        self.log(self.event1, morning).save()
+        save_event_logs([self.log(self.event1, morning), self.log(self.event2, evening)])
+
+        self.assertEqual(
+            self.rollups(EventRollup.DAY),
+            {
+                ("event1", datetime(2023, 1, 1, tzinfo=timezone.utc), 2),
+                ("event2", datetime(2023, 1, 1, tzinfo=timezone.utc), 1),
+            },
+        )
+        self.assertEqual(
+            self.rollups(EventRollup.HOUR),
+            {
+                ("event1", datetime(2023, 1, 1, 9, tzinfo=timezone.utc), 2),
+                ("event2", datetime(2023, 1, 1, 18, tzinfo=timezone.utc), 1),
+            },
+        )
+
+    def test_rows_are_written_in_key_order(self):
+        evening = datetime(2023, 1, 1, 18, 30, tzinfo=timezone.utc)
+        morning = datetime(2023, 1, 1, 9, 15, tzinfo=timezone.utc)
+        counts = rollups.count_event_logs(
+            [self.log(self.event2, evening), self.log(self.event1, morning)]
+        )
+        with mock.patch("eventmanager.rollups._upsert_counts") as upsert:
+            rollups.apply_counts(counts)
+        keys = [key for key, _ in upsert.call_args.args[0]]
+        self.assertEqual(keys, sorted(counts))
+
+        with mock.patch("eventmanager.rollups._increment_count") as increment, mock.patch(
+            "eventmanager.rollups.UPSERT_VENDORS", ()
+        ):
+            rollups.apply_counts(counts)
+        self.assertEqual([call.args[0] for call in increment.call_args_list], sorted(counts))
+
+    def test_rebuild_rollups(self):
+        save_event_logs(
+            [
+                self.log(self.event1, datetime(2023, 1, 1, 9, tzinfo=timezone.utc)),
+                self.log(self.event1, datetime(2023, 1, 2, 9, tzinfo=timezone.utc)),
+            ]
+        )
+        expected = self.rollups(EventRollup.DAY), self.rollups(EventRollup.HOUR)
+        EventRollup.objects.update(count=100)
+
+        call_command("rebuild_event_rollups", stdout=StringIO())
+        self.assertEqual((self.rollups(EventRollup.DAY), self.rollups(EventRollup.HOUR)), expected)
+
+    def test_event_trend(self):
+        save_event_logs(
+            [
+                self.log(self.event1, datetime(2023, 1, 1, 9, tzinfo=timezone.utc)),
+                self.log(self.event2, datetime(2023, 1, 1, 10, tzinfo=timezone.utc)),
+                self.log(self.event1, datetime(2023, 1, 2, 9, tzinfo=timezone.utc)),
+                self.log(self.event1, datetime(2023, 1, 2, 23, tzinfo=timezone.utc)),
+            ]
+        )
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response = self.client.get("/api/stats/event_trend")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            {"2023-01-01": {"event1": 1, "event2": 1}, "2023-01-02": {"event1": 2}},
+        )
@@ -0,0 +1,120 @@
+from .BaseTest import BaseTestCase
+from ..models import Event
+
+
+class EventTrendTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        Event.objects.create(user=self.user1, name="event1")
+        Event.objects.create(user=self.user1, name="event2")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        records = [
+            {"event_name": name, "data": {}, "timestamp": timestamp}
+            for name, timestamp in [
+                ("event1", "2023-01-01T10:15:00Z"),
+                ("event1", "2023-01-01T10:45:00Z"),
+                ("event2", "2023-01-01T12:00:00Z"),
+                ("event1", "2023-01-03T23:30:00Z"),
+            ]
+        ]
+        self.client.post("/api/eventlogs/batch", records, format="json")
+
+    def get_trend(self, **params):
+        response = self.client.get("/api/stats/event_trend", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_default_is_daily_in_utc(self):
+        self.assertEqual(
+            self.get_trend(),
+            {"2023-01-01": {"event1": 2, "event2": 1}, "2023-01-03": {"event1": 1}},
+        )
+
+    def test_granularity(self):
+        self.assertEqual(
+            self.get_trend(granularity="hour", event_name="event1"),
+            {"2023-01-01T10:00:00+00:00": {"event1": 2}, "2023-01-03T23:00:00+00:00": {"event1": 1}},
+        )
+        self.assertEqual(
+            self.get_trend(granularity="minute", end="2023-01-01T11:00:00Z"),
+            {"2023-01-01T10:15:00+00:00": {"event1": 1}, "2023-01-01T10:45:00+00:00": {"event1": 1}},
+        )
+        self.assertEqual(
+            self.get_trend(granularity="week"),
+            {"2022-12-26": {"event1": 2, "event2": 1}, "2023-01-02": {"event1": 1}},
+        )
+        self.assertEqual(
+            self.get_trend(granularity="month"), {"2023-01-01": {"event1": 3, "event2": 1}}
+        )
+
+    def test_unaligned_bounds(self):
+        # With the rollups, the bounds are rounded down to the hour or day of the buckets
+        self.assertEqual(
+            self.get_trend(start="2023-01-01T11:00:00Z", end="2023-01-03T12:00:00Z"),
+            {"2023-01-01": {"event1": 2, "event2": 1}},
+        )
+        self.assertEqual(
+            self.get_trend(
+                granularity="hour", start="2023-01-01T10:30:00Z", end="2023-01-01T13:30:00Z"
+            ),
+            {
+                "2023-01-01T10:00:00+00:00": {"event1": 2},
+                "2023-01-01T12:00:00+00:00": {"event2": 1},
+            },
+        )
+        # The raw logs are filtered exactly
+        self.assertEqual(
+            self.get_trend(granularity="minute", start="2023-01-01T10:30:00Z", end="2023-01-02"),
+            {
+                "2023-01-01T10:45:00+00:00": {"event1": 1},
+                "2023-01-01T12:00:00+00:00": {"event2": 1},
+            },
+        )
+
+    def test_time_zone(self):
+        # Read from the hourly rollups
+        self.assertEqual(
+            self.get_trend(tz="Europe/Paris", event_name="event1"),
+            {"2023-01-01": {"event1": 2}, "2023-01-04": {"event1": 1}},
+        )
+        # Offsets that are not whole hours are read from the raw logs
+        self.assertEqual(
+            self.get_trend(tz="Asia/Kolkata", granularity="hour", event_name="event1"),
+            {
+                "2023-01-01T15:00:00+05:30": {"event1": 1},
+                "2023-01-01T16:00:00+05:30": {"event1": 1},
+                "2023-01-04T05:00:00+05:30": {"event1": 1},
+            },
+        )
+
+    def test_columnar_layout(self):
+        self.assertEqual(
+            self.get_trend(layout="columnar"),
+            {
+                "granularity": "day",
+                "tz": "UTC",
+                "buckets": ["2023-01-01", "2023-01-02", "2023-01-03"],
+                "series": {"event1": [2, 0, 1], "event2": [1, 0, 0]},
+            },
+        )
+        self.assertEqual(
+            self.get_trend(layout="columnar", event_name="unknown"),
+            {"granularity": "day", "tz": "UTC", "buckets": [], "series": {}},
+        )
+
+    def test_too_many_buckets(self):
+        self.client.post(
+            "/api/eventlogs/batch",
+            [{"event_name": "event1", "data": {}, "timestamp": "2023-02-01T00:00:00Z"}],
+            format="json",
+        )
+        response = self.client.get(
+            "/api/stats/event_trend", {"layout": "columnar", "granularity": "minute"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_parameters(self):
+        invalid = [{"granularity": "year"}, {"tz": "Mars/Base"}, {"layout": "flat"}, {"start": "soon"}]
+        for params in invalid:
+            response = self.client.get("/api/stats/event_trend", params)
+            self.assertEqual(response.status_code, 400, params)
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+
+from django.test import SimpleTestCase
+
+from .BaseTest import BaseTestCase
+from ..funnels import Funnel
+from ..models import Event
+
+
+def at(minute):
+    return datetime(2023, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=minute)
+
+
+class FunnelEngineTest(SimpleTestCase):
+    def setUp(self):
+        self.funnel = Funnel(["view", "cart", "buy"], timedelta(minutes=30))
+
+    def test_counts_each_step(self):
+        rows = [
+            ("alice", "view", at(0)), ("alice", "cart", at(1)), ("alice", "buy", at(2)),
+            ("bob", "view", at(0)), ("bob", "cart", at(5)),
+            ("carol", "view", at(0)),
+            ("dave", "cart", at(0)), ("dave", "buy", at(1)),
+        ]
+        self.assertEqual(self.funnel.evaluate(rows), [3, 2, 1])
+
+    def test_steps_must_be_in_order(self):
+        rows = [("alice", "cart", at(0)), ("alice", "view", at(1)), ("alice", "buy", at(2))]
+        self.assertEqual(self.funnel.evaluate(rows), [1, 0, 0])
+
+    def test_window(self):
+        rows = [("alice", "view", at(0)), ("alice", "cart", at(20)), ("alice", "buy", at(40))]
+        self.assertEqual(self.funnel.evaluate(rows), [1, 1, 0])
+
+        # A later start fits the window
+        rows = [
+            ("alice", "view", at(0)), ("alice", "view", at(15)),
+            ("alice", "cart", at(20)), ("alice", "buy", at(40)),
+        ]
+        self.assertEqual(self.funnel.evaluate(rows), [1, 1, 1])
+
+    def test_repeated_step(self):
+        funnel = Funnel(["view", "view"], timedelta(minutes=30))
+        self.assertEqual(funnel.evaluate([("alice", "view", at(0))]), [1, 0])
+        self.assertEqual(funnel.evaluate([("alice", "view", at(0)), ("alice", "view", at(1))]), [1, 1])
+
+    def test_empty(self):
+        self.assertEqual(self.funnel.evaluate([]), [0, 0, 0])
+
+
+class EventFunnelViewTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ["view", "cart", "buy"]:
+            Event.objects.create(user=self.user1, name=name)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        records = [
+            {"event_name": name, "data": data, "timestamp": timestamp}
+            for name, data, timestamp in [
+                ("view", {"user": "alice"}, "2023-01-01T10:00:00Z"),
+                ("cart", {"user": "alice"}, "2023-01-01T10:05:00Z"),
+                ("buy", {"user": "alice"}, "2023-01-01T10:10:00Z"),
+                ("view", {"user": "bob"}, "2023-01-01T10:00:00Z"),
+                ("cart", {"user": "bob"}, "2023-01-01T12:00:00Z"),
+                ("view", {"page": "home"}, "2023-01-01T10:00:00Z"),
+            ]
+        ]
+        self.client.post("/api/eventlogs/batch", records, format="json")
+
+    def test_funnel(self):
+        response = self.client.get(
+            "/api/stats/funnel", {"steps": "view,cart,buy", "key": "user", "window": 3600}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(step["event_name"], step["count"]) for step in response.data["steps"]],
+            [("view", 2), ("cart", 1), ("buy", 1)],
+        )
+        self.assertEqual(response.data["steps"][1]["conversion"], 0.5)
+
+        # The default window is one day
+        response = self.client.get("/api/stats/funnel", {"steps": "view,cart", "key": "user"})
+        self.assertEqual([step["count"] for step in response.data["steps"]], [2, 2])
+
+        response = self.client.get(
+            "/api/stats/funnel", {"steps": "view,cart", "key": "user", "start": "2023-01-02"}
+        )
+        self.assertEqual([step["count"] for step in response.data["steps"]], [0, 0])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get("/api/stats/funnel", {"key": "user"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/stats/funnel", {"steps": "view"}).status_code, 400)
+        response = self.client.get("/api/stats/funnel", {"steps": "view", "key": "user", "window": "0"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,34 @@
+from django.test import SimpleTestCase
+
+from ..hll import HyperLogLog
+
+
+class HyperLogLogTest(SimpleTestCase):
+    def test_small_counts_are_exact(self):
+        sketch = HyperLogLog()
+        for value in ["a", "b", "c", "a", 1, "1"]:
+            sketch.add(value)
+        self.assertEqual(sketch.count(), 5)
+        self.assertEqual(HyperLogLog().count(), 0)
+
+    def test_estimate_within_error_rate(self):
+        sketch = HyperLogLog()
+        for value in range(50000):
+            sketch.add(f"user-{value}")
+        # Four standard errors
+        self.assertAlmostEqual(sketch.count(), 50000, delta=50000 * 4 * sketch.error_rate)
+
+    def test_merge_counts_union(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for value in range(3000):
+            first.add(value)
+        for value in range(2000, 6000):
+            second.add(value)
+        merged = HyperLogLog.from_bytes(first.to_bytes()).merge(second)
+        self.assertAlmostEqual(merged.count(), 6000, delta=6000 * 4 * merged.error_rate)
+
+    def test_sizes_must_match(self):
+        with self.assertRaises(ValueError):
+            HyperLogLog().merge(HyperLogLog(precision=10))
+        with self.assertRaises(ValueError):
+            HyperLogLog(registers=b"\x00" * 10)
@@ -0,0 +1,158 @@
+import json
+from unittest import mock
+
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST
+
+from .BaseTest import BaseTestCase
+from .. import ingest
+from ..ingest import recent_client_ids, save_event_logs
+from ..models import Event, EventLog
+
+
+class IdempotentIngestionTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(name="click", user=self.user1)
+        Event.objects.create(name="click", user=self.user2)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+    def post(self, client_id):
+        return self.client.post(
+            "/api/eventlogs/",
+            {"event_name": "click", "data": {}, "client_id": client_id},
+            format="json",
+        )
+
+    def test_retry_is_stored_once(self):
+        self.assertEqual(self.post("a1").status_code, HTTP_201_CREATED)
+        self.assertEqual(self.post("a1").status_code, HTTP_200_OK)
+        recent_client_ids.clear()
+        self.assertEqual(self.post("a1").status_code, HTTP_200_OK)
+
+        self.assertEqual(EventLog.objects.filter(creator=self.user1).count(), 1)
+        response = self.client.get("/api/stats/event_frequency")
+        self.assertEqual(response.data, [{"event_name": "click", "total": 1}])
+
+    def test_logs_without_client_id_are_not_deduplicated(self):
+        for _ in range(2):
+            response = self.client.post(
+                "/api/eventlogs/", {"event_name": "click", "data": {}}, format="json"
+            )
+            self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(EventLog.objects.filter(creator=self.user1).count(), 2)
+
+    def test_batch_duplicates(self):
+        self.post("a1")
+        records = [
+            {"event_name": "click", "data": {}, "client_id": "a1"},
+            {"event_name": "click", "data": {}, "client_id": "a2"},
+            {"event_name": "click", "data": {}, "client_id": "a2"},
+            {"event_name": "click", "data": {}},
+            {"event_name": "click", "data": {}, "client_id": "x" * 65},
+        ]
+        response = self.client.post("/api/eventlogs/batch", records, format="json")
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(
+            (response.data["accepted"], response.data["rejected"], response.data["duplicates"]),
+            (2, 1, 2),
+        )
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["duplicate", "accepted", "duplicate", "accepted", "rejected"],
+        )
+        self.assertEqual(EventLog.objects.filter(creator=self.user1).count(), 3)
+
+        # A retry of the whole batch
+        response = self.client.post("/api/eventlogs/batch", records[:3], format="json")
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data["duplicates"], 3)
+
+    def test_client_ids_are_per_user(self):
+        self.post("a1")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token2.key)
+        self.assertEqual(self.post("a1").status_code, HTTP_201_CREATED)
+        self.assertEqual(EventLog.objects.filter(client_id="a1").count(), 2)
+
+    def test_invalid_client_id(self):
+        self.assertEqual(self.post("x" * 65).status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post("").status_code, HTTP_400_BAD_REQUEST)
+
+    def test_recent_client_ids_skip_the_query(self):
+        # The client ids are remembered once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post("a1")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                save_event_logs(
+                    [EventLog(creator=self.user1, event=self.event, data={}, client_id="a1")]
+                ),
+                [],
+            )
+        self.assertEqual(len(queries), 0)
+
+    def test_first_ingestion_is_not_looked_up(self):
+        logs = [EventLog(creator=self.user1, event=self.event, data={}, client_id="a1")]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(save_event_logs(logs), logs)
+        lookups = [q for q in queries if q["sql"].startswith("SELECT") and "client_id" in q["sql"]]
+        self.assertEqual(lookups, [])
+
+    def test_duplicates_are_looked_up_before_the_insert_into_a_partitioned_table(self):
+        EventLog.objects.create(creator=self.user1, event=self.event, data={}, client_id="a1")
+        logs = [EventLog(creator=self.user1, event=self.event, data={}, client_id="a1")]
+        with mock.patch("eventmanager.ingest.lookup_before_insert", return_value=True):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(save_event_logs(logs), [])
+        self.assertEqual([q for q in queries if q["sql"].startswith("INSERT")], [])
+
+    def test_stored_duplicate(self):
+        # Stored by another process, so it is not in recent_client_ids
+        EventLog.objects.create(creator=self.user1, event=self.event, data={}, client_id="a1")
+        logs = [
+            EventLog(creator=self.user1, event=self.event, data={}, client_id="a1"),
+            EventLog(creator=self.user1, event=self.event, data={}, client_id="a2"),
+        ]
+        stored = save_event_logs(logs)
+        self.assertEqual([log.client_id for log in stored], ["a2"])
+        self.assertEqual(EventLog.objects.filter(creator=self.user1).count(), 2)
+
+    def test_repeated_concurrent_duplicates(self):
+        EventLog.objects.create(creator=self.user1, event=self.event, data={}, client_id="a1")
+        drop_duplicates = ingest.drop_duplicates
+        calls = []
+
+        def race(logs, lookup=True):
+            kept = drop_duplicates(logs, lookup)
+            if lookup and not calls:
+                calls.append(logs)
+                # Yet another request stores a2 before the insert is retried
+                EventLog.objects.create(
+                    creator=self.user1, event=self.event, data={}, client_id="a2"
+                )
+            return kept
+
+        logs = [
+            EventLog(creator=self.user1, event=self.event, data={}, client_id=client_id)
+            for client_id in ["a1", "a2", "a3"]
+        ]
+        with mock.patch("eventmanager.ingest.drop_duplicates", side_effect=race):
+            stored = save_event_logs(logs)
+        self.assertEqual([log.client_id for log in stored], ["a3"])
+        self.assertEqual(EventLog.objects.filter(creator=self.user1).count(), 3)
+
+    async def test_async_retry(self):
+        headers = {"Authorization": "Token " + self.token1.key}
+        statuses = []
+        for _ in range(2):
+            response = await AsyncClient().post(
+                "/api/async/eventlogs/batch",
+                [{"event_name": "click", "data": {}, "client_id": "a1"}],
+                content_type="application/json",
+                headers=headers,
+            )
+            statuses.append((response.status_code, json.loads(response.content)["duplicates"]))
+        self.assertEqual(statuses, [(HTTP_201_CREATED, 0), (HTTP_200_OK, 1)])
+        self.assertEqual(await EventLog.objects.filter(creator=self.user1).acount(), 1)
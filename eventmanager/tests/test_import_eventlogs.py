@@ -0,0 +1,76 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+
+from .BaseTest import BaseTestCase
+from ..models import Event, EventLog, EventRollup
+
+
+class ImportEventLogsTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(name="click", user=self.user1)
+        # Same name, but owned by another user
+        Event.objects.create(name="purchase", user=self.user2)
+
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, "w") as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_ndjson(self):
+        path = self.write_file(
+            ".ndjson",
+            '{"event_name": "click", "data": {"page": 1}, "timestamp": "2022-03-01T10:00:00Z"}\n'
+            '{"event_name": "click", "data": {}, "timestamp": "2022-03-01T11:00:00"}\n'
+            '{"event_name": "purchase", "data": {}}\n'
+            "not json\n",
+        )
+        stderr = StringIO()
+        call_command(
+            "import_eventlogs", path, user="test1", chunk_size=1, stdout=StringIO(), stderr=stderr
+        )
+
+        self.assertEqual(2, EventLog.objects.filter(creator=self.user1, event=self.event).count())
+        self.assertEqual(
+            {"page": 1}, EventLog.objects.get(timestamp__hour=10).data
+        )
+        self.assertEqual(2, EventRollup.objects.get(period=EventRollup.DAY).count)
+        self.assertIn("unknown event 'purchase'", stderr.getvalue())
+        self.assertIn("not a JSON object", stderr.getvalue())
+
+    def test_import_invalid_timestamps(self):
+        path = self.write_file(
+            ".ndjson",
+            '{"event_name": "click", "data": {}, "timestamp": 1646128800}\n'
+            '{"event_name": "click", "data": {}, "timestamp": ["2022-03-01"]}\n'
+            '{"event_name": "click", "data": {}, "timestamp": "yesterday"}\n'
+            '{"event_name": "click", "data": {}, "timestamp": "2022-03-01T10:00:00Z"}\n',
+        )
+        stderr = StringIO()
+        call_command("import_eventlogs", path, user="test1", stdout=StringIO(), stderr=stderr)
+
+        self.assertEqual(1, EventLog.objects.count())
+        self.assertIn("invalid timestamp 1646128800", stderr.getvalue())
+        self.assertIn("invalid timestamp ['2022-03-01']", stderr.getvalue())
+        self.assertIn("invalid timestamp 'yesterday'", stderr.getvalue())
+
+    def test_import_csv(self):
+        path = self.write_file(
+            ".csv",
+            "event_name,data,timestamp\n"
+            'click,"{""page"": 2}",2022-03-01T10:00:00Z\n'
+            "click,{},\n",
+        )
+        call_command("import_eventlogs", path, user="test1", stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(2, EventLog.objects.count())
+        self.assertTrue(EventLog.objects.filter(data={"page": 2}).exists())
+
+    def test_import_unknown_user(self):
+        with self.assertRaises(CommandError):
+            call_command("import_eventlogs", "-", user="nobody")
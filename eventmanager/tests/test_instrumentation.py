@@ -0,0 +1,151 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.db import connection
+from django.test import AsyncClient, override_settings
+
+from .BaseTest import BaseTestCase
+from ..metrics import REGISTRY, Histogram, render
+from ..middleware import (
+    InstrumentationMiddleware,
+    RequestStats,
+    current_stats,
+    render_duration,
+    request_duration,
+    request_queries,
+)
+from ..models import Event
+
+VIEW = "api/stats/event_frequency"
+
+
+class HistogramTest(BaseTestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram("test_histogram", "A test histogram.", ["view"], buckets=(1, 5))
+        self.addCleanup(REGISTRY.remove, histogram)
+        for value in (0.5, 2, 10):
+            histogram.observe(value, view="a")
+        output = render()
+        self.assertIn('test_histogram_bucket{view="a",le="1"} 1\n', output)
+        self.assertIn('test_histogram_bucket{view="a",le="5"} 2\n', output)
+        self.assertIn('test_histogram_bucket{view="a",le="+Inf"} 3\n', output)
+        self.assertIn('test_histogram_sum{view="a"} 12.5\n', output)
+        self.assertIn('test_histogram_count{view="a"} 3\n', output)
+
+
+class InstrumentationMiddlewareTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        Event.objects.create(user=self.user1, name="event1")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+    def test_disabled_by_default(self):
+        count = request_duration.count(view=VIEW, method="GET")
+        self.client.get("/api/stats/event_frequency")
+        self.assertEqual(request_duration.count(view=VIEW, method="GET"), count)
+
+    @override_settings(EVENTMANAGER_INSTRUMENTATION=True, EVENTMANAGER_METRICS_TOKEN="secret")
+    def test_records_histograms(self):
+        count = request_duration.count(view=VIEW, method="GET")
+        rendered = render_duration.count(view=VIEW)
+        queries = request_queries.sum(view=VIEW)
+        self.client.get("/api/stats/event_frequency")
+        self.assertEqual(request_duration.count(view=VIEW, method="GET"), count + 1)
+        self.assertEqual(render_duration.count(view=VIEW), rendered + 1)
+        # At least the token lookup and the stats query
+        self.assertGreaterEqual(request_queries.sum(view=VIEW) - queries, 2)
+
+        self.client.credentials()
+        output = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").content.decode()
+        self.assertIn(
+            'eventmanager_request_duration_seconds_count{view="api/stats/event_frequency",method="GET"}',
+            output,
+        )
+        self.assertIn(
+            'eventmanager_request_db_queries_bucket{view="api/stats/event_frequency",le="+Inf"}',
+            output,
+        )
+
+    def test_profiles_slow_requests(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(
+            EVENTMANAGER_INSTRUMENTATION=True,
+            EVENTMANAGER_PROFILE_DIR=directory,
+            EVENTMANAGER_PROFILE_SAMPLE_RATE=1,
+            EVENTMANAGER_PROFILE_MIN_DURATION=0,
+        ):
+            self.client.get("/api/stats/event_frequency")
+        profiles = list(Path(directory).glob("*-GET-api_stats_event_frequency-*ms.prof"))
+        self.assertEqual(len(profiles), 1)
+        sql = profiles[0].with_suffix(".sql").read_text()
+        self.assertIn("-- GET /api/stats/event_frequency:", sql)
+        self.assertIn("SELECT", sql)
+
+    @override_settings(
+        EVENTMANAGER_INSTRUMENTATION=True, EVENTMANAGER_PROFILE_DIR="/nonexistent/profiles"
+    )
+    def test_fast_requests_are_not_dumped(self):
+        with override_settings(
+            EVENTMANAGER_PROFILE_SAMPLE_RATE=1, EVENTMANAGER_PROFILE_MIN_DURATION=60
+        ):
+            response = self.client.get("/api/stats/event_frequency")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Path("/nonexistent/profiles").exists())
+
+    @override_settings(EVENTMANAGER_INSTRUMENTATION=True)
+    async def test_async_requests(self):
+        async def get_response(request):
+            pass
+
+        self.assertTrue(iscoroutinefunction(InstrumentationMiddleware(get_response)))
+        view = "api/async/stats/event_frequency"
+        count = request_duration.count(view=view, method="GET")
+        queries = request_queries.sum(view=view)
+        response = await AsyncClient().get(
+            "/api/async/stats/event_frequency",
+            headers={"Authorization": "Token " + self.token1.key},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(request_duration.count(view=view, method="GET"), count + 1)
+        # The token lookup and the stats query run in a worker thread
+        self.assertGreaterEqual(request_queries.sum(view=view) - queries, 2)
+
+    def test_queries_of_other_threads(self):
+        def query():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        try:
+            # The thread opens a connection of its own, like the threads of an ASGI server
+            async_to_sync(sync_to_async(query, thread_sensitive=False))()
+        finally:
+            current_stats.reset(token)
+        self.assertEqual(stats.queries, 1)
+
+
+class MetricsViewTest(BaseTestCase):
+    @override_settings(EVENTMANAGER_METRICS_TOKEN="secret")
+    def test_access(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(
+            self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401
+        )
+        self.assertEqual(
+            self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200
+        )
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.user1.is_staff = True
+        self.user1.save()
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_no_token_by_default(self):
+        self.assertEqual(
+            self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer None").status_code, 401
+        )
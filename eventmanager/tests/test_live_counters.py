@@ -0,0 +1,78 @@
+import asyncio
+from collections import Counter
+
+from django.test import AsyncClient, override_settings
+
+from .BaseTest import BaseTestCase
+from ..live import RESYNC, hub, sse_message
+from ..models import Event
+
+
+@override_settings(EVENTMANAGER_LIVE_INTERVAL=0.01)
+class LiveCountersTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(user=self.user1, name="event1")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        self.client.post("/api/eventlogs/", {"event_name": "event1", "data": {}}, format="json")
+
+    async def test_increments_are_coalesced_per_user(self):
+        first = hub.subscribe(self.user1.id)
+        second = hub.subscribe(self.user1.id)
+        hub.publish(Counter({(self.user1.id, "event1"): 2, (self.user2.id, "event1"): 1}))
+        hub.publish(Counter({(self.user1.id, "event1"): 1, (self.user1.id, "event2"): 4}))
+        hub.flush()
+        message = sse_message("counts", {"event1": 3, "event2": 4})
+        self.assertEqual(first.get_nowait(), message)
+        self.assertEqual(second.get_nowait(), message)
+        self.assertTrue(first.empty())
+        hub.unsubscribe(self.user1.id, first)
+        hub.unsubscribe(self.user1.id, second)
+        self.assertNotIn(self.user1.id, hub.streams)
+
+    @override_settings(EVENTMANAGER_LIVE_QUEUE_SIZE=2)
+    async def test_slow_streams_are_resynced(self):
+        queue = hub.subscribe(self.user1.id)
+        self.addCleanup(hub.unsubscribe, self.user1.id, queue)
+        for _ in range(3):
+            hub.publish(Counter({(self.user1.id, "event1"): 1}))
+            hub.flush()
+        self.assertIs(queue.get_nowait(), RESYNC)
+        self.assertTrue(queue.empty())
+
+    def test_ingestion_publishes_after_commit(self):
+        hub.streams[self.user1.id] = set()
+        self.addCleanup(hub.streams.pop, self.user1.id)
+        self.addCleanup(hub.pending.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/eventlogs/batch",
+                [{"event_name": "event1", "data": {}}, {"event_name": "event1", "data": {}}],
+                format="json",
+            )
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(hub.pending, {})
+        self.assertEqual(hub.pending, {self.user1.id: Counter({"event1": 2})})
+
+    @override_settings(EVENTMANAGER_LIVE_MAX_DURATION=0.5)
+    async def test_stream(self):
+        response = await AsyncClient().get(
+            "/api/async/live/event_counts", headers={"Authorization": "Token " + self.token1.key}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(
+            await anext(stream), b"retry: 1000\n\n" + sse_message("snapshot", {"event1": 1})
+        )
+
+        hub.publish(Counter({(self.user1.id, "event1"): 5}))
+        message = await asyncio.wait_for(anext(stream), 1)
+        self.assertEqual(message, b'event: counts\ndata: {"event1":5}\n\n')
+        # The stream ends after EVENTMANAGER_LIVE_MAX_DURATION
+        self.assertEqual([chunk async for chunk in stream], [])
+        self.assertNotIn(self.user1.id, hub.streams)
+
+    async def test_requires_authentication(self):
+        response = await AsyncClient().get("/api/async/live/event_counts")
+        self.assertEqual(response.status_code, 401)
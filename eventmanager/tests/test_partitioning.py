@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from .. import partitioning
+
+
+class PartitioningTest(SimpleTestCase):
+    def test_month_range(self):
+        self.assertEqual(
+            partitioning.month_range(date(2023, 11, 15), date(2024, 2, 1)),
+            [date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1)],
+        )
+
+    def test_partition_name(self):
+        self.assertEqual(
+            partitioning.partition_name(date(2024, 2, 1)), "eventmanager_eventlog_y2024m02"
+        )
+
+    def test_not_partitioned_outside_postgresql(self):
+        if connection.vendor == "postgresql":
+            self.skipTest("Only relevant for other backends")
+        self.assertFalse(partitioning.is_partitioned(connection))
@@ -0,0 +1,89 @@
+import io
+
+from django.core.management import call_command
+
+from .BaseTest import BaseTestCase
+from ..models import Event, EventLog, EventRollup
+
+
+class SoftDeleteEventTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(user=self.user1, name="event1")
+        self.other = Event.objects.create(user=self.user1, name="event2")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        records = [{"event_name": "event1", "data": {"user": "alice"}}] * 5
+        records.append({"event_name": "event2", "data": {"user": "alice"}})
+        self.client.post("/api/eventlogs/batch", records, format="json")
+
+    def delete_event(self):
+        response = self.client.delete(f"/api/events/{self.event.id}")
+        self.assertEqual(response.status_code, 204)
+
+    def test_delete_is_deferred(self):
+        self.client.get("/api/stats/event_frequency")
+        # The cached stats are invalidated once the deletion commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.delete_event()
+
+        # The logs are still there, but the event is gone for the API
+        self.assertEqual(EventLog.objects.filter(event=self.event).count(), 5)
+        self.assertFalse(Event.objects.filter(id=self.event.id).exists())
+        self.assertIsNotNone(Event.all_objects.get(id=self.event.id).deleted_at)
+        self.assertEqual(self.client.get("/api/events/").data, ["event2"])
+        self.assertEqual(self.client.get(f"/api/events/{self.event.id}").status_code, 404)
+
+        # Stats ignore the deleted event
+        response = self.client.get("/api/stats/event_frequency")
+        self.assertEqual(response.data, [{"event_name": "event2", "total": 1}])
+        self.assertFalse(EventRollup.objects.filter(event=self.event).exists())
+        response = self.client.get("/api/eventlogs/export")
+        self.assertEqual(b"".join(response.streaming_content).count(b"\n"), 1)
+
+        # And so does ingestion
+        response = self.client.post(
+            "/api/eventlogs/", {"event_name": "event1", "data": {}}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleted_events_are_not_hidden_outside_the_views(self):
+        self.delete_event()
+        self.assertTrue(Event._default_manager.filter(id=self.event.id).exists())
+        # Related objects, admin and dumpdata go through the default and base managers
+        log = EventLog.objects.filter(event_id=self.event.id).first()
+        self.assertEqual(log.event.id, self.event.id)
+        output = io.StringIO()
+        call_command("dumpdata", "eventmanager.event", stdout=output)
+        self.assertIn('"name": "event1"', output.getvalue())
+
+    def test_event_name_can_be_reused(self):
+        self.delete_event()
+        response = self.client.post("/api/events/", {"name": "event1"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(
+            "/api/eventlogs/", {"event_name": "event1", "data": {}}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(
+            "/api/stats/event_frequency", {"event_name": "event1", "end_date": "2100-01-01"}
+        )
+        self.assertEqual(response.data, {"event_name": "event1", "total": 1})
+
+    def test_purge(self):
+        self.delete_event()
+        output = io.StringIO()
+        call_command(
+            "purge_deleted_events", "--batch-size", "2", "--max-batches", "2", stdout=output
+        )
+        self.assertIn("Removed 4 event logs and 0 deleted events.", output.getvalue())
+        self.assertEqual(EventLog.objects.filter(event_id=self.event.id).count(), 1)
+
+        call_command("purge_deleted_events", "--batch-size", "2", stdout=output)
+        self.assertIn("Removed 1 event logs and 1 deleted events.", output.getvalue())
+        self.assertFalse(Event.all_objects.filter(id=self.event.id).exists())
+        self.assertEqual(EventLog.objects.count(), 1)
+
+    def test_rebuild_ignores_deleted_events(self):
+        self.delete_event()
+        call_command("rebuild_event_rollups", stdout=io.StringIO())
+        self.assertFalse(EventRollup.objects.filter(event_id=self.event.id).exists())
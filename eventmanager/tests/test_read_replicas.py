@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ..authentication import token_cache
+from ..caching import event_names, stats_cache
+from ..models import Event, EventRollup
+from ..routers import (
+    ReadReplicaRouter,
+    ReplicaSelector,
+    replica_reads,
+    replica_selector,
+    stats_cache_timeout,
+)
+
+
+class ReplicaSelectorTest(SimpleTestCase):
+    def selector(self, lags):
+        selector = ReplicaSelector()
+
+        def measure_lag(alias):
+            if isinstance(lags[alias], Exception):
+                raise lags[alias]
+            return lags[alias]
+
+        selector.measure_lag = measure_lag
+        return selector
+
+    @override_settings(EVENTMANAGER_READ_REPLICAS=["replica1", "replica2"], EVENTMANAGER_REPLICA_MAX_LAG=30)
+    def test_skips_lagging_and_unreachable_replicas(self):
+        selector = self.selector({"replica1": 1.5, "replica2": 0})
+        self.assertEqual({selector.choose() for _ in range(4)}, {"replica1", "replica2"})
+
+        selector = self.selector({"replica1": 120, "replica2": DatabaseError("down")})
+        self.assertEqual(selector.choose(), "default")
+
+        selector = self.selector({"replica1": 120, "replica2": 3})
+        self.assertEqual({selector.choose() for _ in range(4)}, {"replica2"})
+
+    @override_settings(EVENTMANAGER_READ_REPLICAS=["replica1"], EVENTMANAGER_REPLICA_LAG_CHECK_INTERVAL=60)
+    def test_lag_is_measured_once_per_interval(self):
+        lags = {"replica1": 0}
+        selector = self.selector(lags)
+        self.assertEqual(selector.choose(), "replica1")
+        lags["replica1"] = 120
+        self.assertEqual(selector.choose(), "replica1")
+        selector.clear()
+        self.assertEqual(selector.choose(), "default")
+
+    @override_settings(EVENTMANAGER_READ_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(replica_selector.choose(), "default")
+
+    def test_router(self):
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Event))
+        with replica_reads("replica"):
+            self.assertEqual(router.db_for_read(Event), "replica")
+            self.assertEqual(router.db_for_write(Event), "default")
+        self.assertIsNone(router.db_for_read(Event))
+        self.assertFalse(router.allow_migrate("replica", "eventmanager"))
+        self.assertIsNone(stats_cache_timeout("default"))
+        self.assertEqual(stats_cache_timeout("replica"), 60)
+
+
+class ReadReplicaEndpointsTest(TransactionTestCase):
+    """
+    Runs the endpoints against two database aliases, "default" and its test mirror "replica",
+    with separate connections.
+    """
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        event_names.clear()
+        token_cache.clear()
+        stats_cache.clear()
+        replica_selector.clear()
+        user = get_user_model().objects.create_user(username="test1", password="test1")
+        Event.objects.create(user=user, name="event1")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects.create(user=user).key)
+
+    def test_stats_and_exports_read_from_the_replica(self):
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.post(
+                "/api/eventlogs/", {"event_name": "event1", "data": {}}, format="json"
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(replica), 0)
+
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get("/api/stats/event_frequency")
+        self.assertEqual(response.data, [{"event_name": "event1", "total": 1}])
+        self.assertIn(EventRollup._meta.db_table, replica[0]["sql"])
+
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get("/api/eventlogs/export")
+            self.assertEqual(b"".join(response.streaming_content).count(b"\n"), 1)
+        self.assertTrue(replica)
+
+    @override_settings(EVENTMANAGER_READ_REPLICAS=[])
+    def test_primary_only(self):
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get("/api/stats/event_trend")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(replica), 0)
@@ -0,0 +1,63 @@
+from django.test import SimpleTestCase
+from django.http import QueryDict
+
+from ..serializers import (
+    EventBatchItemSerializer,
+    EventDataSerializer,
+    event_batch_item_validator,
+    event_data_validator,
+)
+
+RECORDS = [
+    {"event_name": "event1", "data": {"a": 1}},
+    {"event_name": "  event1 ", "data": []},
+    {"event_name": "event1", "data": "text", "timestamp": "2023-01-01T10:00:00+02:00"},
+    {"event_name": "event1", "data": {}, "timestamp": "2023-01-01"},
+    {"event_name": "event1", "data": {}, "timestamp": "2023-01-01T10:00:00"},
+    {"event_name": "event1", "data": {}, "timestamp": "yesterday"},
+    {"event_name": "event1", "data": {}, "timestamp": None},
+    {"event_name": "event1", "data": {}, "timestamp": 1672531200},
+    {"event_name": "event1", "data": None},
+    {"event_name": "event1"},
+    {"data": {}},
+    {"event_name": "", "data": {}},
+    {"event_name": "   ", "data": {}},
+    {"event_name": "e" * 255, "data": {}},
+    {"event_name": "e" * 256, "data": {}},
+    {"event_name": "a\x00b", "data": {}},
+    {"event_name": 12, "data": {}},
+    {"event_name": True, "data": {}},
+    {"event_name": ["event1"], "data": {}},
+    {"event_name": "event1", "data": {}, "extra": 1},
+    "event1",
+    ["event1"],
+    None,
+]
+
+
+class FastRecordValidatorTest(SimpleTestCase):
+    def assertSameAsSerializer(self, validator, serializer_class, record):
+        serializer = serializer_class(data=record)
+        if serializer.is_valid():
+            expected = (dict(serializer.validated_data), None)
+        else:
+            expected = (None, serializer.errors)
+        data, errors = validator.validate(record)
+        self.assertEqual((dict(data) if data is not None else None, errors), expected, record)
+
+    def test_same_results_as_the_serializers(self):
+        for record in RECORDS:
+            self.assertSameAsSerializer(event_batch_item_validator, EventBatchItemSerializer, record)
+            self.assertSameAsSerializer(event_data_validator, EventDataSerializer, record)
+
+    def test_fast_path(self):
+        # Valid JSON records are validated without a serializer
+        self.assertEqual(
+            event_batch_item_validator.fast_validate({"event_name": " event1", "data": {"a": 1}}),
+            {"event_name": "event1", "data": {"a": 1}},
+        )
+        self.assertIsNone(event_batch_item_validator.fast_validate({"event_name": "", "data": {}}))
+        # Form data goes through the serializer
+        form = QueryDict("event_name=event1&data=%7B%7D")
+        self.assertIsNone(event_data_validator.fast_validate(form))
+        self.assertEqual(event_data_validator.validate(form)[0]["event_name"], "event1")
@@ -0,0 +1,88 @@
+import io
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from .BaseTest import BaseTestCase
+from ..models import Event
+from ..renderers import ORJSONParser, ORJSONRenderer, orjson
+
+
+@skipIf(orjson is None, "orjson is not installed")
+class ORJSONRendererTest(SimpleTestCase):
+    def assertSameAsDRF(self, data, accepted_media_type=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_same_output_as_drf(self):
+        self.assertSameAsDRF(
+            {
+                "2023-01-01": {"event1": 1, "événement": 2},
+                "time": datetime(2023, 1, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+                "amount": Decimal("1.50"),
+                "list": [1, 2.5, None, True, "a\u2028b"],
+                1: "integer key",
+            }
+        )
+        self.assertSameAsDRF([])
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_falls_back_to_drf(self):
+        self.assertSameAsDRF({"big": 2 ** 70})
+        self.assertSameAsDRF({"a": [1, 2]}, "application/json; indent=4")
+
+    def test_parser(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(b'{"a": [1, "\\u00e9"]}')), {"a": [1, "é"]})
+        with self.assertRaisesMessage(ParseError, "JSON parse error"):
+            ORJSONParser().parse(io.BytesIO(b'{"a": '))
+        # Other encodings are decoded by DRF's parser
+        stream = io.BytesIO('{"a": "é"}'.encode("latin-1"))
+        context = {"encoding": "latin-1"}
+        self.assertEqual(ORJSONParser().parse(stream, parser_context=context), {"a": "é"})
+        self.assertEqual(
+            JSONParser().parse(io.BytesIO(b'{"a": 1}')), ORJSONParser().parse(io.BytesIO(b'{"a": 1}'))
+        )
+
+    def test_parser_keeps_large_integers(self):
+        for body in [
+            b'{"n": 123456789012345678901234567890}',
+            b"[18446744073709551616, 18446744073709551615]",
+            b"[-9223372036854775809]",
+            b'{"s": "12345678901234567890", "f": 0.12345678901234567890}',
+        ]:
+            self.assertEqual(
+                ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body))
+            )
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(b'{"n": 123456789012345678901234567890}')),
+            {"n": 123456789012345678901234567890},
+        )
+
+
+class FastJSONEndpointsTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        Event.objects.create(user=self.user1, name="event1")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+    def test_endpoints_use_the_fast_renderer(self):
+        response = self.client.post(
+            "/api/eventlogs/", {"event_name": "event1", "data": {"a": "é"}}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(response.content, '{"event_name":"event1","data":{"a":"é"}}'.encode())
+
+    def test_invalid_json_body(self):
+        response = self.client.post(
+            "/api/eventlogs/", b'{"event_name": ', content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("JSON parse error", response.data["detail"])
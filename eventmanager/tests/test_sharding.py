@@ -0,0 +1,231 @@
+import io
+import shutil
+import tempfile
+from collections import Counter
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import AsyncClient, SimpleTestCase, override_settings
+
+from .BaseTest import BaseTestCase
+from .. import sharding
+from ..models import (
+    Event,
+    EventArchiveSegment,
+    EventLog,
+    EventRollup,
+    RetentionPolicy,
+    ShardPlacement,
+)
+from ..routers import ShardRouter, shard_db, use_shard
+
+
+class HashRingTest(SimpleTestCase):
+    def test_lookup_is_stable_and_balanced(self):
+        ring = sharding.HashRing(["default", "shard1", "shard2"])
+        placements = [ring.lookup(user_id) for user_id in range(3000)]
+        self.assertEqual(
+            placements,
+            [
+                sharding.HashRing(["shard2", "default", "shard1"]).lookup(user_id)
+                for user_id in range(3000)
+            ],
+        )
+        for count in Counter(placements).values():
+            self.assertGreater(count, 600)
+
+    def test_adding_a_shard_moves_few_users(self):
+        before = sharding.HashRing(["default", "shard1"])
+        after = sharding.HashRing(["default", "shard1", "shard2"])
+        moved = [
+            user_id for user_id in range(3000) if before.lookup(user_id) != after.lookup(user_id)
+        ]
+        # About a third of the users, all to the new shard
+        self.assertLess(len(moved), 1500)
+        self.assertGreater(len(moved), 500)
+        self.assertEqual({after.lookup(user_id) for user_id in moved}, {"shard2"})
+
+    def test_router(self):
+        router = ShardRouter()
+        self.assertIsNone(router.db_for_read(Event))
+        with use_shard("shard1"):
+            self.assertEqual(shard_db(), "shard1")
+            self.assertEqual(router.db_for_read(EventLog), "shard1")
+            self.assertEqual(router.db_for_write(Event), "shard1")
+            self.assertIsNone(router.db_for_read(ShardPlacement))
+        self.assertEqual(shard_db(), "default")
+        self.assertTrue(router.allow_migrate("default", "eventmanager", "shardplacement"))
+        self.assertFalse(router.allow_migrate("shard1", "eventmanager", "shardplacement"))
+        self.assertIsNone(router.allow_migrate("shard1", "eventmanager", "eventlog"))
+
+
+class ShardingTest(BaseTestCase):
+    def setUp(self):
+        settings = override_settings(EVENTMANAGER_SHARDS=["default", "shard1"])
+        settings.enable()
+        self.addCleanup(settings.disable)
+        sharding.placements.clear()
+        self.addCleanup(sharding.placements.clear)
+        super().setUp()
+
+        # Users are placed on the ring when they are created, put them where the tests expect
+        ShardPlacement.objects.filter(user=self.user1).update(alias="shard1")
+        ShardPlacement.objects.filter(user=self.user2).update(alias="default")
+        sharding.placements.clear()
+        with use_shard("shard1"):
+            self.event = Event.objects.create(user=self.user1, name="event1")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+    def post_logs(self, timestamps):
+        records = [
+            {"event_name": "event1", "data": {"user": f"user{index}"}, "timestamp": timestamp}
+            for index, timestamp in enumerate(timestamps)
+        ]
+        response = self.client.post("/api/eventlogs/batch", records, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def get_stats(self):
+        return [
+            self.client.get("/api/stats/event_frequency").data,
+            self.client.get("/api/stats/event_trend").data,
+            self.client.get("/api/stats/event_trend", {"granularity": "minute"}).data,
+            self.client.get("/api/stats/unique", {"event_name": "event1", "key": "user"}).data,
+        ]
+
+    def test_new_users_are_placed(self):
+        user = type(self.user1).objects.create_user(username="test3", password="test3")
+        self.assertEqual(
+            ShardPlacement.objects.get(user=user).alias, sharding.ring().lookup(user.id)
+        )
+        self.assertEqual(
+            sharding.group_by_shard([self.user1.id, self.user2.id, user.id]).get("shard1", [])[:1],
+            [self.user1.id],
+        )
+
+    def test_requests_use_the_shard_of_the_user(self):
+        response = self.client.post(
+            "/api/eventlogs/", {"event_name": "event1", "data": {}}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.post_logs(["2023-01-15T10:00:00+00:00"])
+        self.assertEqual(EventLog.objects.using("shard1").filter(creator=self.user1).count(), 2)
+        self.assertFalse(EventLog.objects.using("default").exists())
+        self.assertEqual(
+            EventRollup.objects.using("shard1")
+            .filter(creator=self.user1, period=EventRollup.DAY)
+            .count(),
+            2,
+        )
+
+        response = self.client.get("/api/stats/event_frequency")
+        self.assertEqual(response.data, [{"event_name": "event1", "total": 2}])
+        response = self.client.get("/api/events/")
+        self.assertEqual(response.data, ["event1"])
+        response = self.client.get("/api/eventlogs/export")
+        self.assertEqual(b"".join(response.streaming_content).count(b"\n"), 2)
+
+        # The other user is on default and does not see the events of the first one
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token2.key)
+        response = self.client.post("/api/events/", {"name": "event1"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Event.objects.using("default").filter(user=self.user2).count(), 1)
+        self.assertEqual(self.client.get("/api/stats/event_frequency").data, [])
+
+    async def test_async_views_use_the_shard_of_the_user(self):
+        headers = {"Authorization": "Token " + self.token1.key}
+        response = await AsyncClient().post(
+            "/api/async/eventlogs/",
+            {"event_name": "event1", "data": {}},
+            content_type="application/json",
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await EventLog.objects.using("shard1").acount(), 1)
+        response = await AsyncClient().get("/api/async/stats/event_frequency", headers=headers)
+        self.assertEqual(response.json(), [{"event_name": "event1", "total": 1}])
+
+    def test_writes_are_refused_while_moving(self):
+        ShardPlacement.objects.filter(user=self.user1).update(moving_to="default")
+        sharding.placements.clear()
+        response = self.client.post(
+            "/api/eventlogs/", {"event_name": "event1", "data": {}}, format="json"
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "5")
+        # Reads still work
+        self.assertEqual(self.client.get("/api/stats/event_frequency").status_code, 200)
+
+    def test_move_keeps_the_data(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(EVENTMANAGER_ARCHIVE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.post_logs(
+            ["2023-01-15T10:00:30+00:00", "2023-01-15T10:00:50+00:00", "2023-02-03T12:00:00+00:00"]
+        )
+        call_command("archive_eventlogs", "--months", "1", stdout=io.StringIO())
+        self.post_logs(["2023-03-01T08:00:00+00:00"])
+        before = self.get_stats()
+
+        moved = sharding.move_creator(self.user1.id, "default", batch_size=2, wait=0)
+        self.assertEqual(moved, 1)
+        self.assertEqual(sharding.placement(self.user1.id), sharding.Placement("default", None))
+        self.assertFalse(EventLog.objects.using("shard1").exists())
+        self.assertFalse(Event.all_objects.using("shard1").exists())
+        self.assertEqual(
+            EventArchiveSegment.objects.using("default").filter(creator=self.user1).count(), 2
+        )
+        self.assertEqual(self.get_stats(), before)
+
+        # The user writes to the new shard
+        self.post_logs(["2023-03-01T08:00:00+00:00"])
+        self.assertEqual(EventLog.objects.using("default").filter(creator=self.user1).count(), 2)
+
+    def test_move_keeps_the_retention_policy(self):
+        with use_shard("shard1"):
+            RetentionPolicy.objects.create(user=self.user1, raw_retention_days=30)
+        sharding.move_creator(self.user1.id, "default", wait=0)
+        self.assertEqual(
+            RetentionPolicy.objects.using("default").get(user=self.user1).raw_retention_days, 30
+        )
+        self.assertFalse(RetentionPolicy.objects.using("shard1").exists())
+
+    def test_rebalance_command(self):
+        output = io.StringIO()
+        call_command(
+            "rebalance_shards",
+            "--user",
+            str(self.user1.id),
+            "--to",
+            "default",
+            "--dry-run",
+            stdout=output,
+        )
+        self.assertIn(f"User {self.user1.id}: shard1 -> default.", output.getvalue())
+        self.assertEqual(sharding.placement(self.user1.id).alias, "shard1")
+
+        self.post_logs(["2023-01-15T10:00:00+00:00"])
+        output = io.StringIO()
+        call_command(
+            "rebalance_shards",
+            "--user",
+            str(self.user1.id),
+            "--to",
+            "default",
+            "--wait",
+            "0",
+            stdout=output,
+        )
+        self.assertIn("Moved 1 users and 1 event logs.", output.getvalue())
+        self.assertEqual(EventLog.objects.using("default").filter(creator=self.user1).count(), 1)
+
+        with self.assertRaises(CommandError):
+            call_command("rebalance_shards", "--user", str(self.user1.id), "--to", "shard2")
+
+    def test_deleting_a_user_deletes_the_shard_data(self):
+        self.post_logs(["2023-01-15T10:00:00+00:00"])
+        self.user1.delete()
+        self.assertFalse(EventLog.objects.using("shard1").exists())
+        self.assertFalse(Event.all_objects.using("shard1").exists())
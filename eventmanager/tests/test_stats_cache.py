@@ -0,0 +1,108 @@
+from datetime import date
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .BaseTest import BaseTestCase
+from ..caching import StatsCache, stats_cache, stats_cache_requests
+from ..models import Event, EventLog
+
+
+class StatsCacheTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(user=self.user1, name="event1")
+        EventLog.objects.create(creator=self.user1, event=self.event, event_name="event1", data={})
+        # Authenticate
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        patcher = mock.patch.object(stats_cache, "cache_alias", "default")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_frequency(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/stats/event_frequency", params or {})
+        rollup_queries = [q for q in queries if 'FROM "eventmanager_eventrollup"' in q["sql"]]
+        return response, len(rollup_queries)
+
+    def test_repeated_requests_are_cached(self):
+        hits = stats_cache_requests.value(endpoint="event_frequency", result="hit")
+
+        response, queries = self.get_frequency()
+        self.assertEqual(response.data, [{"event_name": "event1", "total": 1}])
+        self.assertEqual(queries, 1)
+
+        response, queries = self.get_frequency()
+        self.assertEqual(response.data, [{"event_name": "event1", "total": 1}])
+        self.assertEqual(queries, 0)
+        self.assertEqual(
+            stats_cache_requests.value(endpoint="event_frequency", result="hit"), hits + 1
+        )
+
+        # Different parameters are cached separately
+        response, queries = self.get_frequency({"event_name": "event1", "end_date": "2100-01-01"})
+        self.assertEqual(response.data, {"event_name": "event1", "total": 1})
+        self.assertEqual(queries, 1)
+
+    def test_ingestion_invalidates_cache(self):
+        self.get_frequency()
+        version = stats_cache.version(self.user1.id)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(
+                "/api/eventlogs/", {"event_name": "event1", "data": {}}, format="json"
+            )
+            # Answers computed before the commit are not cached under the new version
+            self.assertEqual(stats_cache.version(self.user1.id), version)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(callbacks)
+
+        response, queries = self.get_frequency()
+        self.assertEqual(response.data, [{"event_name": "event1", "total": 2}])
+        self.assertEqual(queries, 1)
+
+    def test_cache_expires_at_midnight(self):
+        params = {"event_name": "event1"}
+        self.get_frequency(params)
+        self.assertEqual(self.get_frequency(params)[1], 0)
+        # The default end date moved, so the answer is computed again
+        with mock.patch("eventmanager.caching.date") as today:
+            today.today.return_value = date(2100, 1, 1)
+            self.assertEqual(self.get_frequency(params)[1], 1)
+
+    def test_disabled_by_default(self):
+        with mock.patch.object(stats_cache, "cache_alias", None):
+            self.assertEqual(self.get_frequency()[1], 1)
+            self.assertEqual(self.get_frequency()[1], 1)
+            stats_cache.bump(self.user1.id)
+
+    @override_settings(
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "shared": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+        }
+    )
+    def test_memory_cache_timeout(self):
+        # Other processes cannot invalidate the answers kept in the memory of this one
+        self.assertEqual(StatsCache("default").answer_timeout(), 5)
+        self.assertEqual(StatsCache("default", local_timeout=2).answer_timeout(60), 2)
+        self.assertEqual(StatsCache("shared").answer_timeout(), 86400)
+        self.assertEqual(StatsCache("shared").answer_timeout(60), 60)
+
+    def test_cache_is_per_user(self):
+        self.get_frequency()
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token2.key)
+        response, _ = self.get_frequency()
+        self.assertEqual(response.data, [])
+
+    def test_metrics_endpoint(self):
+        self.get_frequency()
+        self.client.credentials()
+        with override_settings(EVENTMANAGER_METRICS_TOKEN="secret"):
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'eventmanager_stats_cache_requests_total{endpoint="event_frequency",result="miss"}',
+            response.content.decode(),
+        )
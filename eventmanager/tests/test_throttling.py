@@ -0,0 +1,115 @@
+from unittest import mock
+
+from django.test import AsyncClient, override_settings
+from rest_framework.exceptions import Throttled
+
+from .BaseTest import BaseTestCase
+from ..models import Event, EventLog, IngestionLimit
+from ..throttling import IngestionThrottle, get_limits
+
+
+@override_settings(
+    EVENTMANAGER_THROTTLE_RATE=10,
+    EVENTMANAGER_THROTTLE_BURST=5,
+    EVENTMANAGER_DAILY_EVENT_QUOTA=None,
+)
+class IngestionThrottleTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        Event.objects.create(user=self.user1, name="event1")
+        Event.objects.create(user=self.user2, name="event1")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+    def post_batch(self, size):
+        return self.client.post(
+            "/api/eventlogs/batch", [{"event_name": "event1", "data": {}}] * size, format="json"
+        )
+
+    def test_rate_limit(self):
+        with mock.patch("eventmanager.throttling.time.monotonic", return_value=1000.0) as monotonic:
+            self.assertEqual(self.post_batch(5).status_code, 201)
+            response = self.client.post(
+                "/api/eventlogs/", {"event_name": "event1", "data": {}}, format="json"
+            )
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response["Retry-After"], "1")
+
+            # 10 event logs per second refill the bucket
+            monotonic.return_value = 1000.2
+            self.assertEqual(self.post_batch(2).status_code, 201)
+            self.assertEqual(self.post_batch(1).status_code, 429)
+
+            # Batches larger than the burst wait for a full bucket
+            monotonic.return_value = 1001.0
+            self.assertEqual(self.post_batch(8).status_code, 201)
+        self.assertEqual(EventLog.objects.filter(creator=self.user1).count(), 15)
+
+        # Other users have their own bucket, and reads are not limited
+        self.assertEqual(self.client.get("/api/stats/event_frequency").status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token2.key)
+        self.assertEqual(self.post_batch(5).status_code, 201)
+
+    @override_settings(EVENTMANAGER_THROTTLE_RATE=None, EVENTMANAGER_DAILY_EVENT_QUOTA=3)
+    def test_daily_quota(self):
+        self.assertEqual(self.post_batch(2).status_code, 201)
+        response = self.post_batch(2)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Daily quota of 3 event logs exceeded.", response.data["detail"])
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+        response = self.client.get("/api/quota")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["used"], 2)
+        self.assertEqual(response.data["remaining"], 1)
+        self.assertEqual(response.data["daily_quota"], 3)
+        self.assertIsNone(response.data["rate"])
+
+    def test_limits_of_a_user(self):
+        IngestionLimit.objects.create(user=self.user1, daily_quota=1)
+        self.assertEqual(self.post_batch(1).status_code, 201)
+        self.assertEqual(self.post_batch(1).status_code, 429)
+        response = self.client.get("/api/quota")
+        self.assertEqual((response.data["rate"], response.data["burst"]), (10, 5))
+
+    @mock.patch("eventmanager.throttling.time.monotonic", return_value=1000.0)
+    def test_processes_share_the_limits(self, monotonic):
+        limits = get_limits(self.user1.id)
+        first, second = IngestionThrottle(), IngestionThrottle()
+        first.check(self.user1.id, 4)
+        second.check(self.user1.id, 1)
+        first.sync(self.user1.id, limits)
+        second.sync(self.user1.id, limits)
+        # The second process takes the 4 event logs of the first off its bucket
+        self.assertEqual(second.allowances[self.user1.id].used_today, 5)
+        with self.assertRaises(Throttled):
+            second.take(self.user1.id, limits, 1)
+        monotonic.return_value = 1000.1
+        second.take(self.user1.id, limits, 1)
+
+    @mock.patch("eventmanager.throttling.time.monotonic", return_value=1000.0)
+    def test_allowances_are_bounded(self, monotonic):
+        throttle, other = IngestionThrottle(max_size=1), IngestionThrottle()
+        throttle.check(self.user1.id, 2)
+        throttle.check(self.user2.id, 1)
+        self.assertEqual(list(throttle.allowances), [self.user2.id])
+        # The event logs of the evicted allowance are shared with the other processes
+        other.sync(self.user1.id, get_limits(self.user1.id))
+        self.assertEqual(other.allowances[self.user1.id].used_today, 2)
+
+    async def test_async_ingestion(self):
+        headers = {"Authorization": "Token " + self.token1.key}
+        response = await AsyncClient().post(
+            "/api/async/eventlogs/batch",
+            [{"event_name": "event1", "data": {}}] * 5,
+            content_type="application/json",
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        response = await AsyncClient().post(
+            "/api/async/eventlogs/",
+            {"event_name": "event1", "data": {}},
+            content_type="application/json",
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
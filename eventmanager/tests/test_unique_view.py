@@ -0,0 +1,96 @@
+import io
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.dateparse import parse_datetime
+
+from .BaseTest import BaseTestCase
+from .. import sketches
+from ..models import Event, EventLog, EventUniqueSketch
+
+
+@override_settings(EVENTMANAGER_UNIQUE_KEYS=["user"])
+class EventUniqueCountTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.event = Event.objects.create(user=self.user1, name="event1")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        records = [
+            {"event_name": "event1", "data": {"user": user}, "timestamp": timestamp}
+            for user, timestamp in [
+                ("alice", "2023-01-01T10:00:00Z"),
+                ("alice", "2023-01-01T11:00:00Z"),
+                ("bob", "2023-01-01T12:00:00Z"),
+                ("alice", "2023-01-02T10:00:00Z"),
+                ("carol", "2023-01-02T10:00:00Z"),
+            ]
+        ]
+        records.append({"event_name": "event1", "data": {}, "timestamp": "2023-01-02T10:00:00Z"})
+        response = self.client.post("/api/eventlogs/batch", records, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def get_unique(self, **params):
+        return self.client.get("/api/stats/unique", {"event_name": "event1", "key": "user", **params})
+
+    def test_unique_count(self):
+        response = self.get_unique()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["unique"], 3)
+        self.assertEqual(response.data["daily"], {"2023-01-01": 2, "2023-01-02": 2})
+        self.assertGreater(response.data["error_rate"], 0)
+
+        response = self.get_unique(start_date="2023-01-02", end_date="2023-01-03")
+        self.assertEqual(response.data["unique"], 2)
+        self.assertEqual(response.data["daily"], {"2023-01-02": 2})
+
+    def test_single_log_ingestion(self):
+        response = self.client.post(
+            "/api/eventlogs/", {"event_name": "event1", "data": {"user": "dave"}}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_unique().data["unique"], 4)
+
+    def test_other_users_are_not_counted(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token2.key)
+        response = self.get_unique()
+        self.assertEqual(response.data["unique"], 0)
+
+    def test_invalid_parameters(self):
+        response = self.client.get("/api/stats/unique")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("event_name", response.data)
+
+        self.assertEqual(self.get_unique(key="email").status_code, 400)
+        self.assertEqual(self.get_unique(start_date="yesterday").status_code, 400)
+
+    @override_settings(EVENTMANAGER_UNIQUE_KEYS=["user", "page"])
+    def test_rebuild(self):
+        EventLog.objects.filter(data__user="bob").update(data={"user": "bob", "page": "home"})
+        call_command("rebuild_event_rollups", verbosity=0, stdout=io.StringIO())
+        self.assertEqual(EventUniqueSketch.objects.filter(key="page").count(), 1)
+        self.assertEqual(self.get_unique().data["unique"], 3)
+
+    def test_sketches_are_locked_in_order(self):
+        logs = [
+            EventLog(
+                creator=self.user1,
+                event=self.event,
+                event_name="event1",
+                data={"user": "erin"},
+                timestamp=parse_datetime(timestamp),
+            )
+            for timestamp in ["2023-01-03T10:00:00Z", "2023-01-01T10:00:00Z"]
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            sketches.record_event_logs(logs)
+        (select,) = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+        self.assertIn(
+            'ORDER BY "eventmanager_eventuniquesketch"."creator_id" ASC, '
+            '"eventmanager_eventuniquesketch"."event_id" ASC, '
+            '"eventmanager_eventuniquesketch"."day" ASC',
+            select,
+        )
+        (insert,) = [q["sql"] for q in queries if q["sql"].startswith("INSERT")]
+        self.assertLess(insert.index("2023-01-01"), insert.index("2023-01-03"))
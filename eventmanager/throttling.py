@@ -0,0 +1,319 @@
+"""
+Rate limits and daily quotas of the ingestion endpoints, enforced in memory.
+
+Every user has a token bucket holding up to `burst` event logs and refilled with `rate` event
+logs per second, and may send `daily_quota` event logs per UTC day. The defaults are the
+EVENTMANAGER_THROTTLE_RATE, EVENTMANAGER_THROTTLE_BURST and EVENTMANAGER_DAILY_EVENT_QUOTA
+settings, and an IngestionLimit row overrides them for a user. None means no limit, and the burst
+defaults to one second of the rate. Every record sent counts, rejected ones included, and a
+request larger than the burst waits for a full bucket. The daily usage is counted for every user,
+with or without limits, and returned by `/api/quota`.
+
+Requests are checked against the buckets and counters of the process, without any query or
+cache access. At most every `EVENTMANAGER_THROTTLE_SYNC_INTERVAL` seconds per user, the process
+adds the event logs it let through since the previous sync to two counters in the Django cache
+named by `EVENTMANAGER_THROTTLE_CACHE`: one for the rate, one for the day. It then takes the
+event logs let through by the other processes off its bucket, and reads the usage of the day.
+Processes thus share the limits, give or take one interval of traffic. A process keeps the
+buckets of the `EVENTMANAGER_THROTTLE_CACHE_SIZE` users who sent event logs most recently, and
+shares what the others let through when they are evicted.
+
+Requests over a limit are refused with 429 Too Many Requests and a Retry-After header: the time
+the bucket needs to refill, or until midnight UTC for the daily quota.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from .caching import MISSING, TTLCache
+from .models import IngestionLimit
+
+Limits = namedtuple("Limits", ["rate", "burst", "daily_quota"])
+
+ingestion_limits = TTLCache(
+    max_size=getattr(settings, "EVENTMANAGER_THROTTLE_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "EVENTMANAGER_THROTTLE_LIMITS_TTL", 60),
+)
+
+
+def default_limits():
+    return Limits(
+        getattr(settings, "EVENTMANAGER_THROTTLE_RATE", None),
+        getattr(settings, "EVENTMANAGER_THROTTLE_BURST", None),
+        getattr(settings, "EVENTMANAGER_DAILY_EVENT_QUOTA", None),
+    )
+
+
+def load_limits(user_id):
+    """
+    Returns the Limits of a user, from its IngestionLimit row and the settings.
+    """
+    limits = default_limits()
+    row = (
+        IngestionLimit.objects.using(DEFAULT_DB_ALIAS)
+        .filter(user_id=user_id)
+        .values_list("rate", "burst", "daily_quota")
+        .first()
+    )
+    if row is None:
+        return limits
+    return Limits(*(own if own is not None else default for own, default in zip(row, limits)))
+
+
+def get_limits(user_id):
+    limits = ingestion_limits.get(user_id)
+    if limits is MISSING:
+        limits = load_limits(user_id)
+        ingestion_limits.set(user_id, limits)
+    return limits
+
+
+def bucket_size(limits):
+    """
+    Returns the number of event logs the bucket of a rate limit holds, `rate` when no burst is set.
+    """
+    return limits.burst if limits.burst is not None else max(1, math.ceil(limits.rate))
+
+
+def utc_today():
+    return datetime.now(dt_timezone.utc).date()
+
+
+def seconds_until_tomorrow():
+    now = datetime.now(dt_timezone.utc)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), dt_timezone.utc)
+    return (tomorrow - now).total_seconds()
+
+
+class Allowance:
+    """
+    What a user may still send, as seen by this process.
+    """
+
+    def __init__(self, limits, now):
+        self.limits = limits
+        self.tokens = float(bucket_size(limits)) if limits.rate is not None else 0.0
+        self.updated = now
+        self.synced_at = now
+        # Event logs let through since the last sync, and the day they were counted for
+        self.unsynced = 0
+        self.day = utc_today()
+        # Value of the shared rate counter after the last sync
+        self.shared_total = None
+        # Event logs sent today by all processes at the last sync, plus `unsynced`
+        self.used_today = 0
+
+    def refill(self, now):
+        if self.limits.rate is not None:
+            self.tokens = min(
+                float(bucket_size(self.limits)), self.tokens + (now - self.updated) * self.limits.rate
+            )
+        self.updated = now
+
+
+class IngestionThrottle:
+    """
+    Token buckets and daily counters of the users, see the module documentation.
+    """
+
+    def __init__(self, max_size=None):
+        self.lock = threading.Lock()
+        # Least recently used first
+        self.allowances = OrderedDict()
+        self.max_size = max_size or getattr(settings, "EVENTMANAGER_THROTTLE_CACHE_SIZE", 10000)
+        # (user id, day, event logs) let through by the evicted allowances since their last sync
+        self.evicted = []
+
+    @staticmethod
+    def cache():
+        return caches[getattr(settings, "EVENTMANAGER_THROTTLE_CACHE", "default")]
+
+    @staticmethod
+    def rate_key(user_id):
+        return f"eventmanager:throttle:{user_id}"
+
+    @staticmethod
+    def quota_key(user_id, day):
+        return f"eventmanager:quota:{user_id}:{day.isoformat()}"
+
+    @staticmethod
+    def incr(cache, key, delta, timeout):
+        cache.add(key, 0, timeout)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            # Evicted in the meantime
+            cache.add(key, delta, timeout)
+            return delta
+
+    def allowance(self, user_id, limits, now):
+        """
+        Returns the allowance of a user, evicting the least recently used ones beyond `max_size`.
+        Must be called with the lock held.
+        """
+        allowance = self.allowances.get(user_id)
+        if allowance is None or allowance.limits != limits:
+            allowance = self.allowances[user_id] = Allowance(limits, now)
+        self.allowances.move_to_end(user_id)
+        while len(self.allowances) > self.max_size:
+            evicted_id, evicted = self.allowances.popitem(last=False)
+            if evicted.unsynced:
+                self.evicted.append((evicted_id, evicted.day, evicted.unsynced))
+        return allowance
+
+    def sync_evicted(self):
+        """
+        Adds the event logs let through by the evicted allowances to the shared counters.
+        """
+        with self.lock:
+            evicted, self.evicted = self.evicted, []
+        cache = self.cache()
+        for user_id, day, sent in evicted:
+            self.incr(cache, self.rate_key(user_id), sent, 86400)
+            self.incr(cache, self.quota_key(user_id, day), sent, 2 * 86400)
+
+    def sync_due(self, user_id, now):
+        allowance = self.allowances.get(user_id)
+        interval = getattr(settings, "EVENTMANAGER_THROTTLE_SYNC_INTERVAL", 1.0)
+        return allowance is None or now - allowance.synced_at >= interval or allowance.day != utc_today()
+
+    def sync(self, user_id, limits):
+        """
+        Shares the event logs let through by this process with the others, see the module
+        documentation. Makes two cache round trips.
+        """
+        now = time.monotonic()
+        with self.lock:
+            allowance = self.allowance(user_id, limits, now)
+            sent, day, shared_total = allowance.unsynced, allowance.day, allowance.shared_total
+            allowance.unsynced = 0
+            allowance.synced_at = now
+
+        cache = self.cache()
+        total = self.incr(cache, self.rate_key(user_id), sent, 86400)
+        used = self.incr(cache, self.quota_key(user_id, day), sent, 2 * 86400)
+        today = utc_today()
+        if day != today:
+            used = self.incr(cache, self.quota_key(user_id, today), 0, 2 * 86400)
+
+        with self.lock:
+            if shared_total is not None and total >= shared_total + sent:
+                # Let through by the other processes since the last sync
+                allowance.refill(time.monotonic())
+                allowance.tokens -= total - shared_total - sent
+            allowance.shared_total = total
+            allowance.day = today
+            allowance.used_today = used + allowance.unsynced
+
+    def take(self, user_id, limits, cost):
+        """
+        Takes `cost` event logs off the allowance of a user.
+
+        Raises:
+            Throttled: If the user is over their rate limit or daily quota.
+        """
+        now = time.monotonic()
+        with self.lock:
+            allowance = self.allowance(user_id, limits, now)
+            if limits.daily_quota is not None and allowance.used_today + cost > limits.daily_quota:
+                raise Throttled(
+                    wait=seconds_until_tomorrow(),
+                    detail=f"Daily quota of {limits.daily_quota} event logs exceeded.",
+                )
+            if limits.rate is not None:
+                allowance.refill(now)
+                needed = min(cost, bucket_size(limits))
+                if allowance.tokens < needed:
+                    wait = (needed - allowance.tokens) / limits.rate if limits.rate > 0 else None
+                    raise Throttled(wait=wait)
+                allowance.tokens -= needed
+            allowance.unsynced += cost
+            allowance.used_today += cost
+
+    def check(self, user_id, cost):
+        """
+        Lets `cost` event logs of a user through, or raises Throttled.
+        """
+        limits = get_limits(user_id)
+        if self.sync_due(user_id, time.monotonic()):
+            self.sync(user_id, limits)
+        self.take(user_id, limits, cost)
+        if self.evicted:
+            self.sync_evicted()
+
+    async def acheck(self, user_id, cost):
+        """
+        Asynchronous version of `check`. Only the syncs and the loading of the limits of a user
+        leave the event loop.
+        """
+        limits = ingestion_limits.get(user_id)
+        if limits is MISSING:
+            limits = await sync_to_async(get_limits)(user_id)
+        if self.sync_due(user_id, time.monotonic()):
+            await sync_to_async(self.sync)(user_id, limits)
+        self.take(user_id, limits, cost)
+        if self.evicted:
+            await sync_to_async(self.sync_evicted)()
+
+    def usage(self, user_id):
+        """
+        Returns the limits of a user and what they used, for the quota endpoint.
+        """
+        limits = get_limits(user_id)
+        self.sync(user_id, limits)
+        used = 0
+        tokens = None
+        with self.lock:
+            allowance = self.allowances.get(user_id)
+            if allowance is not None:
+                used = allowance.used_today
+                if limits.rate is not None:
+                    allowance.refill(time.monotonic())
+                    tokens = max(0, math.floor(allowance.tokens))
+        return {
+            "day": utc_today(),
+            "daily_quota": limits.daily_quota,
+            "used": used,
+            "remaining": None if limits.daily_quota is None else max(0, limits.daily_quota - used),
+            "resets_in": math.ceil(seconds_until_tomorrow()),
+            "rate": limits.rate,
+            "burst": None if limits.rate is None else bucket_size(limits),
+            "available": tokens,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.allowances.clear()
+            self.evicted.clear()
+
+
+ingestion_throttle = IngestionThrottle()
+
+
+def request_cost(data):
+    """
+    Returns the number of event logs of the body of an ingestion request.
+    """
+    return len(data) if isinstance(data, list) else 1
+
+
+class IngestionRateThrottle(BaseThrottle):
+    """
+    DRF throttle of the ingestion views, backed by `ingestion_throttle`.
+    """
+
+    def allow_request(self, request, view):
+        if request.method != "POST" or not request.user or not request.user.is_authenticated:
+            return True
+        # Raises Throttled itself, so the answer says which limit was hit
+        ingestion_throttle.check(request.user.id, request_cost(request.data))
+        return True
@@ -1,10 +1,22 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("events/", views.EventList.as_view()),
     path("events/<int:pk>", views.EventUpdateDelete.as_view()),
     path("eventlogs/", views.EventLogData.as_view()),
+    path("eventlogs/batch", views.EventLogBatch.as_view()),
+    path("eventlogs/export", views.EventLogExport.as_view()),
+    path("retention", views.RetentionPolicyView.as_view()),
+    path("quota", views.IngestionQuotaView.as_view()),
     path("stats/event_frequency", views.EventFrequency.as_view()),
     path("stats/event_trend", views.EventTrendsView.as_view()),
-]
\ No newline at end of file
+    path("stats/unique", views.EventUniqueCount.as_view()),
+    path("stats/funnel", views.EventFunnel.as_view()),
+    path("stats/aggregate", views.EventAggregate.as_view()),
+    path("async/eventlogs/", async_views.AsyncEventLogData.as_view()),
+    path("async/eventlogs/batch", async_views.AsyncEventLogBatch.as_view()),
+    path("async/stats/event_frequency", async_views.AsyncEventFrequency.as_view()),
+    path("async/stats/event_trend", async_views.AsyncEventTrends.as_view()),
+    path("async/live/event_counts", async_views.AsyncLiveEventCounts.as_view()),
+]
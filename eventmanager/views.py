@@ -1,23 +1,95 @@
-from datetime import datetime, date
-
-from django.db.models import Count, functions
+import base64
+import csv
+import hmac
+import io
+import json
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.authentication import get_authorization_header
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_201_CREATED
+from rest_framework.permissions import SAFE_METHODS, BasePermission, IsAuthenticated
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_400_BAD_REQUEST,
+    HTTP_201_CREATED,
+    HTTP_202_ACCEPTED,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
 from rest_framework.generics import (
     CreateAPIView,
     ListAPIView,
     ListCreateAPIView,
+    RetrieveUpdateAPIView,
     RetrieveUpdateDestroyAPIView,
 )
 from rest_framework.views import APIView
 from rest_framework.filters import SearchFilter
 from rest_framework.exceptions import ValidationError
 
-from .models import Event, EventLog
-from .serializers import EventSerializer, EventDataSerializer
+from .buffer import BufferFull, get_buffer, is_buffered
+from . import aggregations, archive, funnels, metrics, sharding, sketches, stats
+from .caching import event_names, stats_cache
+from .deletion import soft_delete_event
+from .ingest import mark_duplicates, save_event_logs
+from .models import Event, EventLog, RetentionPolicy
+from .routers import current_shard, replica_reads, replica_selector, shard_db, stats_cache_timeout
+from .serializers import (
+    EventSerializer,
+    EventDataSerializer,
+    EventBatchItemSerializer,
+    RetentionPolicySerializer,
+    event_batch_item_validator,
+    event_data_validator,
+)
+from .stats import parse_time
+from .throttling import IngestionRateThrottle, ingestion_throttle
+
+
+def buffer_logs(logs):
+    """
+    Queues event logs for the background writer.
+
+    Returns:
+        Response: A 503 response asking the client to retry later if the buffer is full,
+        None if the logs were queued.
+    """
+    try:
+        get_buffer().put(logs)
+    except BufferFull:
+        return Response(
+            {"error": "The server is busy. Please retry later."},
+            status=HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+    return None
+
 
-class EventList(ListCreateAPIView):
+class CreatorShardMixin:
+    """
+    Runs the request against the shard that stores the data of the authenticated user, see
+    `eventmanager.sharding`. Writes are refused while the user is being moved to another shard.
+    """
+    shard_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        placement = sharding.placement(request.user.id)
+        if placement.moving_to and request.method not in SAFE_METHODS:
+            raise sharding.ShardMoving()
+        self.shard_token = current_shard.set(placement.alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.shard_token is not None:
+            current_shard.reset(self.shard_token)
+            self.shard_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class EventList(CreatorShardMixin, ListCreateAPIView):
     """
     API for listing and creating events for authenticated users.
     Utilizes the search filter to allow searching for events by name or description.
@@ -78,7 +150,7 @@ class EventList(ListCreateAPIView):
         else:
             return Response(serializer.errors, status=HTTP_400_BAD_REQUEST)
 
-class EventUpdateDelete(RetrieveUpdateDestroyAPIView):
+class EventUpdateDelete(CreatorShardMixin, RetrieveUpdateDestroyAPIView):
     """
     API view to retrieve, update or delete an event.
 
@@ -102,8 +174,16 @@ class EventUpdateDelete(RetrieveUpdateDestroyAPIView):
             A queryset of Event instances.
         """
         return Event.objects.filter(user__id=self.request.user.id)
+
+    def perform_destroy(self, instance):
+        """
+        Marks the event as deleted instead of deleting it with all of its logs inside the request.
+
+        The logs are removed later by the `purge_deleted_events` command.
+        """
+        soft_delete_event(instance)
     
-class EventLogData(CreateAPIView):
+class EventLogData(CreatorShardMixin, CreateAPIView):
     """
     API endpoint that allows authenticated users to create event log data.
 
@@ -115,6 +195,7 @@ class EventLogData(CreateAPIView):
     
     serializer_class = EventDataSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [IngestionRateThrottle]
 
     def perform_create(self, serializer):
         """
@@ -133,14 +214,22 @@ class EventLogData(CreateAPIView):
         This method validates the incoming data using the serializer, checks if the event exists, and if the event 
         exists, it saves the data and sets the creator to the current authenticated user and the event to the 
         corresponding event instance. If the event does not exist, it returns a response with an error message.
+        Event names are resolved through the event name cache, so usually no lookup query is made.
+
+        In buffered ingestion mode the log is queued for the background writer and the response has status
+        202 instead, or 503 if the queue is full.
 
+        The payload is checked by `event_data_validator`, which gives the same answers as the serializer
+        without building one for every request, and the response echoes the validated data.
         """
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        
-        event = Event.objects.filter(name=request.data.get("event_name")).first()
+        validated_data, errors = event_data_validator.validate(request.data)
+        if errors:
+            raise ValidationError(errors)
+
+        event_name = validated_data["event_name"]
+        event_id = event_names.resolve(request.user.id, event_name)
         # If user tries to capture an event that they have not created
-        if event is None:
+        if event_id is None:
             return Response(
                 {
                     "error": "The specified event does not exist. Please create the event first."
@@ -148,24 +237,304 @@ class EventLogData(CreateAPIView):
                 status=HTTP_400_BAD_REQUEST,
             )
         
-        serializer.save(creator=request.user, event=event)
-        return Response(serializer.data, status=HTTP_201_CREATED)
+        log = EventLog(creator=request.user, event_id=event_id, **validated_data)
+        data = {"event_name": log.event_name, "data": log.data}
+        if is_buffered():
+            # The log is written by the background worker
+            return buffer_logs([log]) or Response(data, status=HTTP_202_ACCEPTED)
+
+        try:
+            stored = save_event_logs([log])
+        except IntegrityError:
+            # The cached event was deleted by another process
+            event_names.invalidate(request.user.id, event_name)
+            return Response(
+                {
+                    "error": "The specified event does not exist. Please create the event first."
+                },
+                status=HTTP_400_BAD_REQUEST,
+            )
+        # A retry of a log that was already stored
+        return Response(data, status=HTTP_201_CREATED if stored else HTTP_200_OK)
+
 
+class EventLogBatch(CreatorShardMixin, CreateAPIView):
+    """
+    API endpoint that allows authenticated users to create many event logs in a single request.
 
-class EventFrequency(ListAPIView):
+    The endpoint expects a list of records, each containing an event name, the event data and an
+    optional timestamp. Every record is validated on its own, so one bad record does not reject the
+    whole batch. The response reports, for every record, whether it was accepted or rejected.
+    """
+    serializer_class = EventBatchItemSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [IngestionRateThrottle]
+    @property
+    def max_batch_size(self):
+        # Read on every request, so that the setting can be changed at runtime
+        return getattr(settings, "EVENTMANAGER_BATCH_MAX_SIZE", 5000)
+
+    def create(self, request):
+        """
+        Handle POST request for creating event logs in bulk.
+
+        All event names of the batch are resolved through the event name cache, with at most one query
+        against the events of the authenticated user, and the accepted records are stored with a single
+        bulk insert.
+
+        Returns:
+            Response: The number of accepted and rejected records and the per-record results.
+        """
+        records = request.data
+        if not isinstance(records, list):
+            return Response(
+                {"error": "Expected a list of event logs."}, status=HTTP_400_BAD_REQUEST
+            )
+        if len(records) > self.max_batch_size:
+            return Response(
+                {"error": f"A batch cannot contain more than {self.max_batch_size} event logs."},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        names = {
+            record.get("event_name")
+            for record in records
+            if isinstance(record, dict) and isinstance(record.get("event_name"), str)
+        }
+        event_ids = event_names.resolve_many(request.user.id, names)
+
+        results = []
+        logs = []
+        log_results = []
+        for index, record in enumerate(records):
+            validated_data, errors = event_batch_item_validator.validate(record)
+            if errors:
+                results.append({"index": index, "status": "rejected", "errors": errors})
+                continue
+            event_id = event_ids.get(validated_data["event_name"])
+            if event_id is None:
+                results.append(
+                    {
+                        "index": index,
+                        "status": "rejected",
+                        "errors": {"event_name": ["The specified event does not exist."]},
+                    }
+                )
+                continue
+            logs.append(EventLog(creator=request.user, event_id=event_id, **validated_data))
+            results.append({"index": index, "status": "accepted"})
+            log_results.append(results[-1])
+
+        status = HTTP_201_CREATED
+        duplicates = 0
+        if not logs:
+            status = HTTP_400_BAD_REQUEST
+        elif is_buffered():
+            error = buffer_logs(logs)
+            if error:
+                return error
+            status = HTTP_202_ACCEPTED
+        else:
+            try:
+                stored = save_event_logs(logs)
+            except IntegrityError:
+                # One of the cached events was deleted by another process
+                for name in names:
+                    event_names.invalidate(request.user.id, name)
+                return Response(
+                    {"error": "One of the specified events no longer exists. Please retry."},
+                    status=HTTP_400_BAD_REQUEST,
+                )
+            duplicates = mark_duplicates(logs, stored, log_results)
+            if duplicates == len(logs):
+                # Retries of a batch that was already stored
+                status = HTTP_200_OK
+        return Response(
+            {
+                "accepted": len(logs) - duplicates,
+                "rejected": len(records) - len(logs),
+                "duplicates": duplicates,
+                "results": results,
+            },
+            status=status,
+        )
+
+
+class EventLogExport(CreatorShardMixin, APIView):
+    """
+    API endpoint that streams the raw event logs of the authenticated user as NDJSON or CSV.
+
+    Logs are optionally filtered by event name and by a `start`/`end` time range, and exported in
+    (timestamp, id) order. Every response holds `limit` logs, or a few more when logs with earlier
+    timestamps are written meanwhile. If more logs match, the `X-Next-Cursor` header contains the
+    cursor to pass as `cursor` to get the next page. Rows are read with a server-side cursor and
+    written as they arrive, so memory use does not depend on the size of the export.
+    """
+    permission_classes = [IsAuthenticated]
+    default_limit = 100000
+    max_limit = 1000000
+    chunk_size = 2000
+    formats = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+    @staticmethod
+    def encode_cursor(timestamp, pk):
+        value = f"{timestamp.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Returns the (timestamp, id) of the last exported log encoded in a cursor.
+
+        Raises:
+            ValidationError: If the cursor is malformed.
+        """
+        try:
+            timestamp, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError
+            return timestamp, int(pk)
+        except (ValueError, UnicodeError):
+            raise ValidationError({"cursor": "Invalid cursor."})
+
+    def get_queryset(self):
+        """
+        Returns the event logs of the authenticated user that match the filters of the request.
+        """
+        params = self.request.query_params
+        queryset = EventLog.objects.filter(
+            creator_id=self.request.user.id, event__deleted_at__isnull=True
+        )
+        if params.get("event_name"):
+            queryset = queryset.filter(event_name=params["event_name"])
+        start = parse_time(params, "start")
+        if start:
+            queryset = queryset.filter(timestamp__gte=start)
+        end = parse_time(params, "end")
+        if end:
+            queryset = queryset.filter(timestamp__lt=end)
+        if params.get("cursor"):
+            timestamp, pk = self.decode_cursor(params["cursor"])
+            queryset = queryset.filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)
+            )
+        return queryset.order_by("timestamp", "id")
+
+    def get(self, request):
+        """
+        Handle GET request for exporting event logs.
+
+        Query parameters: `event_name`, `start`, `end`, `output_format` (ndjson or csv), `limit` and `cursor`.
+        The `format` parameter is reserved by Django REST framework for content negotiation.
+        """
+        export_format = request.query_params.get("output_format", "ndjson")
+        if export_format not in self.formats:
+            raise ValidationError({"output_format": f"Expected one of {', '.join(self.formats)}."})
+        try:
+            limit = int(request.query_params.get("limit", self.default_limit))
+        except ValueError:
+            raise ValidationError({"limit": "Expected an integer."})
+        if not 0 < limit <= self.max_limit:
+            raise ValidationError({"limit": f"Expected a number between 1 and {self.max_limit}."})
+
+        # Exports read from a replica when one is available. The rows are streamed after the view
+        # returns, so the database is named explicitly.
+        alias = replica_selector.choose() if shard_db() == DEFAULT_DB_ALIAS else shard_db()
+        queryset = self.get_queryset().using(alias)
+        # The last row of this page and the first row of the next one, if there is one
+        boundary = list(queryset.values_list("timestamp", "id")[limit - 1:limit + 1])
+        if len(boundary) == 2:
+            # The page ends at the row of the cursor rather than after `limit` rows, so a log
+            # written with an earlier timestamp after the query above is exported on this page,
+            # instead of pushing a row that the next page skips out of it
+            timestamp, pk = boundary[0]
+            queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lte=pk))
+        rows = queryset.values_list("id", "event_name", "timestamp", "data")
+
+        render = self.render_csv if export_format == "csv" else self.render_ndjson
+        response = StreamingHttpResponse(
+            render(rows.iterator(chunk_size=self.chunk_size)),
+            content_type=self.formats[export_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="eventlogs.{export_format}"'
+        if len(boundary) == 2:
+            response["X-Next-Cursor"] = self.encode_cursor(*boundary[0])
+        return response
+
+    def render_ndjson(self, rows):
+        lines = []
+        for pk, event_name, timestamp, data in rows:
+            lines.append(
+                json.dumps(
+                    {"id": pk, "event_name": event_name, "timestamp": timestamp.isoformat(), "data": data}
+                )
+            )
+            if len(lines) == self.chunk_size:
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            yield "\n".join(lines) + "\n"
+
+    def render_csv(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["id", "event_name", "timestamp", "data"])
+        for count, (pk, event_name, timestamp, data) in enumerate(rows, start=1):
+            writer.writerow([pk, event_name, timestamp.isoformat(), json.dumps(data)])
+            if count % self.chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+
+class CachedStatsMixin(CreatorShardMixin):
+    """
+    Caches the answers of a stats endpoint per user and query parameters.
+
+    Cached answers are invalidated as soon as new event logs of the user are written,
+    see `eventmanager.caching.StatsCache`.
+    """
+    stats_endpoint = None
+
+    def cached_response(self, request, compute):
+        """
+        Returns a response with the cached answer for this request, calling `compute` on a miss.
+        `compute` reads from a replica when one is available, see `eventmanager.routers`.
+        """
+        alias = replica_selector.choose()
+
+        def compute_on_replica():
+            with replica_reads(alias):
+                return compute()
+
+        data = stats_cache.get_or_set(
+            request.user.id,
+            self.stats_endpoint,
+            request.query_params,
+            compute_on_replica,
+            timeout=stats_cache_timeout(alias),
+        )
+        return Response(data)
+
+
+class EventFrequency(CachedStatsMixin, ListAPIView):
     """
     API endpoint that provides event frequency data for authenticated users.
 
     The endpoint provides the total number of times a specified event has occurred within a given date range.
     If no event name is specified, it returns the count for all events created by the authenticated user.
+    Counts are read from the daily rollups, so the cost of a request does not grow with the number of logs.
     """
     permission_classes = [IsAuthenticated]
+    stats_endpoint = "event_frequency"
 
     def get_queryset(self):
         """
-        Returns a queryset that only includes events that belong to the authenticated user.
+        Returns a queryset of the daily rollups that belong to the authenticated user.
         """
-        return EventLog.objects.filter(creator_id=self.request.user.id)
+        return stats.daily_rollups(self.request.user.id)
 
     def get(self, request):
         """
@@ -181,85 +550,201 @@ class EventFrequency(ListAPIView):
         Returns:
             Response: HttpResponse containing the event frequency data.
         """
-        # Assuming we start collecting data from this date, so if no start time is specified,
-        # we get everything from the beginning
-        app_start_date = datetime(2020, 1, 1)
-        event_name = request.query_params.get('event_name')
-        start_date = request.query_params.get('start_date') or app_start_date
-        end_date = request.query_params.get('end_date') or date.today()
-
-        if event_name:
-            count = (
-                self.get_queryset()
-                .filter(
-                    event_name=event_name,
-                    timestamp__date__gt=start_date,
-                    timestamp__date__lt=end_date,
-                )
-                .count()
-            )
-            return Response({"event_name": event_name, "total": count})
-        else:
-            event_count = (
-                self.get_queryset().values("event_name").annotate(total=Count("event_name"))
-            )
-            return Response(event_count)
+        def compute():
+            event_count = stats.frequency_query(self.get_queryset(), request.query_params)
+            return stats.format_frequency(request.query_params, list(event_count))
+
+        return self.cached_response(request, compute)
 
 
-class EventTrendsView(ListAPIView):
+class EventTrendsView(CachedStatsMixin, ListAPIView):
     """
     API endpoint that provides event trends data for authenticated users.
 
-    The endpoint returns a count of each event logged by the authenticated user per day. 
-    The count is grouped by event names.
+    The endpoint returns a count of each event logged by the authenticated user per minute, hour, day,
+    week or month, in any time zone. The count is grouped by event names and read from the rollups
+    whenever they can answer, see `eventmanager.stats.trend_query`.
 
     """
     permission_classes = [IsAuthenticated]
+    stats_endpoint = "event_trend"
 
-    def get_queryset(self):
+    def get(self, request):
         """
-        Returns a queryset that only includes events that belong to the authenticated user.
+        Handle GET request for event trends data.
+
+        Query parameters: `granularity` (minute, hour, day, week or month, default day), `tz` (default UTC),
+        `event_name`, `start`, `end` and `layout` (nested or columnar, default nested).
         """
-        return EventLog.objects.filter(creator_id=self.request.user.id)
+        options = stats.parse_trend_params(request.query_params)
 
-    @staticmethod
-    def format_data(query_set):
+        def compute():
+            rows = list(stats.trend_query(request.user.id, options))
+            if stats.reads_raw_logs(options):
+                rows += archive.trend_rows(request.user.id, options)
+            return stats.format_trend(options, rows)
+
+        return self.cached_response(request, compute)
+
+
+class EventUniqueCount(CachedStatsMixin, ListAPIView):
+    """
+    API endpoint that estimates the number of distinct values of a key of the event data.
+
+    For example, with `key=user` it answers how many unique visitors triggered an event within a date
+    range, in total and per day. Answers are merged from the daily HyperLogLog sketches maintained at
+    ingestion time, so they are approximate, with the relative standard error given in `error_rate`.
+    Only the keys listed in `EVENTMANAGER_UNIQUE_KEYS` are counted.
+    """
+    permission_classes = [IsAuthenticated]
+    stats_endpoint = "unique"
+
+    def get(self, request):
+        """
+        Handle GET request for unique counts.
+
+        Query parameters: `event_name` and `key` (both required), `start_date` (inclusive) and
+        `end_date` (exclusive).
         """
-        Formats the data received from the queryset into a dictionary.
+        params = request.query_params
+        errors = {}
+        for name in ("event_name", "key"):
+            if not params.get(name):
+                errors[name] = "This parameter is required."
+        if params.get("key") and params["key"] not in sketches.unique_keys():
+            errors["key"] = f"Unique values are only counted for {', '.join(sketches.unique_keys())}."
+        for name in ("start_date", "end_date"):
+            try:
+                valid = not params.get(name) or parse_date(params[name]) is not None
+            except ValueError:
+                valid = False
+            if not valid:
+                errors[name] = "Expected a date in the YYYY-MM-DD format."
+        if errors:
+            raise ValidationError(errors)
+
+        def compute():
+            rows = stats.unique_query(request.user.id, params)
+            return stats.format_unique(params, rows)
+
+        return self.cached_response(request, compute)
+
+
+class EventFunnel(CachedStatsMixin, ListAPIView):
+    """
+    API endpoint that computes a conversion funnel over the event logs of the authenticated user.
 
-        The keys of the dictionary are the dates of the events. The values are dictionaries,
-        where the keys are the event names and the values are the count of events on that date.
+    A funnel is an ordered list of event names, a key of the event data that identifies who went
+    through it (for example `user`) and a time window. The answer is the number of distinct keys
+    that reached each step, in order and within the window, see `eventmanager.funnels.Funnel`.
+    """
+    permission_classes = [IsAuthenticated]
+    stats_endpoint = "funnel"
+    max_steps = 20
+    default_window = 86400
 
-        Args:
-            query_set (QuerySet): A QuerySet containing the data to be formatted.
+    def get(self, request):
+        """
+        Handle GET request for a funnel.
 
-        Returns:
-            dict: The formatted data.
+        Query parameters: `steps` (comma separated event names, required), `key` (required),
+        `window` (in seconds, default one day), `start` and `end`.
         """
-        formatted_data = {}
-        for item in query_set:
-            date_str = item['date'].isoformat()
-            if date_str not in formatted_data:
-                formatted_data[date_str] = {}
-            formatted_data[date_str][item['event_name']] = item['count']
+        params = request.query_params
+        steps = [step.strip() for step in params.get("steps", "").split(",") if step.strip()]
+        if not steps:
+            raise ValidationError({"steps": "This parameter is required."})
+        if len(steps) > self.max_steps:
+            raise ValidationError({"steps": f"A funnel cannot have more than {self.max_steps} steps."})
+        if not params.get("key"):
+            raise ValidationError({"key": "This parameter is required."})
+        try:
+            window = int(params.get("window", self.default_window))
+        except ValueError:
+            raise ValidationError({"window": "Expected a number of seconds."})
+        if window <= 0:
+            raise ValidationError({"window": "Expected a positive number of seconds."})
+        start = parse_time(params, "start")
+        end = parse_time(params, "end")
+
+        def compute():
+            return {
+                "key": params["key"],
+                "window": window,
+                "steps": funnels.run_funnel(request.user.id, steps, params["key"], window, start, end),
+            }
+
+        return self.cached_response(request, compute)
+
+
+class EventAggregate(CachedStatsMixin, ListAPIView):
+    """
+    API endpoint that aggregates a numeric key of the event data per time bucket.
 
-        return formatted_data
+    For every bucket it returns the number of numeric values of the key, their sum, minimum,
+    maximum, average and the requested percentiles, see `eventmanager.aggregations`.
+    """
+    permission_classes = [IsAuthenticated]
+    stats_endpoint = "aggregate"
+    default_percentiles = "50,90,99"
 
     def get(self, request):
         """
-        Handle GET request for event trends data.
+        Handle GET request for aggregations.
 
-        This method groups the event logs by date and event name and gets the count of event logs for each group.
+        Query parameters: `event_name` and `key` (both required), `percentiles` (comma separated,
+        default 50,90,99), `granularity`, `tz`, `start` and `end` as for the event trend endpoint.
         """
-        query_set = (
-            self.get_queryset().annotate(date=functions.TruncDate("timestamp"))
-            .values("date", "event_name")
-            .annotate(count=Count("id"))
-            .order_by("date", "event_name")
-        )
+        params = request.query_params
+        options = stats.parse_bucket_params(params)
+        for name in ("event_name", "key"):
+            if not params.get(name):
+                raise ValidationError({name: "This parameter is required."})
+        try:
+            percentiles = [
+                float(value) for value in params.get("percentiles", self.default_percentiles).split(",") if value
+            ]
+        except ValueError:
+            percentiles = None
+        if percentiles is None or not all(0 <= value <= 100 for value in percentiles):
+            raise ValidationError({"percentiles": "Expected comma separated numbers between 0 and 100."})
+
+        def compute():
+            return {
+                "event_name": params["event_name"],
+                "key": params["key"],
+                "granularity": options["granularity"],
+                "tz": options["tz"].key,
+                "buckets": aggregations.aggregate(request.user.id, options, params["key"], percentiles),
+            }
+
+        return self.cached_response(request, compute)
+
+
+class RetentionPolicyView(CreatorShardMixin, RetrieveUpdateAPIView):
+    """
+    API endpoint to read and change how long the raw event logs of the authenticated user are kept.
 
-        data = self.format_data(query_set)
-        return Response(data)
+    Logs older than the retention are removed by the `compact_eventlogs` command. Their counts stay
+    in the rollups, so the frequency and trend endpoints keep answering for them.
+    """
+    serializer_class = RetentionPolicySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        policy, _ = RetentionPolicy.objects.get_or_create(user=self.request.user)
+        return policy
+
+
+class IngestionQuotaView(APIView):
+    """
+    API endpoint that returns the ingestion limits of the authenticated user and the number of
+    event logs they sent today (UTC), see `eventmanager/throttling.py`.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(ingestion_throttle.usage(request.user.id))
 
 
 class LandingPageView(APIView):
@@ -268,4 +753,30 @@ class LandingPageView(APIView):
     """
     def get(self, request):
         return Response({"Welcome to Event Tracker"})
+
+
+class CanReadMetrics(BasePermission):
+    """
+    Lets staff users read the metrics, and scrapers that send `Authorization: Bearer <token>` with
+    the token of the `EVENTMANAGER_METRICS_TOKEN` setting.
+    """
+
+    def has_permission(self, request, view):
+        token = getattr(settings, "EVENTMANAGER_METRICS_TOKEN", None)
+        if token:
+            expected = f"Bearer {token}".encode()
+            if hmac.compare_digest(get_authorization_header(request), expected):
+                return True
+        return bool(request.user and request.user.is_staff)
+
+
+class MetricsView(APIView):
+    """
+    Exposes the internal counters of the application in the Prometheus text format, see
+    `CanReadMetrics`. They include the routes and the usage of every user.
+    """
+    permission_classes = [CanReadMetrics]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")
         
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "eventmanager.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -85,9 +87,23 @@ DATABASES = {
         "PASSWORD": "",
         "HOST": "localhost",
         "PORT": "",
+        # Keep connections open between requests, and check them before reusing them
+        "CONN_MAX_AGE": 60,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Read replica of "default", used by the stats and export endpoints (see
+# EVENTMANAGER_READ_REPLICAS). Locally it is a second connection to the same database; in
+# production point it at a streaming replica. Tests read through it too.
+DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+
+# Second shard of the event data (see EVENTMANAGER_SHARDS). Locally it is another database on the
+# same server; in production point it at another PostgreSQL instance.
+DATABASES["shard1"] = {**DATABASES["default"], "NAME": "EventManager_shard1"}
+
+DATABASE_ROUTERS = ["eventmanager.routers.ShardRouter", "eventmanager.routers.ReadReplicaRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -132,6 +148,126 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication'
-    ]
-}
\ No newline at end of file
+        'eventmanager.authentication.CachedTokenAuthentication'
+    ],
+    # orjson when it is installed, DRF's JSON implementation otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'eventmanager.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'eventmanager.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Event manager
+
+# Maximum number of event logs accepted by a single request to /api/eventlogs/batch
+EVENTMANAGER_BATCH_MAX_SIZE = 5000
+
+# Partition the event log table by month (PostgreSQL only), see eventmanager/partitioning.py
+EVENTMANAGER_PARTITION_EVENTLOG = False
+
+# "sync" writes event logs inside the request, "buffered" queues them for a background
+# writer thread and answers with 202 Accepted (503 when the queue is full)
+EVENTMANAGER_INGEST_MODE = "sync"
+EVENTMANAGER_BUFFER_MAX_SIZE = 10000
+EVENTMANAGER_BUFFER_FLUSH_SIZE = 1000
+EVENTMANAGER_BUFFER_FLUSH_INTERVAL = 1.0  # seconds
+# Attempts to write a batch while the database is unavailable, before it is dropped
+EVENTMANAGER_BUFFER_MAX_RETRIES = 5
+
+# Client ids of recently stored event logs, remembered so that retries are dropped without a query
+EVENTMANAGER_CLIENT_ID_CACHE_SIZE = 100000
+EVENTMANAGER_CLIENT_ID_CACHE_TTL = 600  # seconds
+
+# In-process cache of (user, event name) -> event id used by the ingestion endpoints.
+# Set EVENTMANAGER_EVENT_CACHE to the alias of a shared cache in CACHES to share lookups
+# between processes.
+EVENTMANAGER_EVENT_CACHE = None
+EVENTMANAGER_EVENT_CACHE_SIZE = 10000
+EVENTMANAGER_EVENT_CACHE_TTL = 60  # seconds
+# Unknown names are only cached in the shared cache, and only briefly, so that an event created
+# through another process is found right away
+EVENTMANAGER_EVENT_CACHE_MISS_TTL = 5  # seconds
+
+# Token -> user cache of eventmanager.authentication.CachedTokenAuthentication
+EVENTMANAGER_TOKEN_CACHE_SIZE = 10000
+EVENTMANAGER_TOKEN_CACHE_TTL = 60  # seconds
+
+# Cache of the stats endpoints' answers, invalidated per user on every ingestion. Set it to the
+# alias of a cache shared by all server processes and management commands (for example Redis or
+# Memcached). None disables the cache. Answers cached in a per-process memory cache only live
+# EVENTMANAGER_STATS_CACHE_LOCAL_TIMEOUT seconds, since other processes cannot invalidate them.
+EVENTMANAGER_STATS_CACHE = None
+EVENTMANAGER_STATS_CACHE_TIMEOUT = 86400  # seconds
+EVENTMANAGER_STATS_CACHE_LOCAL_TIMEOUT = 5  # seconds
+
+# Keys of EventLog.data whose distinct values are counted per event and day, for
+# /api/stats/unique, for example ["user"]. Every key adds a few queries to each ingestion
+# request and locks the sketch of the event and day, so all writes of an event queue on it.
+EVENTMANAGER_UNIQUE_KEYS = []
+
+# Number of days raw event logs are kept by `manage.py compact_eventlogs`, for users who did not
+# choose their own retention at /api/retention. None keeps them forever.
+EVENTMANAGER_RAW_RETENTION_DAYS = None
+
+# Directory of the monthly segment files written by `manage.py archive_eventlogs`, and the age
+# in months of the logs it moves there by default
+EVENTMANAGER_ARCHIVE_DIR = BASE_DIR / "archive"
+EVENTMANAGER_ARCHIVE_AFTER_MONTHS = 12
+
+# Latency, query and render time histograms per route at /metrics, see eventmanager/middleware.py.
+# With EVENTMANAGER_PROFILE_DIR set, a sample of the requests also runs under cProfile, and those
+# slower than EVENTMANAGER_PROFILE_MIN_DURATION are dumped there with their SQL.
+EVENTMANAGER_INSTRUMENTATION = False
+EVENTMANAGER_PROFILE_DIR = None
+EVENTMANAGER_PROFILE_SAMPLE_RATE = 0.01
+EVENTMANAGER_PROFILE_MIN_DURATION = 1.0  # seconds
+
+# /metrics is readable by staff users, and by scrapers sending "Authorization: Bearer <token>"
+# with this token. Keep it out of version control, for example in an environment variable.
+EVENTMANAGER_METRICS_TOKEN = os.environ.get("EVENTMANAGER_METRICS_TOKEN")
+
+# Database aliases the stats and export endpoints read from, see eventmanager/routers.py. A
+# replica whose replication lag is above EVENTMANAGER_REPLICA_MAX_LAG seconds, or that cannot be
+# reached, is skipped for EVENTMANAGER_REPLICA_LAG_CHECK_INTERVAL seconds in favour of "default".
+# Stats answers read from a replica are cached for EVENTMANAGER_REPLICA_CACHE_TIMEOUT seconds only.
+EVENTMANAGER_READ_REPLICAS = ["replica"]
+EVENTMANAGER_REPLICA_MAX_LAG = 30  # seconds
+EVENTMANAGER_REPLICA_LAG_CHECK_INTERVAL = 5  # seconds
+EVENTMANAGER_REPLICA_CACHE_TIMEOUT = 60  # seconds
+
+# Sharding: the data of every user lives on one of EVENTMANAGER_SHARDS, chosen for new users on a
+# consistent hash ring with EVENTMANAGER_SHARD_VNODES points per shard. Run `migrate --database`
+# for every shard, then `rebalance_shards` after adding one. Placements are cached per process for
+# EVENTMANAGER_SHARD_PLACEMENT_TTL seconds.
+EVENTMANAGER_SHARDS = ["default"]
+EVENTMANAGER_SHARD_VNODES = 64
+EVENTMANAGER_SHARD_PLACEMENT_CACHE_SIZE = 10000
+EVENTMANAGER_SHARD_PLACEMENT_TTL = 5  # seconds
+
+# Live counters of /api/async/live/event_counts, see eventmanager/live.py: increments are sent every
+# EVENTMANAGER_LIVE_INTERVAL seconds, a stream falling more than EVENTMANAGER_LIVE_QUEUE_SIZE
+# messages behind gets a new snapshot, and streams are closed after
+# EVENTMANAGER_LIVE_MAX_DURATION seconds, clients reconnect by themselves.
+EVENTMANAGER_LIVE_INTERVAL = 1.0  # seconds
+EVENTMANAGER_LIVE_HEARTBEAT = 15  # seconds
+EVENTMANAGER_LIVE_QUEUE_SIZE = 100
+EVENTMANAGER_LIVE_MAX_DURATION = 300  # seconds
+
+# Ingestion limits per user, see eventmanager/throttling.py: a token bucket of
+# EVENTMANAGER_THROTTLE_BURST event logs refilled with EVENTMANAGER_THROTTLE_RATE event logs per
+# second, and EVENTMANAGER_DAILY_EVENT_QUOTA event logs per UTC day. None disables a limit, and
+# IngestionLimit rows override them per user. Processes share their counts through the cache
+# EVENTMANAGER_THROTTLE_CACHE every EVENTMANAGER_THROTTLE_SYNC_INTERVAL seconds, which should be
+# shared between them (Redis or Memcached).
+EVENTMANAGER_THROTTLE_RATE = 1000  # event logs per second
+EVENTMANAGER_THROTTLE_BURST = 10000
+EVENTMANAGER_DAILY_EVENT_QUOTA = None
+EVENTMANAGER_THROTTLE_CACHE = "default"
+EVENTMANAGER_THROTTLE_SYNC_INTERVAL = 1.0  # seconds
+EVENTMANAGER_THROTTLE_CACHE_SIZE = 10000  # users whose limits and buckets a process keeps
+EVENTMANAGER_THROTTLE_LIMITS_TTL = 60  # seconds
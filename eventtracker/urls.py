@@ -17,10 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
-from eventmanager.views import LandingPageView 
+from eventmanager.views import LandingPageView, MetricsView
 
 urlpatterns = [
     path('', LandingPageView.as_view()),
+    path("metrics", MetricsView.as_view()),
     path("admin/", admin.site.urls),
     path("auth/", include('djoser.urls')),
     path("auth/", include('djoser.urls.authtoken')),